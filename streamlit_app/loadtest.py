@@ -0,0 +1,222 @@
+# streamlit_app/loadtest.py
+"""
+Test de charge : simule des sessions Streamlit concurrentes qui déroulent le
+vrai flux de main() (connexion, nouvelle conversation, questions) via
+l'API de test de Streamlit (AppTest), face à un LLM de substitution à
+latence et taux d'erreur configurables.
+
+Exemple (depuis streamlit_app/) :
+    python loadtest.py --stages 1,4,8,16 --turns 3 --llm-latency 0.5 --error-rate 0.02
+
+Rapporte, par palier : débit (tours/s), latence p50/p95/p99 d'un tour,
+erreurs et mémoire résidente du processus.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import sys
+import traceback
+from typing import Any, Dict, List
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(APP_DIR, "main.py")
+# Comme `streamlit run`, le dossier de l'application donne accès au paquet utils
+sys.path.insert(0, APP_DIR)
+CHAT_PLACEHOLDER = "Posez votre question…"
+OVERLOADED_PREFIX = "Désolé, le service est temporairement surchargé"
+
+
+def rss_mb() -> float:
+    """Mémoire résidente actuelle du processus (Mo)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def _last_bot_message(at) -> str:
+    conv_id = at.session_state["current_conversation_id"]
+    for conv in at.session_state["conversations"]:
+        if conv["id"] == conv_id:
+            bots = [m for m in conv["messages"] if m["role"] == "bot"]
+            return bots[-1]["content"] if bots else ""
+    return ""
+
+
+def run_session(session_id: str, questions: List[str], turns: int, timeout: float) -> Dict[str, Any]:
+    """Une session : connexion, nouvelle conversation puis `turns` questions."""
+    from streamlit.testing.v1 import AppTest
+
+    out: Dict[str, Any] = {"latencies": [], "errors": 0, "overloaded": 0, "messages": []}
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    at.session_state["authenticated"] = True
+    at.session_state["username"] = session_id
+    try:
+        at.run()
+        at.button(key="new_conv").click().run()
+    except Exception as e:
+        out["errors"] += turns
+        out["messages"].append(f"init: {e!r}")
+        return out
+
+    for _ in range(turns):
+        question = random.choice(questions)
+        t0 = time.perf_counter()
+        try:
+            box = next(t for t in at.text_input if t.placeholder == CHAT_PLACEHOLDER)
+            box.input(question)
+            next(b for b in at.button if b.label == "💬").click()
+            at.run()
+            elapsed = time.perf_counter() - t0
+            if at.exception:
+                out["errors"] += 1
+                out["messages"].append(at.exception[0].message)
+                continue
+            out["latencies"].append(elapsed)
+            if _last_bot_message(at).startswith(OVERLOADED_PREFIX):
+                out["overloaded"] += 1
+        except Exception as e:
+            out["errors"] += 1
+            out["messages"].append(f"{e!r}")
+            traceback.print_exc()
+    return out
+
+
+def run_stage(n_sessions: int, turns: int, questions: List[str], timeout: float, stage: int) -> Dict[str, Any]:
+    results: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+
+    def worker(i: int) -> None:
+        res = run_session(f"loadtest_{stage}_{i}", questions, turns, timeout)
+        with lock:
+            results.append(res)
+
+    rss_before = rss_mb()
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    latencies = [x for r in results for x in r["latencies"]]
+    errors = sum(r["errors"] for r in results)
+    return {
+        "sessions": n_sessions,
+        "turns": len(latencies) + errors,
+        "throughput_tps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_s": round(percentile(latencies, 50), 3),
+        "p95_s": round(percentile(latencies, 95), 3),
+        "p99_s": round(percentile(latencies, 99), 3),
+        "errors": errors,
+        "overloaded": sum(r["overloaded"] for r in results),
+        "rss_mb": round(rss_mb(), 1),
+        "rss_delta_mb": round(rss_mb() - rss_before, 1),
+        "error_samples": [m for r in results for m in r["messages"]][:3],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Test de charge multi-sessions de l'application.")
+    parser.add_argument("--stages", default="1,2,4,8", help="sessions concurrentes par palier")
+    parser.add_argument("--turns", type=int, default=3, help="questions par session")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="latence du LLM simulé (s)")
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="taux d'erreur du LLM simulé")
+    parser.add_argument("--llm-endpoints", type=int, default=1, help="points d'accès simulés (groupe avec bascule)")
+    parser.add_argument("--llm-down", type=int, default=0, help="points d'accès simulés toujours en erreur")
+    parser.add_argument("--timeout", type=float, default=120.0, help="délai max d'un tour (s)")
+    parser.add_argument("--workdir", help="répertoire de travail (histories/…) ; temporaire par défaut")
+    parser.add_argument("--json", help="écrit le rapport JSON dans ce fichier")
+    args = parser.parse_args()
+
+    from utils.llm_stub_server import start_stub_server
+
+    servers = [
+        start_stub_server(latency=args.llm_latency, jitter=args.llm_jitter, error_rate=args.error_rate)
+        if i >= args.llm_down else
+        start_stub_server(latency=args.llm_latency, error_rate=1.0, error_statuses=(503,))
+        for i in range(max(1, args.llm_endpoints))
+    ]
+    url = servers[-1][1]
+    # Le LLM simulé remplace toutes les routes (avant le premier appel)
+    os.environ["LOCAL_LLM_URL"] = url
+    if len(servers) > 1:
+        for i, (_, endpoint_url) in enumerate(servers, start=1):
+            os.environ[f"LOCAL_LLM_URL_{i}"] = endpoint_url
+    os.environ["LLM_DEFAULT_ROUTE"] = "local:stub"
+    # Mesure du chemin complet : pas de réponses préchargées pour les questions d'exemple
+    os.environ.setdefault("PREFETCH_ON_START", "0")
+    for key in [k for k in os.environ if k.startswith("LLM_ROUTE_") or k == "LLM_FAST_ROUTE"]:
+        del os.environ[key]
+
+    # histories/ et data/ de l'essai dans un répertoire isolé (voir utils/paths.py)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="loadtest-")
+    snapshot = os.path.join(APP_DIR, "..", "data")
+    if args.json:
+        args.json = os.path.abspath(args.json)
+    os.chdir(workdir)
+    if os.path.isdir(snapshot) and not os.path.exists("data"):
+        shutil.copytree(snapshot, "data")
+    os.environ["HISTO_DIR"] = os.path.join(workdir, "histories")
+    os.environ["DATA_DIR"] = os.path.join(workdir, "data")
+
+    import main as app
+    from utils import warmup
+
+    print(f"LLM simulé : {url} · répertoire : {workdir}")
+    print("Préchauffage du modèle d'embedding…")
+    warmup.start_warmup()
+    warmup.get_resources()
+
+    # Session de chauffe, non mesurée
+    run_session("loadtest_warmup", app.example_questions, 1, args.timeout)
+
+    report = []
+    header = f"{'sessions':>8} {'tours':>6} {'tours/s':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'erreurs':>8} {'429':>5} {'RSS Mo':>8}"
+    print(header)
+    for stage, n in enumerate(int(x) for x in args.stages.split(",")):
+        r = run_stage(n, args.turns, app.example_questions, args.timeout, stage)
+        report.append(r)
+        print(f"{r['sessions']:>8} {r['turns']:>6} {r['throughput_tps']:>8} {r['p50_s']:>7} "
+              f"{r['p95_s']:>7} {r['p99_s']:>7} {r['errors']:>8} {r['overloaded']:>5} {r['rss_mb']:>8}")
+        for sample in r["error_samples"]:
+            print(f"    ↳ {sample}")
+
+    print(f"Requêtes LLM servies : {sum(server.stub_requests for server, _ in servers)}")
+    from utils.llm_providers import get_provider
+
+    provider = get_provider("local")
+    if hasattr(provider, "endpoints"):
+        for endpoint in provider.stats():
+            print(f"    {endpoint['endpoint']:<10} {endpoint['state']:<9} appels={endpoint['calls']:<5} "
+                  f"erreurs={endpoint['errors']:<5} latence={endpoint['latency_s']}")
+    for server, _ in servers:
+        server.shutdown()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "stages": report, "warmup": warmup.startup_metrics()},
+                      f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 # streamlit_app/main.py
 
+import time
+_T0 = time.perf_counter()  # début des imports, pour mesurer le démarrage à froid
+
 import os
 import uuid
 import io
@@ -7,27 +10,31 @@ import re
 import json
 import base64
 import streamlit as st
-from datetime import date
+from datetime import date, datetime
 from dotenv import load_dotenv
 
 # -- Utils --
+# Les dépendances lourdes (chromadb, sentence-transformers, matplotlib, numpy,
+# fpdf) ne sont importées qu'à l'usage : la page de login s'affiche sans elles.
 from utils.history       import load_history, save_history
-from utils.llm_api       import get_llm_response
-from utils.rag_utils     import (
-    init_collection,
-    index_default_documents,
-    get_rag_context,
-    get_rag_context_adaptatif,
-)
+from utils.search_index  import search_conversations
+from utils.llm_api       import get_llm_response, BudgetExceeded, BUDGET_MESSAGE
+from utils.llm_providers import OVERLOADED_MESSAGE
+from utils.deadline      import (DeadlineExceeded, DEGRADATIONS, TIMEOUT_MESSAGE, CHART_MIN_S,
+                                 degrade, has_time, turn_deadline)
+from utils.usage         import set_current_user
+from utils.rag_utils     import retrieve_adaptatif
 from utils.viz           import get_graph_data, generate_graph_filename
 from utils.pdf_generator import make_report_pdf
+from utils.reports       import (generate_report, split_report_sections, decode_report_image,
+                                 default_report_period, PLOT_LOCK)
+from utils.prefetch      import get_prefetch_cache, start_prefetch
+from utils.jobs          import get_job_queue, ACTIVE_STATUSES
+from utils.export        import export_conversations
 from utils.auth import check_auth
-from chromadb.utils import embedding_functions
+from utils import warmup
 
-# Pour l’exécution de blocs matplotlib dynamiques
-import matplotlib.pyplot as plt
-import numpy as np
-import chromadb
+warmup.record_metric("import_main_s", time.perf_counter() - _T0, once=True)
 
 def load_css(path: str) -> None:
     """Charge un fichier CSS externe dans Streamlit."""
@@ -48,11 +55,100 @@ example_questions = [
     "Montre la progression du dépistage du cancer du sein entre 2019 et 2023.",
     "Compare la consommation de fruits et légumes à Québec depuis 2018."
 ]
+# Menu des rapports (aussi préchargés au démarrage)
+REPORT_TYPES = [
+    "📈 Évolution troubles respiratoires",
+    "📈 Évolution cas d'asthme",
+    "📈 Taux d'anxiété Montréal",
+    "📈 Surcharge hospitalière",
+    "📄 Synthèse générale",
+]
+REPORT_COMMUNES = ["Toutes", "Québec", "Montréal", "Lévis", "Bas-Saint-Laurent"]
+
 def clear_report() -> None:
     """Réinitialise l’état du panneau rapport."""
     st.session_state.report_type = "➤ Sélectionnez…"
-    st.session_state.report_text = None
-    st.session_state.report_fig  = None
+    st.session_state.report_job_id = None
+
+
+JOB_STATUS_LABELS = {
+    "queued":  "⏳ En attente",
+    "running": "🖨️ En cours",
+    "done":    "✅ Prêt",
+    "error":   "⚠️ Échec",
+}
+
+
+def _draw_report_job(job) -> None:
+    p = job["params"]
+    label = f"{JOB_STATUS_LABELS[job['status']]} · {p['commune']} · {p['start_date']} → {p['end_date']}"
+    if job["status"] == "done":
+        if st.button(label, key=f"job_{job['id']}", help=p["report_type"], use_container_width=True):
+            st.session_state.report_job_id = job["id"]
+            st.rerun()
+    else:
+        st.caption(label if job["status"] != "error" else f"{label} — {job['error']}")
+
+
+def _draw_export_job(job) -> None:
+    from utils.export import export_bytes
+
+    fmt = job["params"]["fmt"].upper()
+    res = job["result"] if job["status"] == "done" else None
+    if res and res["mime"] == "application/zip" and fmt == "PDF":
+        fmt = "ZIP de PDF"  # plusieurs conversations : une archive de PDF
+    label = f"{JOB_STATUS_LABELS[job['status']]} · export {fmt}"
+    data = export_bytes(job["id"], res["path"]) if res else None
+    if job["status"] == "running" and job.get("progress"):
+        st.progress(job["progress"]["fraction"], text=f"{label} · {job['progress']['message']}")
+    elif data is not None:
+        skipped = f" · {res['undated_skipped']} sans date ignorée(s)" if res.get("undated_skipped") else ""
+        st.download_button(
+            f"📥 {fmt} · {res['conversations']} conversation(s) · {res['bytes'] // 1024} Ko{skipped}",
+            data=data,
+            file_name=res["file_name"],
+            mime=res["mime"],
+            key=f"job_{job['id']}",
+            use_container_width=True
+        )
+    elif res:
+        st.caption(f"{label} — fichier expiré, relancer l'export")
+    else:
+        st.caption(label if job["status"] != "error" else f"{label} — {job['error']}")
+
+
+JOB_PANELS = {
+    "report": ("##### 📋 Rapports", _draw_report_job),
+    "export": ("##### 📦 Exports", _draw_export_job),
+}
+
+
+def _draw_jobs(jobs, kind: str) -> None:
+    title, draw = JOB_PANELS[kind]
+    st.markdown(title)
+    for job in jobs[:10]:
+        draw(job)
+
+
+@st.fragment(run_every=2)
+def _poll_jobs(user: str, kind: str) -> None:
+    """Variante rafraîchie toutes les 2 s tant qu'une tâche est active."""
+    jobs = get_job_queue().list_jobs(user, kind=kind)
+    _draw_jobs(jobs, kind)
+    if not any(j["status"] in ACTIVE_STATUSES for j in jobs):
+        # Plus rien en cours : un rerun complet repasse en affichage statique
+        st.rerun()
+
+
+def render_jobs(user: str, kind: str) -> None:
+    """Liste des tâches `kind` de l'utilisateur (en file, en cours, terminées)."""
+    jobs = get_job_queue().list_jobs(user, kind=kind)
+    if not jobs:
+        return
+    if any(j["status"] in ACTIVE_STATUSES for j in jobs):
+        _poll_jobs(user, kind)
+    else:
+        _draw_jobs(jobs, kind)
 
 
 #generation du titre de la conversation
@@ -68,7 +164,8 @@ def analyze_question(question: str, context: str) -> dict:
       - si les données sont disponibles,
       - si on doit tracer un graphique,
       - le type de réponse attendu.
-    Retourne un dict {data_available, needs_visualization, response_type, explanation}.
+    Retourne un dict {data_available, needs_visualization, response_type, explanation,
+    source} ; source vaut "llm", ou "keywords" pour le repli par mots-clés.
     """
     prompt = f"""Tu es un assistant spécialisé dans l'analyse...
 Question : {question}
@@ -77,36 +174,237 @@ Contexte : {context}
 Réponds uniquement avec un JSON :
 {{"data_available":bool,"needs_visualization":bool,"response_type":"graph"/"text","explanation":"..."}}
 """
-    raw = get_llm_response(prompt)
+    try:
+        raw = get_llm_response(prompt, task="analyze")
+    except (BudgetExceeded, DeadlineExceeded):
+        raw = ""  # budget atteint ou échéance proche : analyse par mots-clés
+        degrade("analysis_skipped")
     m = re.search(r"\{.*\}", raw, re.DOTALL)
     if m:
-        return json.loads(m.group())
+        return {**json.loads(m.group()), "source": "llm"}
     # fallback par défaut
     return {
         "data_available": True,
         "needs_visualization": any(k in question.lower() for k in ["montre","trace","affiche","compare"]),
         "response_type": "graph" if "montre" in question.lower() else "text",
-        "explanation": "Analyse automatique par défaut."
+        "explanation": "Analyse automatique par défaut.",
+        "source": "keywords"
     }
 
 
+# Réécriture LLM des descriptions de graphiques (faits calculés localement)
+GRAPH_DESCRIPTION_LLM = os.getenv("GRAPH_DESCRIPTION_LLM", "0") == "1"
+
+
 def get_graph_description(question: str, graph_data: dict, rag_context: str) -> str:
     """
-    Formule un prompt pour décrire factuellement le graphique,
-    à partir des données extraites et du contexte RAG.
+    Décrit factuellement le graphique à partir des séries extraites :
+    statistiques calculées localement (utils/trends.py). Avec
+    GRAPH_DESCRIPTION_LLM=1, le LLM reformule ces faits avec le contexte RAG.
     """
+    from utils.trends import describe_graph
+
+    facts = describe_graph(graph_data)
+    if not GRAPH_DESCRIPTION_LLM:
+        return facts
     prompt = f"""Tu es un assistant...
 Contexte : {rag_context}
 
-Données graphiques :
-Titre : {graph_data.get("title")}
-X : {graph_data.get("xlabel")} → {graph_data.get("xdata")}
-Y : {graph_data.get("ylabel")} → {graph_data.get("ydata")}
+Faits calculés sur le graphique (exacts, à ne pas modifier) :
+{facts}
 
 Question : {question}
 
-Donne 2–3 phrases factuelles en français."""
-    return get_llm_response(prompt)
+Reformule ces faits en 2–3 phrases factuelles en français."""
+    try:
+        return get_llm_response(prompt, task="describe")
+    except (BudgetExceeded, DeadlineExceeded):
+        degrade("local_description")
+        return facts
+
+
+
+# Réponses de repli (service saturé, budget atteint, échéance dépassée) : jamais préchargées
+UNAVAILABLE_REPLIES = (OVERLOADED_MESSAGE, BUDGET_MESSAGE, TIMEOUT_MESSAGE)
+
+
+def answer_question(question: str, messages: list, collection, embedding_fn) -> dict:
+    """
+    Traitement complet d'une question déjà ajoutée à `messages`, sans
+    interface : recherche RAG, analyse, réponse du LLM et graphique éventuel.
+    Utilisé par le chat et par le préchargement (utils/prefetch.py).
+
+    Le tour a une échéance (TURN_DEADLINE_S, voir utils/deadline.py) : quand
+    elle approche, l'analyse LLM et la reformulation de la description sont
+    sautées et la réponse est demandée sans graphique.
+
+    Returns:
+        {"context", "intent", "messages" (réponses du bot à ajouter),
+         "graph_data", "notices" [(fonction st, texte)], "complete" (False
+         en cas de repli, de dégradation ou d'erreur : résultat à ne pas
+         mettre en cache), "degraded" (clés de DEGRADATIONS)}
+    """
+    with turn_deadline() as turn:
+        result = _answer_turn(question, messages, collection, embedding_fn)
+    result["degraded"] = turn.degraded
+    if turn.degraded:
+        result["complete"] = False
+        for msg in result["messages"]:
+            msg["degraded"] = turn.degraded
+    return result
+
+
+def _llm_or_timeout(prompt: str, task: str) -> str:
+    # Appel principal du tour : à l'échéance, message d'excuse plutôt qu'une attente sans fin
+    try:
+        return get_llm_response(prompt, task=task)
+    except DeadlineExceeded:
+        degrade("timeout")
+        return TIMEOUT_MESSAGE
+
+
+def _answer_turn(question: str, messages: list, collection, embedding_fn) -> dict:
+    retrieval = retrieve_adaptatif(messages, embedding_fn, collection=collection)
+    context = "\n".join(p["content"] for p in retrieval["passages"])
+
+    # Analyser la question : classifieur local, LLM seulement si peu confiant
+    from utils.intent import classify_intent
+
+    analysis = classify_intent(retrieval["question_embedding"], retrieval["passages"],
+                               model_name=warmup.embedding_model_name())
+    if analysis is None:
+        analysis = analyze_question(question, context)
+    result = {
+        "context": context,
+        "intent": {k: analysis.get(k) for k in ("data_available", "needs_visualization", "source")},
+        "messages": [],
+        "graph_data": None,
+        "notices": [],
+        "complete": True,
+    }
+
+    # Nettoyer la question des éventuels marqueurs de code
+    clean_question = re.sub(r'```.*?```', '', question, flags=re.DOTALL)
+
+    if not analysis["data_available"]:
+        warning_text="⚠️ Je n'ai pas trouvé de données santé pour cette question, je passe en mode conversation générale…"
+        # Prompt simple sans RAG
+        general_prompt = f"""
+        Tu es un assistant polyvalent qui répond à toute question générale.
+        Question : {clean_question}
+        Réponds en français de manière concise.
+        """
+        reply = _llm_or_timeout(general_prompt, "general")
+        result["notices"].append(("write", reply))
+        result["messages"].append({"role":"bot","content":f"{warning_text}\n\n{reply}","type": "text"})
+        result["complete"] = reply not in UNAVAILABLE_REPLIES
+        return result
+
+    # L'historique du prompt doit inclure TOUS les messages de la conversation actuelle
+    # S'assurer de n'envoyer que le contenu textuel au LLM, pas les images
+    history_prompt_messages = []
+    for msg in messages:
+        if msg["role"] == "user":
+            history_prompt_messages.append(f"Utilisateur : {msg['content']}")
+        elif msg["role"] == "bot" and msg.get("type") != "graph": # Ne pas inclure le contenu des images dans l'historique du prompt
+            history_prompt_messages.append(f"Assistant : {msg['content']}")
+    # Limiter le contexte à 10 messages récents (ex : 5 échanges utilisateur/assistant)
+    history_prompt = "\n".join(history_prompt_messages[-10:])
+
+    if analysis["needs_visualization"] and not has_time(CHART_MIN_S):
+        # Trop peu de temps pour le code, son exécution et la description : réponse en texte
+        analysis = {**analysis, "needs_visualization": False, "response_type": "text"}
+        degrade("no_chart")
+
+    full_prompt = f"""Tu es un assistant destiné aux professionnels de santé au Québec.
+    IMPORTANT : Tu dois TOUJOURS répondre en FRANÇAIS, quelle que soit la langue de la question.
+
+    Voici des documents utiles :
+    {context}
+
+    Historique de la conversation :
+    {history_prompt}
+
+    Question de l'utilisateur : {clean_question}
+
+    Instructions STRICTES :
+    1. Tu DOIS répondre UNIQUEMENT en français
+    2. Si les données demandées ne sont pas disponibles dans le contexte, explique clairement pourquoi tu ne peux pas répondre
+    3. Si la question demande une visualisation (selon l'analyse) :
+    - Fournis UNIQUEMENT le code matplotlib nécessaire
+    - NE donne AUCUNE autre explication
+    4. Si la question ne demande PAS de visualisation :
+    - Donne une réponse claire et concise en français
+    - N'inclus PAS de code
+    - Concentre-toi sur les informations pertinentes
+
+    Type de réponse attendu : {analysis['response_type']}"""
+
+    bot_reply_raw = _llm_or_timeout(full_prompt, "chat")
+    result["complete"] = bot_reply_raw not in UNAVAILABLE_REPLIES
+
+    if not analysis["needs_visualization"]:
+        # Pour les réponses sans graphique, supprimer tout code Python de la réponse
+        cleaned_reply = re.sub(r'```.*?```', '', bot_reply_raw, flags=re.DOTALL).strip()
+        result["notices"].append(("write", cleaned_reply))
+        result["messages"].append({"role": "bot", "content": cleaned_reply, "type": "text"})
+        return result
+
+    match = re.search(r"(import matplotlib\.pyplot[\s\S]+?plt\.show\(\))", bot_reply_raw)
+    if not match:
+        warning_msg = "Je n'ai pas pu générer de visualisation pour cette question."
+        result["notices"].append(("warning", warning_msg))
+        result["messages"].append({"role": "bot", "content": warning_msg})
+        result["complete"] = False
+    else:
+        import matplotlib.pyplot as plt
+        import numpy as np
+
+        # Ajouter des configurations matplotlib pour améliorer la lisibilité
+        code_to_exec = """
+import matplotlib.pyplot as plt
+plt.style.use('bmh')  # Style intégré à matplotlib
+plt.figure(figsize=(12, 6))
+plt.rcParams['axes.grid'] = True
+plt.rcParams['grid.alpha'] = 0.3
+""" + match.group(1)
+        exec_globals = {"plt": plt, "np": np}
+        try:
+            # pyplot est global au processus : une exécution à la fois (préchargement, rapports)
+            with PLOT_LOCK:
+                # Effacer la figure précédente pour éviter les superpositions
+                plt.clf()
+                exec(code_to_exec, exec_globals)
+                # Extraire les données du graphique
+                graph_data = get_graph_data(plt.gcf())
+                # Sauvegarder le graphique en format PNG et encoder en base64
+                img_buf = io.BytesIO()
+                plt.gcf().savefig(img_buf, format='png', dpi=300, bbox_inches='tight')
+                plt.close("all")
+            image_base64 = base64.b64encode(img_buf.getvalue()).decode('utf-8')
+
+            # Description calculée sur les séries du graphique
+            description = get_graph_description(question, graph_data, context)
+            result["graph_data"] = graph_data
+            # ⬅️ D'abord la description textuelle, puis l'image avec ses données
+            result["messages"].append({"role": "bot", "content": description, "type": "text"})
+            result["messages"].append({
+                "role": "bot",
+                "content": description,
+                "type": "graph",
+                "image_base64": image_base64,
+                "graph_data": graph_data,  # séries, pour l'export CSV et les questions de suivi
+                "original_query": question # Stocker la question originale pour le nom du fichier
+            })
+        except Exception as e:
+            error_msg = f"Désolé, je n'ai pas pu générer le graphique : {str(e)}"
+            result["notices"].append(("error", error_msg))
+            result["messages"].append({"role": "bot", "content": error_msg})
+            result["complete"] = False
+    print("====== RAW LLM RESPONSE ======")
+    print(bot_reply_raw)
+    result["notices"].append(("warning", f"Réponse brute : {bot_reply_raw}"))
+    return result
 
 
 def main():
@@ -114,28 +412,37 @@ def main():
     st.set_page_config(page_title="Chat Santé Québec", layout="wide")
     load_dotenv()
 
+    # Le modèle d'embedding et l'index se chargent pendant la connexion
+    warmup.start_warmup()
+
     # 1) Auth
-    if not check_auth():
+    authenticated = check_auth()
+    warmup.record_metric("first_page_s", time.perf_counter() - _T0, once=True)
+    if not authenticated:
         st.error("🔒 Vous devez être connecté·e pour accéder à cette page")
         return
     user = st.session_state.username
+    # Les appels LLM de cette exécution sont comptabilisés pour cet utilisateur
+    set_current_user(user)
 
     # 2) CSS
     load_css("assets/chat_llm.css")
 
-    if "collection" not in st.session_state:
-        # 1) Créer et stocker la fonction d’embedding
-        st.session_state.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
-        )
-        # 2) Créer le client Chroma et la collection
-        st.session_state.chroma_client = chromadb.Client()
-        st.session_state.collection = st.session_state.chroma_client.get_or_create_collection(
-            name="sante_docs",
-            embedding_function=st.session_state.embedding_fn
-        )
-        # 3) Indexer vos documents “fake_docs” + “respiratory_docs”
-        index_default_documents(st.session_state.collection)
+    # 3) Récupérer le modèle et le corpus préchauffés (partagés par processus)
+    if not warmup.is_ready():
+        with st.spinner("⏳ Chargement du modèle et des documents…"):
+            resources = warmup.get_resources()
+    else:
+        resources = warmup.get_resources()
+    # Génération du corpus figée pour toute cette exécution : une bascule
+    # à chaud ne s'applique qu'à l'exécution suivante
+    generation = resources["corpus"].current()
+    st.session_state.embedding_fn   = resources["embedding_fn"]
+    st.session_state.collection     = generation["collection"]
+    st.session_state.corpus_version = generation["version"]
+    # Questions d'exemple et rapports types préchargés en arrière-plan (une fois par processus)
+    start_prefetch(resources["corpus"], resources["embedding_fn"], answer_question,
+                   example_questions, REPORT_TYPES, REPORT_COMMUNES)
 
     # 4) Historique des conversations
     if "conversations" not in st.session_state:
@@ -157,139 +464,65 @@ def main():
         st.markdown("<h1>🤖 Chatbot Santé – Québec</h1>", unsafe_allow_html=True)
     with col_opts:
         DEFAULT = "➤ Sélectionnez…"
-        report_types = [
-            DEFAULT,
-            "📈 Évolution troubles respiratoires",
-            "📈 Évolution cas d'asthme",
-            "📈 Taux d'anxiété Montréal",
-            "📈 Surcharge hospitalière",
-            "📄 Synthèse générale",
-        ]
-        report_type = st.selectbox("Type de rapport", report_types, key="report_type")
+        report_type = st.selectbox("Type de rapport", [DEFAULT] + REPORT_TYPES, key="report_type")
 
         if report_type != DEFAULT:
-            communes = ["Toutes", "Québec", "Montréal", "Lévis", "Bas-Saint-Laurent"]
-            commune = st.selectbox("Commune", communes, key="report_commune")
-            today = date.today()
-            default_start = today.replace(year=today.year - 1)
+            commune = st.selectbox("Commune", REPORT_COMMUNES, key="report_commune")
+            default_start, default_end = default_report_period()
             start_date, end_date = st.date_input(
                 "Période",
-                value=(default_start, today),
+                value=(date.fromisoformat(default_start), date.fromisoformat(default_end)),
                 key="report_dates"
             )
 
             if st.button("✅ Générer le rapport", key="btn_report"):
-                with st.spinner("🖨️ Génération du rapport…"):
-                    if commune == "Toutes":
-                        rag_ctx = get_rag_context(
-                            st.session_state.collection,
-                            report_type,
-                            all_docs=True
-                        )
-                    else:
-                        rag_ctx = get_rag_context(
-                            st.session_state.collection,
-                            f"{commune} {report_type}"
-                        )
-
-                    prompt = f"""
-Tu es un assistant professionnel spécialisé en santé au Québec.
-
-Type de rapport : {report_type}
-Commune : {commune}
-Période : {start_date.isoformat()} → {end_date.isoformat()}
-
-Documents utiles (RAG) :
-{rag_ctx}
-
-Génère un rapport structuré en Markdown avec ces rubriques :
-## Introduction
-
-…ton texte…
-
-## Points clés
-
-…ton texte…
-
-## Visualisation graphique
-
-<!-- si pertinent, insère ici un bloc fenced Python pour tracer le graphique -->
-
-## Analyse graphique
-
-…ton texte…
-
-## Conclusion
-
-…ton texte…
-"""
-                    raw = get_llm_response(prompt)
-
-                # ─── Traitement du code graphique (fenced ET inline) ───
-                report_text, report_fig = raw, None
-
-                # 1) Bloc fenced ```python ... ```
-                m = re.search(r"```(?:python)?\n([\s\S]+?)```", raw)
-
-                # 2) Fallback inline si pas de fenced
-                if not m and "import matplotlib.pyplot" in raw:
-                    m2 = re.search(r"(import matplotlib\.pyplot[\s\S]+?plt\.show\(\))", raw)
-                    code = m2.group(1) if m2 else None
-                else:
-                    code = m.group(1) if m else None
-
-                if code:
-                    plt.close("all")
-                    # Exécution safe
-                    exec_globals = {"plt": plt, "np": np}
-                    exec(code, exec_globals)
-                    report_fig = plt.gcf()
-
-                    # On retire le code du texte
-                    if m:
-                        report_text = raw.replace(m.group(0), "").strip()
-                    else:
-                        report_text = raw.replace(code, "").strip()
-
-                # On stocke pour affichage ultérieur
-                st.session_state.report_text = report_text
-                st.session_state.report_fig  = report_fig
-
+                # La génération part dans la file de tâches : le chat reste utilisable
+                try:
+                    job_id = get_job_queue().submit(
+                        user,
+                        "report",
+                        {
+                            "report_type": report_type,
+                            "commune": commune,
+                            "start_date": start_date.isoformat(),
+                            "end_date": end_date.isoformat(),
+                        },
+                        generate_report,
+                        collection=st.session_state.collection,
+                        embedding_fn=st.session_state.embedding_fn,
+                        corpus_version=st.session_state.corpus_version,
+                    )
+                    st.toast(f"🖨️ Rapport mis en file ({commune})")
+                except RuntimeError as e:
+                    st.warning(str(e))
 
             st.button("❌ Fermer", on_click=clear_report, key="close_report")
 
+        render_jobs(user, "report")
+
     # ─── 6) AFFICHAGE DU RAPPORT ────────────────────────────────────────────────
-    if st.session_state.get("report_text"):
-        full_md = st.session_state.report_text
-        fig     = st.session_state.report_fig
+    job = (
+        get_job_queue().get(user, st.session_state.report_job_id)
+        if st.session_state.get("report_job_id") else None
+    )
+    if job and job["status"] == "done":
+        params  = job["params"]
+        result  = job["result"]
+        full_md = result["text"]
+        img     = decode_report_image(result)
 
         # Métadonnées
         st.markdown("## 📄 Rapport généré")
         st.markdown("#### Informations du rapport")
         st.markdown(
-            f"- **Type de rapport** : {st.session_state.report_type}  \n"
-            f"- **Commune**         : {st.session_state.report_commune}  \n"
-            f"- **Période**        : {st.session_state.report_dates[0]} → {st.session_state.report_dates[1]}"
+            f"- **Type de rapport** : {params['report_type']}  \n"
+            f"- **Commune**         : {params['commune']}  \n"
+            f"- **Période**        : {params['start_date']} → {params['end_date']}"
         )
         st.markdown("---")
 
         # Découpage en sections
-        HEADERS = [
-            "## Introduction",
-            "## Points clés",
-            "## Visualisation graphique",
-            "## Analyse graphique",
-            "## Conclusion",
-        ]
-        sections = {}
-        for i, h in enumerate(HEADERS):
-            nxt = HEADERS[i+1] if i+1 < len(HEADERS) else None
-            pat = (
-                rf"{re.escape(h)}\s*(.*?)(?={re.escape(nxt)})"
-                if nxt else rf"{re.escape(h)}\s*(.*)$"
-            )
-            m = re.search(pat, full_md, re.S)
-            sections[h] = m.group(1).strip() if m else ""
+        sections = split_report_sections(full_md)
 
         # Affichage
         st.markdown("### Introduction")
@@ -299,8 +532,8 @@ Génère un rapport structuré en Markdown avec ces rubriques :
         st.markdown(sections["## Points clés"], unsafe_allow_html=True)
 
         st.markdown("### Visualisation graphique")
-        if fig:
-            st.pyplot(fig)
+        if img:
+            st.image(img, use_column_width=True)
         else:
             st.markdown("_Aucun graphique à afficher._")
 
@@ -313,7 +546,7 @@ Génère un rapport structuré en Markdown avec ces rubriques :
         st.markdown("---")
 
         # Télécharger en PDF
-        pdf_bytes = make_report_pdf(full_md, fig)
+        pdf_bytes = make_report_pdf(full_md, image_png=img)
         st.download_button(
             "📥 Télécharger le rapport (PDF)",
             data=pdf_bytes,
@@ -347,9 +580,10 @@ Génère un rapport structuré en Markdown avec ces rubriques :
         flags=re.IGNORECASE
         )
         if followup_pattern.search(question) and st.session_state.get("last_graph_data"):
-            gd  = st.session_state.last_graph_data
-            ctx = st.session_state.last_graph_rag_context
-            desc = get_graph_description(question, gd, ctx)
+            from utils.trends import answer_graph_question
+
+            # Réponse immédiate calculée sur les séries du dernier graphique
+            desc = answer_graph_question(question, st.session_state.last_graph_data)
             current_conversation["messages"].append({"role": "user", "content": question})
             current_conversation["messages"].append({"role":"bot","content":desc,"type":"text"})
             save_history(user, st.session_state.conversations)
@@ -362,178 +596,28 @@ Génère un rapport structuré en Markdown avec ces rubriques :
         if len(current_conversation["messages"]) == 1:
             current_conversation["title"] = generate_smart_title(question)
             save_history(user, st.session_state.conversations)
-        # 1) Regroupe les N dernières questions utilisateur
-        last_user_qs = [
-            msg["content"] for msg in current_conversation["messages"]
-            if msg["role"] == "user"
-        ]
-        # Choisis la fenêtre qui te convient (ici 2)
-        rag_query = " ".join(last_user_qs[-2:])
-
-        # 2) Interroge Chroma avec cette requête enrichie
-        context = get_rag_context_adaptatif(
-            current_conversation["messages"],
-            st.session_state.embedding_fn
-        )
-
-        # Analyser la question avec le LLM
-        analysis = analyze_question(question, context)
-        
-        # Nettoyer la question des éventuels marqueurs de code
-        clean_question = re.sub(r'```.*?```', '', question, flags=re.DOTALL)
-
-        if not analysis["data_available"]:
-            # 1) Warning dans les logs
-            warning_text="⚠️ Je n'ai pas trouvé de données santé pour cette question, je passe en mode conversation générale…"
-            # 2) Enregistre le warning dans l'historique
-            # 2) Affiche-le visuellement
-            
-            # 2) Construis un prompt simple sans RAG
-            general_prompt = f"""
-        Tu es un assistant polyvalent qui répond à toute question générale.
-        Question : {clean_question}
-        Réponds en français de manière concise.
-        """
-
-            # 3) Interroge l'API LLM en mode « général »
-            reply = get_llm_response(general_prompt)
-            combined = f"{warning_text}\n\n{reply}"
-            # 4) Affiche et sauvegarde
-            st.write(reply)
-            current_conversation["messages"].append({"role":"bot","content":combined,"type": "text"})
-            save_history(user, st.session_state.conversations)
-            st.rerun()
-
-        else:
-            # L'historique du prompt doit inclure TOUS les messages de la conversation actuelle
-            # S'assurer de n'envoyer que le contenu textuel au LLM, pas les images
-            history_prompt_messages = []
-            for msg in current_conversation["messages"]:
-                if msg["role"] == "user":
-                    history_prompt_messages.append(f"Utilisateur : {msg['content']}")
-                elif msg["role"] == "bot" and msg.get("type") != "graph": # Ne pas inclure le contenu des images dans l'historique du prompt
-                    history_prompt_messages.append(f"Assistant : {msg['content']}")
-            # Limiter le contexte à 10 messages récents (ex : 5 échanges utilisateur/assistant)
-            history_prompt_messages = history_prompt_messages[-10:]
-
-            history_prompt = "\n".join(history_prompt_messages)
-
-            full_prompt = f"""Tu es un assistant destiné aux professionnels de santé au Québec.
-    IMPORTANT : Tu dois TOUJOURS répondre en FRANÇAIS, quelle que soit la langue de la question.
-
-    Voici des documents utiles :
-    {context}
-
-    Historique de la conversation :
-    {history_prompt}
-
-    Question de l'utilisateur : {clean_question}
-
-    Instructions STRICTES :
-    1. Tu DOIS répondre UNIQUEMENT en français
-    2. Si les données demandées ne sont pas disponibles dans le contexte, explique clairement pourquoi tu ne peux pas répondre
-    3. Si la question demande une visualisation (selon l'analyse) :
-    - Fournis UNIQUEMENT le code matplotlib nécessaire
-    - NE donne AUCUNE autre explication
-    4. Si la question ne demande PAS de visualisation :
-    - Donne une réponse claire et concise en français
-    - N'inclus PAS de code
-    - Concentre-toi sur les informations pertinentes
-
-    Type de réponse attendu : {analysis['response_type']}"""
-
+        # Question d'exemple en début de conversation : réponse préchargée
+        # pour la version courante du corpus (utils/prefetch.py)
+        result = None
+        if len(current_conversation["messages"]) == 1:
+            result = get_prefetch_cache().get("answer", question, st.session_state.corpus_version)
+        if result is None:
             with st.spinner("💬 Réflexion en cours..."):
-                bot_reply_raw = get_llm_response(full_prompt)
-
-            if analysis["needs_visualization"]:
-                try:
-                    match = re.search(r"(import matplotlib\.pyplot[\s\S]+?plt\.show\(\))", bot_reply_raw)
-                    if match:
-                        code_to_exec = match.group(1)
-                        # Ajouter des configurations matplotlib pour améliorer la lisibilité
-                        code_to_exec = """
-import matplotlib.pyplot as plt
-plt.style.use('bmh')  # Style intégré à matplotlib
-plt.figure(figsize=(12, 6))
-plt.rcParams['axes.grid'] = True
-plt.rcParams['grid.alpha'] = 0.3
-""" + code_to_exec
-                        exec_globals = {"plt": plt, "np": np}
-                        try:
-                            # Effacer la figure précédente pour éviter les superpositions
-                            plt.clf()
-                            exec(code_to_exec, exec_globals)
-                            
-                            # Extraire les données du graphique
-                            graph_data = get_graph_data(plt.gcf())
-                            # juste après avoir généré et sauvegardé graph_data
-                            st.session_state.last_graph_data = graph_data
-                            st.session_state.last_graph_rag_context = context
-
-                            # Obtenir une description pertinente du LLM basée sur le contexte RAG
-                            description = get_graph_description(question, graph_data, context)
-                            
-                            # Sauvegarder le graphique en format PNG et encoder en base64
-                            img_buf = io.BytesIO()
-                            plt.gcf().savefig(img_buf, format='png', dpi=300, bbox_inches='tight')
-                            img_buf.seek(0)
-                            image_base64 = base64.b64encode(img_buf.getvalue()).decode('utf-8')
-                            
-                            # ⬅️ Ajouter d'abord la description textuelle
-                            current_conversation["messages"].append({
-                                "role": "bot",
-                                "content": description,
-                                "type": "text"
-                            })
-                            # Ajouter la description et les données de l'image au message
-                            current_conversation["messages"].append({
-                                "role": "bot", 
-                                "content": description, 
-                                "type": "graph", 
-                                "image_base64": image_base64,
-                                "original_query": question # Stocker la question originale pour le nom du fichier
-                            })
-                            save_history(user, st.session_state.conversations)
-
-                        except Exception as e:
-                            error_msg = f"Désolé, je n'ai pas pu générer le graphique : {str(e)}"
-                            st.error(error_msg)
-                            current_conversation["messages"].append({"role": "bot", "content": error_msg})
-                    else:
-                        warning_msg = "Je n'ai pas pu générer de visualisation pour cette question."
-                        st.warning(warning_msg)
-                        current_conversation["messages"].append({"role": "bot", "content": warning_msg})
-                except Exception as e:
-                    error_msg = f"Une erreur s'est produite : {str(e)}"
-                    st.error(error_msg)
-                    current_conversation["messages"].append({"role": "bot", "content": error_msg})
-                print("====== RAW LLM RESPONSE ======")
-                print(bot_reply_raw)
-                st.warning(f"Réponse brute : {bot_reply_raw}")
-
-            else:
-                try:
-                    # Pour les réponses sans graphique, supprimer tout code Python de la réponse
-                    cleaned_reply = re.sub(r'```.*?```', '', bot_reply_raw, flags=re.DOTALL).strip()
-                    st.write(cleaned_reply)
-                    current_conversation["messages"].append({
-                        "role": "bot",
-                        "content": cleaned_reply,
-                        "type": "text"
-                    })
-                    save_history(user, st.session_state.conversations)
-
-                except Exception as e:
-                    st.error(f"❌ Erreur lors de l'affichage de la réponse texte : {str(e)}")
-                    current_conversation["messages"].append({
-                        "role": "bot",
-                        "content": f"[Erreur] {str(e)}",
-                        "type": "text"
-                    })
-                    save_history(user, st.session_state.conversations)
-
-    
+                result = answer_question(
+                    question,
+                    current_conversation["messages"],
+                    st.session_state.collection,
+                    st.session_state.embedding_fn
+                )
 
+        # Conservé dans l'historique pour réentraîner le classifieur
+        current_conversation["messages"][-1]["intent"] = result["intent"]
+        for level, text in result["notices"]:
+            getattr(st, level)(text)
+        if result["graph_data"] is not None:
+            st.session_state.last_graph_data = result["graph_data"]
+        current_conversation["messages"].extend(result["messages"])
+        save_history(user, st.session_state.conversations)
         st.rerun()
 
 
@@ -552,18 +636,39 @@ plt.rcParams['grid.alpha'] = 0.3
             st.session_state.conversations.append({
                 "id": new_conv_id,
                 "title": "Nouvelle conversation",
+                "created_at": datetime.now().isoformat(timespec="seconds"),
                 "messages": []
             })
             st.session_state.current_conversation_id = new_conv_id
             st.session_state.user_input = ""  # Réinitialiser l'input
             # Vider aussi le rapport s'il existe
-            st.session_state.pop("report_text", None)
-            st.session_state.pop("report_fig",  None)
+            st.session_state.pop("report_job_id", None)
             save_history(user, st.session_state.conversations)
             st.rerun()
 
         st.markdown("### 🧾 Historique des conversations")
 
+        # 🔎 Recherche plein texte dans toutes les conversations (index SQLite FTS)
+        search_query = st.text_input(
+            "Rechercher", placeholder="🔎 Rechercher dans l'historique…",
+            key="history_search", label_visibility="collapsed"
+        )
+        if search_query.strip():
+            hits = search_conversations(user, search_query)
+            if not hits:
+                st.caption("Aucun résultat.")
+            for res in hits:
+                if st.button(
+                    res["title"],
+                    key=f"search_hit_{res['conv_id']}",
+                    use_container_width=True
+                ):
+                    st.session_state.current_conversation_id = res["conv_id"]
+                    st.rerun()
+                for hit in res["hits"]:
+                    st.caption(hit["snippet"])
+            st.markdown("---")
+
         if st.session_state.conversations:
             # On affiche les plus récentes en premier
             sorted_convs = sorted(
@@ -614,6 +719,46 @@ plt.rcParams['grid.alpha'] = 0.3
         else:
             st.info("Aucune conversation.")
 
+        # 📦 Export des conversations (tâche de fond, mémoire bornée)
+        with st.expander("📦 Exporter"):
+            scope = st.radio(
+                "Conversations", ["Conversation courante", "Période", "Toutes"],
+                key="export_scope"
+            )
+            export_range = None
+            if scope == "Période":
+                today = date.today()
+                export_range = st.date_input(
+                    "Créées entre", value=(today.replace(day=1), today), key="export_dates"
+                )
+            fmt = st.selectbox("Format", ["zip", "pdf"], key="export_fmt",
+                               format_func=lambda f: {"zip": "ZIP (texte, CSV, images)",
+                                                      "pdf": "PDF (ZIP de PDF si plusieurs conversations)"}[f])
+            if st.button("Lancer l'export", key="btn_export", use_container_width=True):
+                params = {"fmt": fmt, "conv_ids": None, "start_date": None, "end_date": None}
+                error = None
+                if scope == "Conversation courante":
+                    if current_conversation:
+                        params["conv_ids"] = [current_conversation["id"]]
+                    else:
+                        error = "Aucune conversation courante à exporter."
+                elif scope == "Période":
+                    if export_range and len(export_range) == 2:
+                        params["start_date"] = export_range[0].isoformat()
+                        params["end_date"] = export_range[1].isoformat()
+                    else:
+                        error = "Choisissez une date de début et une date de fin."
+                # Un choix incomplet ne doit jamais retomber sur l'export de tout l'historique
+                if error:
+                    st.warning(error)
+                else:
+                    try:
+                        get_job_queue().submit(user, "export", params, export_conversations,
+                                               with_progress=True, user=user)
+                    except RuntimeError as e:
+                        st.warning(str(e))
+            render_jobs(user, "export")
+
         # Exemple de questions (si tu en as)
         st.markdown("### 💡 Exemples de questions")
         for i, q in enumerate(example_questions):
@@ -662,6 +807,9 @@ plt.rcParams['grid.alpha'] = 0.3
                     mime="image/png",
                     key=f"download_graph_{msg['original_query']}_{uuid.uuid4()}"
                 )
+        degraded = next((msg["degraded"] for msg in block if msg.get("degraded")), None)
+        if degraded:
+            st.caption("⏱️ Réponse allégée : " + ", ".join(DEGRADATIONS.get(t, t) for t in degraded))
 
         st.markdown("---")
 
@@ -0,0 +1,233 @@
+# streamlit_app/utils/corpus.py
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.paths import DATA_DIR
+
+# ------------------------------------------------------------------
+# Générations versionnées du corpus RAG et bascule à chaud.
+# Une génération = {version, collection, source, count, built_at}, jamais
+# modifiée après sa publication. Une nouvelle génération est construite en
+# arrière-plan pendant que l'ancienne sert les requêtes, puis publiée par
+# simple remplacement de référence : une requête en cours garde la
+# génération qu'elle a lue au début de son exécution.
+#
+# Rafraîchissement hebdomadaire : déposer un nouvel instantané
+# (python -m utils.vector_snapshot build …) ou un nouveau data/corpus.json ;
+# le veilleur le détecte et bascule sans redémarrage.
+# ------------------------------------------------------------------
+CORPUS_PATH = os.getenv("RAG_CORPUS_PATH", os.path.join(DATA_DIR, "corpus.json"))
+CORPUS_POLL_INTERVAL = float(os.getenv("RAG_CORPUS_POLL_INTERVAL", "60"))  # 0 = pas de veille
+CORPUS_KEEP_GENERATIONS = 2   # génération courante + précédente (requêtes en cours)
+EMBED_BATCH_SIZE = 64
+EMBED_BATCH_PAUSE = 0.01      # cède le CPU aux requêtes entre deux lots
+
+SwapListener = Callable[[Optional[str], str], None]
+
+
+def load_documents(path: str = CORPUS_PATH) -> List[Dict[str, Any]]:
+    """Corpus JSON [{id, content, metadata?}] s'il existe, sinon les documents intégrés."""
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    from utils.rag_utils import DEFAULT_DOCUMENTS
+    return DEFAULT_DOCUMENTS
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _previous_embeddings(collection, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Embeddings réutilisables de la génération courante (même id, même texte)."""
+    if collection is None:
+        return {}
+    texts = {str(d["id"]): d["content"] for d in documents}
+    try:
+        prev = collection.get(ids=list(texts), include=["documents", "embeddings"])
+    except Exception as e:
+        print(f"Corpus : embeddings précédents non réutilisés ({e!r})")
+        return {}
+    embeddings = prev.get("embeddings")
+    if embeddings is None:
+        return {}
+    return {
+        doc_id: emb
+        for doc_id, text, emb in zip(prev["ids"], prev["documents"], embeddings)
+        if texts.get(doc_id) == text
+    }
+
+
+def _partitioned_snapshot(snapshot, embedding_fn):
+    """Vues régionales de l'instantané (RAG_PARTITIONS), ou l'instantané entier."""
+    from utils.vector_backends import RAG_PARTITIONS, PartitionedIndex
+
+    if not RAG_PARTITIONS:
+        return snapshot
+    shards = snapshot.partitions()
+    if not shards:
+        print(f"Instantané {snapshot.name} sans partitions régionales : à reconstruire "
+              "(python -m utils.vector_snapshot build) pour le routage par région")
+        return snapshot
+    return PartitionedIndex(snapshot.name, shards, embedding_fn)
+
+
+class CorpusManager:
+    """Génération courante du corpus, reconstruite et basculée à chaud."""
+
+    def __init__(
+        self,
+        embedding_fn,
+        model_name: str = "all-MiniLM-L6-v2",
+        collection_name: str = "sante_docs",
+        corpus_path: str = CORPUS_PATH,
+        snapshot_path: Optional[str] = None
+    ):
+        from utils.vector_snapshot import DEFAULT_SNAPSHOT_PATH
+
+        self.embedding_fn = embedding_fn
+        self.model_name = model_name
+        self.collection_name = collection_name
+        self.corpus_path = corpus_path
+        self.snapshot_path = snapshot_path or DEFAULT_SNAPSHOT_PATH
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._current: Optional[Dict[str, Any]] = None
+        self._retired: List[Dict[str, Any]] = []
+        self._listeners: List[SwapListener] = []
+        self._signature = None
+        self._watcher: Optional[threading.Thread] = None
+
+    # -- lecture ----------------------------------------------------
+    def current(self) -> Dict[str, Any]:
+        """Génération publiée (à lire une fois par requête puis à conserver)."""
+        gen = self._current
+        if gen is None:
+            raise RuntimeError("Aucune génération du corpus n'est encore publiée.")
+        return gen
+
+    @property
+    def version(self) -> Optional[str]:
+        gen = self._current
+        return gen["version"] if gen is not None else None
+
+    def on_swap(self, listener: SwapListener) -> None:
+        """Appelle listener(ancienne_version, nouvelle_version) après chaque bascule."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    # -- construction -----------------------------------------------
+    def _sources_signature(self):
+        return (_file_signature(self.snapshot_path), _file_signature(self.corpus_path))
+
+    def _build(self) -> Dict[str, Any]:
+        from utils.vector_snapshot import open_snapshot, corpus_version
+
+        # 1) Instantané pré-calculé : ouverture en mmap, aucun embedding
+        current = self._current
+        snapshot = open_snapshot(self.snapshot_path, self.embedding_fn, self.model_name)
+        if snapshot is not None:
+            if current is not None and current["version"] == snapshot.version:
+                return current
+            return {"version": snapshot.version, "collection": _partitioned_snapshot(snapshot, self.embedding_fn),
+                    "source": self.snapshot_path, "count": snapshot.count()}
+
+        # 2) Sinon : nouvel index nommé d'après la version, partitionné par
+        #    région, exact (NumPy) ou HNSW (Chroma) selon la taille
+        from utils.rag_utils import index_documents
+        from utils.vector_backends import RAG_PARTITIONS, create_index, create_partitioned_index
+        from utils.ingest import prepare_documents
+
+        # Découpage et dédoublonnage avant tout embedding
+        documents = prepare_documents(load_documents(self.corpus_path))
+        version = corpus_version(documents, self.model_name)
+        if current is not None and current["version"] == version:
+            return current
+        name = f"{self.collection_name}_{version}"
+        if RAG_PARTITIONS:
+            collection = create_partitioned_index(name, self.embedding_fn, documents)
+        else:
+            collection = create_index(name, self.embedding_fn, len(documents))
+        reuse = _previous_embeddings(current["collection"] if current else None, documents)
+        index_documents(collection, documents, embedding_fn=self.embedding_fn, reuse=reuse,
+                        batch_size=EMBED_BATCH_SIZE, pause=EMBED_BATCH_PAUSE)
+        source = self.corpus_path if os.path.exists(self.corpus_path) else "documents intégrés"
+        return {"version": version, "collection": collection, "source": source,
+                "count": collection.count()}
+
+    def refresh(self) -> bool:
+        """
+        Construit la génération correspondant aux sources actuelles et la
+        publie. Renvoie True si une nouvelle version a été basculée.
+        """
+        with self._build_lock:
+            self._signature = self._sources_signature()
+            t0 = time.perf_counter()
+            gen = self._build()
+            if gen is self._current:
+                return False
+            # Requête à blanc : l'index est chaud avant d'être publié
+            gen["collection"].query(query_texts=["préchauffage"], n_results=1)
+            gen["built_at"] = time.time()
+            self._publish(gen)
+            print(f"Corpus : version {gen['version']} publiée ({gen['count']} documents, "
+                  f"{gen['source']}, {time.perf_counter() - t0:.1f}s)")
+            return True
+
+    def _publish(self, gen: Dict[str, Any]) -> None:
+        with self._lock:
+            old = self._current
+            if old is not None and old["version"] == gen["version"]:
+                return
+            self._current = gen
+            if old is not None:
+                self._retired.append(old)
+            excess = max(len(self._retired) - (CORPUS_KEEP_GENERATIONS - 1), 0)
+            dropped, self._retired = self._retired[:excess], self._retired[excess:]
+            listeners = list(self._listeners)
+        for g in dropped:
+            self._drop(g)
+        for listener in listeners:
+            try:
+                listener(old["version"] if old else None, gen["version"])
+            except Exception as e:
+                print(f"Corpus : invalidation en échec ({e!r})")
+
+    def _drop(self, gen: Dict[str, Any]) -> None:
+        # Instantanés (mmap) et index exacts se libèrent avec leur dernière référence
+        from utils.vector_backends import drop_index
+
+        drop_index(gen["collection"])
+
+    # -- veille -----------------------------------------------------
+    def check_for_updates(self) -> bool:
+        """Reconstruit si l'instantané ou le corpus JSON ont changé sur disque."""
+        if self._sources_signature() == self._signature:
+            return False
+        try:
+            return self.refresh()
+        except Exception as e:
+            # L'ancienne génération reste en service ; nouvel essai au prochain changement
+            print(f"Corpus : reconstruction en échec, version {self.version} conservée ({e!r})")
+            return False
+
+    def start_watcher(self, interval: float = CORPUS_POLL_INTERVAL) -> None:
+        """Lance (une fois) la veille des sources en arrière-plan."""
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def loop() -> None:
+            while True:
+                time.sleep(interval)
+                self.check_for_updates()
+
+        self._watcher = threading.Thread(target=loop, name="corpus-watcher", daemon=True)
+        self._watcher.start()
@@ -0,0 +1,93 @@
+# streamlit_app/utils/deadline.py
+
+import contextlib
+import contextvars
+import os
+import time
+from typing import Iterator, List, Optional, Tuple
+
+# ------------------------------------------------------------------
+# Échéance d'un tour de conversation : fixée par answer_question(), elle
+# suit le tour dans toutes ses étapes (file d'attente du fournisseur,
+# appels HTTP, appels partagés). Quand le temps restant devient court,
+# les étapes facultatives passent à une voie moins coûteuse et le tour
+# note chaque dégradation pour l'afficher avec la réponse.
+# ------------------------------------------------------------------
+TURN_DEADLINE_S = float(os.getenv("TURN_DEADLINE_S", "45"))           # 0 = sans échéance
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "60"))         # lecture, hors tour ou borné par lui
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+OPTIONAL_MIN_S = float(os.getenv("TURN_OPTIONAL_MIN_S", "15"))       # temps restant pour un appel facultatif
+CHART_MIN_S = float(os.getenv("TURN_CHART_MIN_S", "20"))             # temps restant pour demander un graphique
+
+# Étiquettes des dégradations, telles qu'affichées sous la réponse
+DEGRADATIONS = {
+    "analysis_skipped": "analyse de la question par mots-clés",
+    "local_description": "description du graphique calculée localement",
+    "no_chart": "réponse sans graphique",
+    "timeout": "délai de réponse dépassé",
+}
+
+TIMEOUT_MESSAGE = (
+    "Désolé, la réponse prend plus de temps que prévu. Veuillez reformuler ou réessayer dans quelques instants."
+)
+
+
+class DeadlineExceeded(RuntimeError):
+    """Échéance du tour atteinte, ou trop proche pour lancer une étape facultative."""
+
+
+class Turn:
+    """Échéance (horloge monotone) et dégradations d'un tour."""
+
+    def __init__(self, seconds: float = TURN_DEADLINE_S):
+        self.expires_at = time.monotonic() + seconds if seconds > 0 else None
+        self.degraded: List[str] = []
+
+    def remaining(self) -> Optional[float]:
+        return None if self.expires_at is None else self.expires_at - time.monotonic()
+
+
+_turn: contextvars.ContextVar[Optional[Turn]] = contextvars.ContextVar("turn", default=None)
+
+
+@contextlib.contextmanager
+def turn_deadline(seconds: float = TURN_DEADLINE_S) -> Iterator[Turn]:
+    """Ouvre un tour de `seconds` secondes pour le code exécuté dans le bloc."""
+    token = _turn.set(Turn(seconds))
+    try:
+        yield _turn.get()
+    finally:
+        _turn.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Secondes restantes du tour courant (None hors tour ou sans échéance)."""
+    turn = _turn.get()
+    return None if turn is None else turn.remaining()
+
+
+def has_time(seconds: float) -> bool:
+    """Vrai s'il reste au moins `seconds` secondes (toujours vrai hors tour)."""
+    left = remaining()
+    return left is None or left >= seconds
+
+
+def degrade(tag: str) -> None:
+    """Note une dégradation (clé de DEGRADATIONS) sur le tour courant."""
+    turn = _turn.get()
+    if turn is not None and tag not in turn.degraded:
+        turn.degraded.append(tag)
+
+
+def wait_timeout(limit: float) -> float:
+    """`limit` borné par le temps restant du tour (0 si l'échéance est passée)."""
+    left = remaining()
+    return limit if left is None else max(0.0, min(limit, left))
+
+
+def http_timeout() -> Tuple[float, float]:
+    """(connexion, lecture) pour requests : LLM_HTTP_TIMEOUT borné par le tour."""
+    read = wait_timeout(LLM_HTTP_TIMEOUT)
+    if read <= 0:
+        raise DeadlineExceeded("Échéance du tour atteinte avant l'appel au LLM.")
+    return min(LLM_CONNECT_TIMEOUT, read), read
@@ -0,0 +1,310 @@
+# streamlit_app/utils/export.py
+"""
+Export en masse des conversations (PDF ou ZIP) à mémoire bornée.
+
+Les conversations sont lues une à une dans le fichier d'historique (sans
+charger le tableau JSON complet), rendues puis écrites directement dans le
+fichier de sortie sur disque : la mémoire dépend de la plus grosse
+conversation, pas de la taille de l'export.
+"""
+import base64
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from utils.history import HISTO_DIR
+from utils.pdf_generator import to_latin1
+
+EXPORTS_DIR = os.path.join(HISTO_DIR, "exports")
+EXPORT_TTL_S = float(os.getenv("EXPORT_TTL_S", "86400"))          # fichiers d'export plus anciens : supprimés
+EXPORT_MAX_FILES = int(os.getenv("EXPORT_MAX_FILES_PER_USER", "5"))
+EXPORT_CACHE_FILES = 4  # exports gardés en mémoire pour le bouton de téléchargement
+
+# Taille d'impression : 180 mm de large à ~200 dpi
+PRINT_MAX_PX = (1400, 1000)
+
+ProgressFn = Callable[[float, str], None]
+
+
+def iter_history(user_id: str, chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """
+    Parcourt histories/<user>.json conversation par conversation, par
+    blocs de `chunk_size` caractères (décodage JSON incrémental).
+
+    Tant qu'une conversation est incomplète, chaque lecture double la partie
+    en attente : une grosse conversation est re-décodée O(log n) fois, pas
+    une fois par bloc.
+    """
+    path = os.path.join(HISTO_DIR, f"{user_id}.json")
+    if not os.path.exists(path):
+        return
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos, eof, started = "", 0, False, False
+        read_size = chunk_size
+        while True:
+            # Saute les séparateurs du tableau
+            while pos < len(buf) and buf[pos] in " \t\r\n,[]":
+                started = started or buf[pos] == "["
+                pos += 1
+            if pos < len(buf) and started:
+                try:
+                    obj, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    read_size = max(chunk_size, len(buf) - pos)
+                else:
+                    yield obj
+                    buf, pos = buf[end:], 0
+                    read_size = chunk_size
+                    continue
+            if eof:
+                return
+            chunk = f.read(read_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+
+
+def _in_range(conv: Dict[str, Any], start: Optional[date], end: Optional[date]) -> bool:
+    if start is None and end is None:
+        return True
+    created = conv.get("created_at")
+    if not created:
+        return False  # conversations antérieures à l'horodatage : exclues d'un filtre par dates (comptées à part)
+    day = date.fromisoformat(created[:10])
+    return (start is None or day >= start) and (end is None or day <= end)
+
+
+def select_conversations(
+    user_id: str,
+    conv_ids: Optional[List[str]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> Iterator[Dict[str, Any]]:
+    """Conversations de l'utilisateur filtrées par identifiants et/ou période."""
+    wanted = set(conv_ids) if conv_ids else None
+    for conv in iter_history(user_id):
+        if wanted is not None and conv["id"] not in wanted:
+            continue
+        if _in_range(conv, start, end):
+            yield conv
+
+
+def prune_exports(out_dir: str, keep: Optional[str] = None) -> None:
+    """Supprime les exports de plus de EXPORT_TTL_S s ou au-delà des EXPORT_MAX_FILES plus récents."""
+    if not os.path.isdir(out_dir):
+        return
+    paths = sorted((os.path.join(out_dir, f) for f in os.listdir(out_dir)), key=os.path.getmtime, reverse=True)
+    now = time.time()
+    for rank, path in enumerate(paths):
+        if path != keep and (rank >= EXPORT_MAX_FILES or now - os.path.getmtime(path) > EXPORT_TTL_S):
+            os.remove(path)
+
+
+_file_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_file_cache_lock = threading.Lock()
+
+
+def export_bytes(job_id: str, path: str) -> Optional[bytes]:
+    """
+    Contenu du fichier d'export de la tâche `job_id`, lu une seule fois puis
+    gardé en mémoire (EXPORT_CACHE_FILES derniers) ; None s'il a été supprimé.
+    """
+    with _file_cache_lock:
+        data = _file_cache.get(job_id)
+        if data is not None:
+            _file_cache.move_to_end(job_id)
+            return data
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        data = f.read()
+    with _file_cache_lock:
+        _file_cache[job_id] = data
+        while len(_file_cache) > EXPORT_CACHE_FILES:
+            _file_cache.popitem(last=False)
+    return data
+
+
+def downsample_png(png: bytes, max_px=PRINT_MAX_PX) -> bytes:
+    """Réduit une image à la taille d'impression (PNG optimisé)."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(png)) as img:
+        img.thumbnail(max_px)
+        out = io.BytesIO()
+        img.convert("RGB").save(out, format="PNG", optimize=True)
+        return out.getvalue()
+
+
+def _slug(text: str, max_len: int = 40) -> str:
+    slug = re.sub(r"[^\w\-]+", "_", text, flags=re.UNICODE).strip("_")
+    return slug[:max_len] or "conversation"
+
+
+def _plain(text: str) -> str:
+    # Retire le balisage Markdown / HTML léger des bulles
+    text = re.sub(r"```.*?```", "", text, flags=re.DOTALL)
+    text = re.sub(r"<[^>]+>", "", text)
+    return text.replace("**", "").replace("`", "")
+
+
+def conversation_pdf(conv: Dict[str, Any]) -> bytes:
+    """PDF multipage d'une conversation (texte et graphiques réduits)."""
+    from fpdf import FPDF
+
+    pdf = FPDF(orientation="P", unit="mm", format="A4")
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 16)
+    pdf.multi_cell(0, 10, to_latin1(conv.get("title") or "Conversation"), align="C")
+    if conv.get("created_at"):
+        pdf.set_font("Arial", "I", 10)
+        pdf.cell(0, 6, conv["created_at"][:16].replace("T", " "), ln=True, align="C")
+    pdf.ln(4)
+
+    tmp_paths = []
+    try:
+        for msg in conv.get("messages", []):
+            if msg.get("type") == "graph" and msg.get("image_base64"):
+                png = downsample_png(base64.b64decode(msg["image_base64"]))
+                with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
+                    tmp.write(png)
+                tmp_paths.append(tmp.name)
+                pdf.image(tmp.name, x=15, w=180)
+                pdf.ln(4)
+                continue
+            pdf.set_font("Arial", "B", 11)
+            pdf.cell(0, 7, "Utilisateur" if msg.get("role") == "user" else "Assistant", ln=True)
+            pdf.set_font("Arial", size=11)
+            pdf.multi_cell(0, 6, to_latin1(_plain(msg.get("content", ""))))
+            pdf.ln(3)
+    finally:
+        for p in tmp_paths:
+            os.unlink(p)
+    return pdf.output(dest="S").encode("latin-1", "ignore")
+
+
+def _graph_csv(graph_data: Dict[str, Any]) -> str:
+    """Séries d'un graphique au format CSV (serie, x, y)."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["serie", "x", "y"])
+    series = graph_data.get("series") or [
+        {"label": graph_data.get("ylabel", ""), "xdata": graph_data.get("xdata", []),
+         "ydata": graph_data.get("ydata", [])}
+    ]
+    for s in series:
+        for x, y in zip(s.get("xdata", []), s.get("ydata", [])):
+            writer.writerow([s.get("label", ""), x, y])
+    return out.getvalue()
+
+
+def _write_conversation_zip(zf: zipfile.ZipFile, conv: Dict[str, Any], folder: str) -> None:
+    # Messages en CSV + Markdown lisible, graphiques réduits, données des graphiques
+    rows = io.StringIO()
+    writer = csv.writer(rows)
+    writer.writerow(["index", "role", "type", "content", "image"])
+    md = [f"# {conv.get('title', '')}\n"]
+    for i, msg in enumerate(conv.get("messages", [])):
+        image_name = ""
+        if msg.get("type") == "graph" and msg.get("image_base64"):
+            image_name = f"images/{i:04d}.png"
+            zf.writestr(f"{folder}/{image_name}", downsample_png(base64.b64decode(msg["image_base64"])))
+            md.append(f"![graphique]({image_name})\n")
+            if msg.get("graph_data"):
+                zf.writestr(f"{folder}/data/{i:04d}.csv", _graph_csv(msg["graph_data"]))
+        else:
+            who = "Utilisateur" if msg.get("role") == "user" else "Assistant"
+            md.append(f"**{who}** : {msg.get('content', '')}\n")
+        writer.writerow([i, msg.get("role", ""), msg.get("type", ""), msg.get("content", ""), image_name])
+    zf.writestr(f"{folder}/messages.csv", rows.getvalue())
+    zf.writestr(f"{folder}/conversation.md", "\n".join(md))
+
+
+def export_conversations(
+    user: str,
+    fmt: str = "zip",
+    conv_ids: Optional[List[str]] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    progress: Optional[ProgressFn] = None
+) -> Dict[str, Any]:
+    """
+    Exporte les conversations sélectionnées dans histories/exports/<user>/
+    (les exports anciens de l'utilisateur sont supprimés, voir prune_exports).
+    Avec une période, les conversations sans date de création sont ignorées
+    et comptées dans "undated_skipped".
+
+    Args:
+        fmt: "pdf" (un PDF ; plusieurs conversations → une archive de PDF)
+             ou "zip" (Markdown, CSV, images et données des graphiques).
+        conv_ids: Conversations à exporter (toutes si None).
+        start_date, end_date: Période ISO sur la date de création.
+        progress: Rappel progress(fraction, message).
+
+    Returns:
+        {"path", "file_name", "mime", "conversations", "bytes", "undated_skipped"}
+    """
+    start = date.fromisoformat(start_date) if start_date else None
+    end = date.fromisoformat(end_date) if end_date else None
+    report = progress or (lambda fraction, message: None)
+
+    # Première passe (légère) pour connaître le total et suivre la progression
+    total = undated = 0
+    for conv in select_conversations(user, conv_ids):
+        if _in_range(conv, start, end):
+            total += 1
+        elif not conv.get("created_at"):
+            undated += 1
+    if total == 0:
+        hint = f" ({undated} conversation(s) sans date ignorée(s))" if undated else ""
+        raise RuntimeError(f"Aucune conversation ne correspond à la sélection{hint}.")
+
+    out_dir = os.path.join(EXPORTS_DIR, user)
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+
+    if fmt == "pdf" and total == 1:
+        conv = next(select_conversations(user, conv_ids, start, end))
+        file_name = f"{_slug(conv.get('title', ''))}-{stamp}.pdf"
+        path = os.path.join(out_dir, file_name)
+        report(0.0, conv.get("title", ""))
+        with open(path, "wb") as f:
+            f.write(conversation_pdf(conv))
+        report(1.0, "Terminé")
+        prune_exports(out_dir, keep=path)
+        return {"path": path, "file_name": file_name, "mime": "application/pdf",
+                "conversations": 1, "bytes": os.path.getsize(path), "undated_skipped": undated}
+
+    # Plusieurs conversations en PDF : une archive ZIP de PDF
+    file_name = f"conversations-{'pdf-' if fmt == 'pdf' else ''}{stamp}.zip"
+    path = os.path.join(out_dir, file_name)
+    index = io.StringIO()
+    index_writer = csv.writer(index)
+    index_writer.writerow(["id", "title", "created_at", "messages", "folder"])
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for n, conv in enumerate(select_conversations(user, conv_ids, start, end)):
+            report(n / total, conv.get("title", ""))
+            folder = f"{n + 1:04d}_{_slug(conv.get('title', ''))}"
+            if fmt == "pdf":
+                zf.writestr(f"{folder}.pdf", conversation_pdf(conv))
+            else:
+                _write_conversation_zip(zf, conv, folder)
+            index_writer.writerow([conv["id"], conv.get("title", ""), conv.get("created_at", ""),
+                                   len(conv.get("messages", [])), folder])
+        zf.writestr("index.csv", index.getvalue())
+    report(1.0, "Terminé")
+    prune_exports(out_dir, keep=path)
+    return {"path": path, "file_name": file_name, "mime": "application/zip",
+            "conversations": total, "bytes": os.path.getsize(path), "undated_skipped": undated}
@@ -2,10 +2,11 @@
 
 import os
 import json
+import tempfile
 from typing import List, Dict, Any
 
-# Répertoire où seront stockés les historiques de conversation
-HISTO_DIR = "histories"
+# Répertoire où seront stockés les historiques de conversation (racine du dépôt)
+from utils.paths import HISTO_DIR
 os.makedirs(HISTO_DIR, exist_ok=True)
 
 def load_history(user_id: str) -> List[Dict[str, Any]]:
@@ -16,7 +17,10 @@ def load_history(user_id: str) -> List[Dict[str, Any]]:
     path = os.path.join(HISTO_DIR, f"{user_id}.json")
     if os.path.exists(path):
         with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+            conversations = json.load(f)
+        # Rattrapage de l'index de recherche (sans effet s'il est à jour)
+        _update_search_index(user_id, conversations)
+        return conversations
     return []
 
 def save_history(user_id: str, conversations: List[Dict[str, Any]]) -> None:
@@ -25,5 +29,28 @@ def save_history(user_id: str, conversations: List[Dict[str, Any]]) -> None:
     Écrase le fichier précédent si besoin.
     """
     path = os.path.join(HISTO_DIR, f"{user_id}.json")
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(conversations, f, ensure_ascii=False, indent=2)
+    # Écriture atomique : un export en cours de lecture ne voit jamais un fichier tronqué.
+    # Fichier temporaire unique : deux sessions du même utilisateur ne s'écrasent pas en cours d'écriture.
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=HISTO_DIR, prefix=f"{user_id}.", suffix=".tmp", delete=False
+    ) as f:
+        tmp = f.name
+        try:
+            json.dump(conversations, f, ensure_ascii=False, indent=2)
+        except BaseException:
+            f.close()
+            os.remove(tmp)
+            raise
+    os.replace(tmp, path)
+    _update_search_index(user_id, conversations)
+
+def _update_search_index(user_id: str, conversations: List[Dict[str, Any]]) -> None:
+    """Met à jour l'index plein texte ; une erreur d'index ne bloque pas la sauvegarde."""
+    # Import local : search_index dépend lui-même de HISTO_DIR
+    import sqlite3
+    from utils.search_index import index_conversations
+
+    try:
+        index_conversations(user_id, conversations)
+    except sqlite3.Error as e:
+        print(f"Index de recherche non mis à jour : {e}")
@@ -0,0 +1,200 @@
+# streamlit_app/utils/ingest.py
+"""
+Préparation du corpus avant embedding : découpage des longs documents en
+passages de taille bornée, puis élimination des quasi-doublons par
+MinHash/LSH (les bulletins régionaux répètent le même texte d'une région à
+l'autre). Seuls les passages retenus sont encodés et indexés ; l'identifiant
+des doublons écartés est conservé dans la métadonnée "duplicates" du passage
+gardé.
+
+Aperçu (depuis streamlit_app/) :
+    python -m utils.ingest --corpus ../data/corpus.json
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+INGEST_CHUNK_TOKENS = int(os.getenv("INGEST_CHUNK_TOKENS", "160"))   # ≤ moitié de RAG_TOKEN_BUDGET
+INGEST_DEDUP_THRESHOLD = float(os.getenv("INGEST_DEDUP_THRESHOLD", "0.85"))  # Jaccard estimée
+MINHASH_PERM = 64
+LSH_BANDS = 16            # 16 bandes × 4 lignes : candidats dès ~0,5 de similarité
+SHINGLE_WORDS = 3
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(20240501)
+_PERM_A = _rng.integers(1, 1 << 32, size=MINHASH_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 32, size=MINHASH_PERM, dtype=np.uint64)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+
+
+def _tokens(text: str) -> int:
+    # Même estimation que rag_utils.estimate_tokens (≈ 4 caractères par token)
+    return len(text) // 4 + 1
+
+
+def split_chunks(text: str, max_tokens: int = INGEST_CHUNK_TOKENS) -> List[str]:
+    """Découpe un texte en passages d'au plus max_tokens, aux fins de phrase."""
+    if _tokens(text) <= max_tokens:
+        return [text]
+    pieces: List[str] = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        # Phrase trop longue : coupée aux mots
+        while _tokens(sentence) > max_tokens:
+            cut = sentence.rfind(" ", 0, max_tokens * 4)
+            cut = cut if cut > 0 else max_tokens * 4
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            pieces.append(sentence)
+
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        candidate = f"{current} {piece}" if current else piece
+        if current and _tokens(candidate) > max_tokens:
+            chunks.append(current)
+            current = piece
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _shingles(text: str) -> List[str]:
+    # Les nombres sont gardés : deux régions au même gabarit mais aux
+    # valeurs différentes ne doivent pas être confondues
+    words = re.findall(r"\w+", text.lower(), flags=re.UNICODE)
+    if len(words) < SHINGLE_WORDS:
+        return [" ".join(words)]
+    return [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+
+
+def minhash(text: str) -> np.ndarray:
+    """Signature MinHash (MINHASH_PERM valeurs) des 3-grammes de mots du texte."""
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+         for s in set(_shingles(text))),
+        dtype=np.uint64
+    )
+    # (a·x + b) mod (2^61 - 1) : a, x < 2^32, donc pas de débordement sur 64 bits
+    permuted = (hashes[None, :] * _PERM_A[:, None] + _PERM_B[:, None]) % _MERSENNE
+    return permuted.min(axis=1)
+
+
+def find_near_duplicates(
+    texts: List[str],
+    threshold: float = INGEST_DEDUP_THRESHOLD,
+    groups: Optional[List[str]] = None
+) -> Dict[int, int]:
+    """
+    Quasi-doublons par LSH sur les signatures MinHash.
+
+    Args:
+        groups: partition de chaque texte (ex. région) ; les seaux LSH sont
+            propres à chaque partition, deux textes de partitions différentes
+            ne sont donc jamais comparés.
+
+    Returns:
+        {indice du doublon: indice du texte conservé (le premier rencontré)}
+    """
+    if not texts:
+        return {}
+    signatures = np.stack([minhash(t) for t in texts])
+    rows = MINHASH_PERM // LSH_BANDS
+    buckets: Dict[Tuple[str, int, bytes], List[int]] = {}
+    duplicates: Dict[int, int] = {}
+    for i, sig in enumerate(signatures):
+        group = groups[i] if groups is not None else ""
+        candidates = set()
+        for band in range(LSH_BANDS):
+            key = (group, band, sig[band * rows:(band + 1) * rows].tobytes())
+            candidates.update(buckets.get(key, ()))
+        # Vérification sur la signature complète (Jaccard estimée)
+        best = max(
+            (j for j in candidates if float(np.mean(signatures[j] == sig)) >= threshold),
+            key=lambda j: float(np.mean(signatures[j] == sig)),
+            default=None
+        )
+        if best is not None:
+            duplicates[i] = best
+            continue
+        for band in range(LSH_BANDS):
+            buckets.setdefault((group, band, sig[band * rows:(band + 1) * rows].tobytes()), []).append(i)
+    return duplicates
+
+
+def prepare_documents(
+    documents: List[Dict[str, Any]],
+    max_tokens: int = INGEST_CHUNK_TOKENS,
+    threshold: float = INGEST_DEDUP_THRESHOLD
+) -> List[Dict[str, Any]]:
+    """
+    Découpe puis dédoublonne le corpus.
+
+    Un document court garde son identifiant ; un document découpé donne les
+    passages "<id>#<n>". Métadonnées : "source" (document d'origine),
+    "chunk" (rang), "region" (partition, déduite du document entier) et, le
+    cas échéant, "duplicates" (identifiants écartés, séparés par des virgules).
+    Deux passages de régions différentes ne sont jamais des doublons.
+    """
+    from utils.regions import document_region
+
+    chunks: List[Dict[str, Any]] = []
+    for doc in documents:
+        parts = split_chunks(doc["content"], max_tokens)
+        region = document_region(doc["content"], doc.get("metadata"))
+        for n, part in enumerate(parts):
+            metadata = dict(doc.get("metadata") or {})
+            metadata.update({"source": str(doc["id"]), "chunk": n, "region": region})
+            chunks.append({
+                "id": str(doc["id"]) if len(parts) == 1 else f"{doc['id']}#{n}",
+                "content": part,
+                "metadata": metadata,
+            })
+
+    regions = [c["metadata"]["region"] for c in chunks]
+    duplicates = find_near_duplicates([c["content"] for c in chunks], threshold, groups=regions)
+    crossed = [(chunks[d]["id"], chunks[k]["id"]) for d, k in duplicates.items() if regions[d] != regions[k]]
+    if crossed:
+        # Fusionner deux régions effacerait une série régionale de l'index
+        raise RuntimeError(f"Dédoublonnage entre régions différentes : {crossed[:5]}")
+    for dup, kept in duplicates.items():
+        meta = chunks[kept]["metadata"]
+        merged = [x for x in meta.get("duplicates", "").split(",") if x]
+        meta["duplicates"] = ",".join(merged + [chunks[dup]["id"]])
+    prepared = [c for i, c in enumerate(chunks) if i not in duplicates]
+    print(f"Ingestion : {len(documents)} documents → {len(chunks)} passages, "
+          f"{len(duplicates)} quasi-doublons écartés, {len(prepared)} indexés")
+    return prepared
+
+
+def _main() -> None:
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Aperçu du découpage et du dédoublonnage du corpus.")
+    parser.add_argument("--corpus", help="fichier JSON [{id, content, metadata?}] (défaut : documents intégrés)")
+    parser.add_argument("--max-tokens", type=int, default=INGEST_CHUNK_TOKENS)
+    parser.add_argument("--threshold", type=float, default=INGEST_DEDUP_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            documents = json.load(f)
+    else:
+        from utils.rag_utils import DEFAULT_DOCUMENTS
+        documents = DEFAULT_DOCUMENTS
+    for doc in prepare_documents(documents, args.max_tokens, args.threshold):
+        if doc["metadata"].get("duplicates"):
+            print(f"  {doc['id']} ← {doc['metadata']['duplicates']}")
+
+
+if __name__ == "__main__":
+    _main()
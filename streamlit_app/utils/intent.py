@@ -0,0 +1,273 @@
+# streamlit_app/utils/intent.py
+"""
+Classifieur d'intention local (remplace l'appel LLM d'analyze_question).
+
+Deux régressions logistiques (données disponibles ? visualisation ?) sur
+l'embedding de la question déjà calculé pour la recherche, complété par les
+scores de récupération. L'appel LLM n'est utilisé qu'en cas de faible confiance.
+
+Entraînement (depuis streamlit_app/, à partir des histories/*.json de la
+racine du dépôt) :
+    python -m utils.intent train
+"""
+from __future__ import annotations
+
+import glob
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.paths import DATA_DIR, HISTO_DIR
+
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", os.path.join(DATA_DIR, "intent_model.npz"))
+# Probabilité minimale de la classe prédite, pour chaque tête, avant repli sur le LLM
+INTENT_MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.8"))
+
+NO_DATA_WARNING = "⚠️ Je n'ai pas trouvé de données santé"
+VISUALIZATION_FAILURES = (
+    "Désolé, je n'ai pas pu générer le graphique",
+    "Je n'ai pas pu générer de visualisation",
+)
+
+# Exemples amorces : (question, data_available, needs_visualization)
+SEED_EXAMPLES: List[Tuple[str, bool, bool]] = [
+    ("Montre l'évolution des troubles respiratoires à Québec sur les 10 dernières années.", True, True),
+    ("Compare les cas d'asthme à Montréal entre 2014 et 2023.", True, True),
+    ("Trace l'évolution de l'anxiété chez les jeunes adultes depuis 2019.", True, True),
+    ("Affiche la progression du taux d'occupation des urgences à Montréal depuis 2019.", True, True),
+    ("Montre l'évolution des délais d'attente pour les spécialistes depuis 2017.", True, True),
+    ("Trace la courbe de l'activité physique chez les 18-30 ans depuis 2018.", True, True),
+    ("Montre la progression du dépistage du cancer du sein entre 2019 et 2023.", True, True),
+    ("Compare la consommation de fruits et légumes à Québec depuis 2018.", True, True),
+    ("Fais un graphique de la surcharge hospitalière à Québec.", True, True),
+    ("Comment a évolué l'accès aux médecins de famille à Montréal depuis 2017 ?", True, False),
+    ("Comment a évolué la couverture vaccinale chez les 65+ ans depuis 2019 ?", True, False),
+    ("Quel était le taux de dépression chez les étudiants en 2021 ?", True, False),
+    ("Pourquoi les troubles respiratoires ont-ils augmenté depuis 2020 ?", True, False),
+    ("Quel est le taux d'occupation des urgences à Montréal en 2023 ?", True, False),
+    ("Résume la situation de l'asthme à Montréal.", True, False),
+    ("Bonjour, comment vas-tu ?", False, False),
+    ("Quelle est la capitale de l'Australie ?", False, False),
+    ("Écris-moi un poème sur l'automne.", False, False),
+    ("Peux-tu m'aider à rédiger un courriel à mon collègue ?", False, False),
+    ("Qui a gagné la coupe Stanley en 1993 ?", False, False),
+    ("Traduis « bonne journée » en anglais.", False, False),
+    ("Explique-moi la théorie de la relativité.", False, False),
+]
+
+
+def _features(question_embedding, passages: List[Dict[str, Any]]) -> np.ndarray:
+    """Embedding normalisé + scores de récupération (max, moyenne, nombre)."""
+    e = np.asarray(question_embedding, dtype=np.float32).ravel()
+    e = e / max(float(np.linalg.norm(e)), 1e-12)
+    scores = np.array([p.get("score", 0.0) for p in passages] or [0.0], dtype=np.float32)
+    extra = np.array([scores.max(), scores.mean(), min(len(passages), 8) / 8.0], dtype=np.float32)
+    return np.concatenate([e, extra])
+
+
+def _fit_logistic(X: np.ndarray, y: np.ndarray, l2: float = 1e-2, lr: float = 0.5, epochs: int = 800):
+    """Régression logistique binaire (descente de gradient, classes pondérées)."""
+    n, d = X.shape
+    w, b = np.zeros(d, dtype=np.float64), 0.0
+    pos = max(y.mean(), 1e-3)
+    sample_w = np.where(y > 0.5, 0.5 / pos, 0.5 / max(1 - pos, 1e-3))
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-(X @ w + b)))
+        g = sample_w * (p - y)
+        w -= lr * (X.T @ g / n + l2 * w)
+        b -= lr * g.mean()
+    return w.astype(np.float32), np.float32(b)
+
+
+class IntentClassifier:
+    """Deux têtes logistiques partageant les mêmes caractéristiques."""
+
+    def __init__(self, weights: Dict[str, Tuple[np.ndarray, float]], model_name: str = ""):
+        self.weights = weights
+        self.model_name = model_name
+
+    @classmethod
+    def fit(cls, X: np.ndarray, labels: Dict[str, np.ndarray], model_name: str = "") -> "IntentClassifier":
+        return cls({head: _fit_logistic(X, y.astype(np.float64)) for head, y in labels.items()}, model_name)
+
+    def predict_proba(self, x: np.ndarray) -> Dict[str, float]:
+        out = {}
+        for head, (w, b) in self.weights.items():
+            out[head] = float(1.0 / (1.0 + np.exp(-(x @ w + b))))
+        return out
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        arrays = {}
+        for head, (w, b) in self.weights.items():
+            arrays[f"{head}__w"] = w
+            arrays[f"{head}__b"] = np.array([b], dtype=np.float32)
+        np.savez(path, model_name=np.array(self.model_name), **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        with np.load(path) as data:
+            heads = {k[:-3] for k in data.files if k.endswith("__w")}
+            weights = {h: (data[f"{h}__w"], float(data[f"{h}__b"][0])) for h in heads}
+            return cls(weights, str(data["model_name"]))
+
+
+_classifier: Optional[IntentClassifier] = None
+_loaded = False
+_lock = threading.Lock()
+_mismatch_logged: set = set()
+
+
+def get_classifier(model_name: Optional[str] = None) -> Optional[IntentClassifier]:
+    """
+    Classifieur du processus, chargé depuis INTENT_MODEL_PATH (ou None) ;
+    None aussi s'il a été entraîné avec un autre modèle d'embedding que
+    `model_name`.
+    """
+    global _classifier, _loaded
+    with _lock:
+        if not _loaded:
+            _loaded = True
+            if os.path.exists(INTENT_MODEL_PATH):
+                try:
+                    _classifier = IntentClassifier.load(INTENT_MODEL_PATH)
+                except (OSError, KeyError, ValueError) as e:
+                    print(f"Classifieur d'intention ignoré : {e}")
+        clf = _classifier
+    if clf is not None and model_name and clf.model_name != model_name:
+        if model_name not in _mismatch_logged:
+            _mismatch_logged.add(model_name)
+            print(f"Classifieur d'intention ignoré : entraîné avec {clf.model_name or '?'}, "
+                  f"modèle d'embedding courant {model_name}")
+        return None
+    return clf
+
+
+def classify_intent(
+    question_embedding,
+    passages: List[Dict[str, Any]],
+    min_confidence: float = INTENT_MIN_CONFIDENCE,
+    model_name: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Décide localement {data_available, needs_visualization, response_type}.
+    Renvoie None si aucun modèle n'est disponible (ou s'il a été entraîné
+    avec un autre modèle d'embedding que `model_name`) ou si la confiance
+    est insuffisante : l'appelant se replie alors sur analyze_question (LLM).
+    """
+    clf = get_classifier(model_name)
+    if clf is None or question_embedding is None:
+        return None
+    x = _features(question_embedding, passages)
+    if x.shape[0] != clf.weights["data_available"][0].shape[0]:
+        return None  # modèle entraîné avec un autre embedding
+    proba = clf.predict_proba(x)
+    confidence = min(max(p, 1.0 - p) for p in proba.values())
+    if confidence < min_confidence:
+        return None
+    needs_vis = proba["needs_visualization"] >= 0.5
+    return {
+        "data_available": proba["data_available"] >= 0.5,
+        "needs_visualization": needs_vis,
+        "response_type": "graph" if needs_vis else "text",
+        "explanation": f"Classifieur local (confiance {confidence:.2f}).",
+        "source": "local",
+        "confidence": round(confidence, 3),
+    }
+
+
+def labels_from_history(histo_dir: str = HISTO_DIR) -> List[Tuple[str, bool, bool]]:
+    """
+    Extrait (question, data_available, needs_visualization) des historiques.
+    Les décisions enregistrées par le LLM (clé "intent", source "llm") font
+    foi. Les tours décidés par le classifieur lui-même ou par le repli par
+    mots-clés sont écartés : leurs réponses découlent de cette décision et
+    le réentraîneraient sur ses propres sorties. Seuls les tours sans
+    décision enregistrée (antérieurs au classifieur) sont déduits des
+    réponses (graphique produit, mode général…).
+    """
+    examples = []
+    for path in glob.glob(os.path.join(histo_dir, "*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            conversations = json.load(f)
+        for conv in conversations:
+            msgs = conv.get("messages", [])
+            for i, msg in enumerate(msgs):
+                if msg.get("role") != "user":
+                    continue
+                intent = msg.get("intent")
+                if intent:
+                    if intent.get("source") == "llm":
+                        examples.append((msg["content"], bool(intent["data_available"]),
+                                         bool(intent["needs_visualization"])))
+                    continue
+                replies = []
+                for nxt in msgs[i + 1:]:
+                    if nxt.get("role") != "bot":
+                        break
+                    replies.append(nxt)
+                if not replies:
+                    continue
+                no_data = any(r.get("content", "").startswith(NO_DATA_WARNING) for r in replies)
+                # Un graphique produit, ou un échec de tracé, signale une demande de visualisation
+                graph = any(
+                    r.get("type") == "graph"
+                    or r.get("content", "").startswith(VISUALIZATION_FAILURES)
+                    for r in replies
+                )
+                examples.append((msg["content"], not no_data, graph and not no_data))
+    return examples
+
+
+def train(embedding_fn, collection, model_name: str = "", path: str = INTENT_MODEL_PATH) -> Dict[str, Any]:
+    """
+    Entraîne le classifieur sur SEED_EXAMPLES + historiques et l'enregistre.
+    Les caractéristiques sont calculées comme à l'inférence : recherche
+    limitée aux partitions des régions citées (route_collection).
+    """
+    from utils.rag_utils import retrieve_passages, route_collection
+
+    examples = SEED_EXAMPLES + labels_from_history()
+    questions = [q for q, _, _ in examples]
+    embs = np.asarray(embedding_fn(questions), dtype=np.float32)
+    X = np.stack([
+        _features(e, retrieve_passages(route_collection(collection, q), q, query_embedding=e))
+        for q, e in zip(questions, embs)
+    ])
+    labels = {
+        "data_available": np.array([d for _, d, _ in examples], dtype=np.float32),
+        "needs_visualization": np.array([v for _, _, v in examples], dtype=np.float32),
+    }
+    clf = IntentClassifier.fit(X, labels, model_name)
+    clf.save(path)
+
+    train_acc = {}
+    for head, y in labels.items():
+        w, b = clf.weights[head]
+        train_acc[head] = float((((X @ w + b) > 0) == (y > 0.5)).mean())
+    return {"examples": len(examples), "path": path, "train_accuracy": train_acc}
+
+
+def _main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Classifieur d'intention local.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    t = sub.add_parser("train", help="entraîne depuis les historiques et les exemples amorces")
+    t.add_argument("--model", default="all-MiniLM-L6-v2")
+    t.add_argument("--out", default=INTENT_MODEL_PATH)
+    args = parser.parse_args()
+
+    from utils.warmup import get_resources, start_warmup
+
+    start_warmup(model_name=args.model)
+    res = get_resources()
+    report = train(res["embedding_fn"], res["collection"], args.model, args.out)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    _main()
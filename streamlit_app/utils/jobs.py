@@ -0,0 +1,214 @@
+# streamlit_app/utils/jobs.py
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.history import HISTO_DIR
+
+# ------------------------------------------------------------------
+# File de tâches en processus (génération de rapports, etc.).
+# Un pool borné de threads exécute les tâches ; chaque changement d'état
+# est écrit dans histories/jobs/<user>/<job_id>.json pour qu'un redémarrage
+# ne perde pas un résultat terminé ; ces fichiers ne sont relus qu'au
+# démarrage. Les tâches terminées sont oubliées (mémoire et disque) après
+# JOB_TTL_S secondes ou au-delà des JOB_MAX_FINISHED_PER_USER plus récentes.
+# ------------------------------------------------------------------
+JOBS_DIR = os.path.join(HISTO_DIR, "jobs")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+MAX_PENDING_PER_USER = int(os.getenv("JOB_MAX_PENDING_PER_USER", "5"))
+JOB_TTL_S = float(os.getenv("JOB_TTL_S", str(7 * 24 * 3600)))
+MAX_FINISHED_PER_USER = int(os.getenv("JOB_MAX_FINISHED_PER_USER", "20"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobQueue:
+    """File de tâches bornée, partagée par toutes les sessions du processus."""
+
+    def __init__(self, max_workers: int = JOB_WORKERS, jobs_dir: str = JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._by_user: Dict[str, List[str]] = {}  # user → identifiants, par ordre de soumission
+        self._load()
+
+    # -- persistance ------------------------------------------------
+    def _path(self, user: str, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, user, f"{job_id}.json")
+
+    def _persist(self, job: Dict[str, Any]) -> None:
+        path = self._path(job["user"], job["id"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _load(self) -> None:
+        # Au démarrage : tâches persistées ; une tâche active sur disque a été interrompue
+        if not os.path.isdir(self.jobs_dir):
+            return
+        for user in os.listdir(self.jobs_dir):
+            user_dir = os.path.join(self.jobs_dir, user)
+            if not os.path.isdir(user_dir):
+                continue
+            jobs = []
+            for name in os.listdir(user_dir):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(user_dir, name), "r", encoding="utf-8") as f:
+                        jobs.append(json.load(f))
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"Tâche illisible ignorée ({user}/{name}) : {e!r}")
+            for job in sorted(jobs, key=lambda j: j["submitted_at"]):
+                if job["status"] in ACTIVE_STATUSES:
+                    job.update(status="error", error="Tâche interrompue par un redémarrage du serveur.",
+                               finished_at=job.get("finished_at") or time.time())
+                    self._persist(job)
+                self._jobs[job["id"]] = job
+                self._by_user.setdefault(user, []).append(job["id"])
+            self._prune(user)
+
+    def _prune(self, user: str) -> None:
+        """Oublie les tâches terminées expirées ou en surnombre pour `user`."""
+        now = time.time()
+        with self._lock:
+            finished = [self._jobs[j] for j in reversed(self._by_user.get(user, []))
+                        if self._jobs[j]["status"] not in ACTIVE_STATUSES]
+        stale = [
+            job["id"] for rank, job in enumerate(finished)
+            if rank >= MAX_FINISHED_PER_USER or now - (job["finished_at"] or job["submitted_at"]) > JOB_TTL_S
+        ]
+        for job_id in stale:
+            self.delete(user, job_id)
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            snapshot = dict(job)
+        self._persist(snapshot)
+
+    # -- API --------------------------------------------------------
+    def submit(
+        self,
+        user: str,
+        kind: str,
+        params: Dict[str, Any],
+        fn: Callable[..., Dict[str, Any]],
+        with_progress: bool = False,
+        **runtime_kwargs
+    ) -> str:
+        """
+        Met en file `fn(**runtime_kwargs, **params)` et renvoie l'identifiant.
+        `params` (sérialisables JSON) sont persistés ; `runtime_kwargs`
+        (collection, modèle…) ne le sont pas. Avec with_progress=True, `fn`
+        reçoit aussi `progress(fraction, message)`, reflété dans job["progress"].
+        """
+        self._prune(user)
+        job_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        job = {
+            "id": job_id,
+            "user": user,
+            "kind": kind,
+            "params": params,
+            "status": "queued",
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            "progress": None,
+        }
+        # Comptage et insertion sous le même verrou : deux clics simultanés ne dépassent pas la limite
+        with self._lock:
+            pending = sum(
+                1 for j in self._by_user.get(user, []) if self._jobs[j]["status"] in ACTIVE_STATUSES
+            )
+            if pending >= MAX_PENDING_PER_USER:
+                raise RuntimeError(
+                    f"Trop de tâches en attente ({pending}). Patientez avant d'en lancer une autre."
+                )
+            self._jobs[job_id] = job
+            self._by_user.setdefault(user, []).append(job_id)
+        self._persist(job)
+        if with_progress:
+            runtime_kwargs["progress"] = self._progress_callback(job_id)
+        # Le contexte de la session (utilisateur courant…) suit la tâche
+        ctx = contextvars.copy_context()
+        self._executor.submit(ctx.run, self._run, job_id, fn, params, runtime_kwargs)
+        return job_id
+
+    def _progress_callback(self, job_id: str, min_interval: float = 0.5):
+        last = [0.0]
+
+        def progress(fraction: float, message: str = "") -> None:
+            # Écriture disque limitée à une toutes les min_interval secondes
+            now = time.time()
+            if fraction < 1.0 and now - last[0] < min_interval:
+                return
+            last[0] = now
+            self._update(job_id, progress={"fraction": round(fraction, 3), "message": message})
+
+        return progress
+
+    def _run(self, job_id: str, fn, params, runtime_kwargs) -> None:
+        self._update(job_id, status="running", started_at=time.time())
+        try:
+            result = fn(**runtime_kwargs, **params)
+        except Exception as e:
+            self._update(job_id, status="error", error=str(e), finished_at=time.time())
+        else:
+            self._update(job_id, status="done", result=result, finished_at=time.time())
+        with self._lock:
+            user = self._jobs[job_id]["user"]
+        self._prune(user)
+
+    def get(self, user: str, job_id: str) -> Optional[Dict[str, Any]]:
+        """Copie de la tâche de `user`, ou None (inconnue ou oubliée)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None and job["user"] == user else None
+
+    def list_jobs(self, user: str, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Tâches de l'utilisateur, les plus récentes en premier (sans lecture disque)."""
+        self._prune(user)
+        with self._lock:
+            jobs = [dict(self._jobs[j]) for j in reversed(self._by_user.get(user, []))]
+        if kind:
+            jobs = [j for j in jobs if j["kind"] == kind]
+        return jobs
+
+    def delete(self, user: str, job_id: str) -> None:
+        """Oublie une tâche terminée (fichier compris)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] in ACTIVE_STATUSES:
+                return
+            self._jobs.pop(job_id, None)
+            if job_id in self._by_user.get(user, []):
+                self._by_user[user].remove(job_id)
+        path = self._path(user, job_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """File de tâches unique du processus (créée au premier appel)."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
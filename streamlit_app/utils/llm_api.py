@@ -1,71 +1,89 @@
 # streamlit_app/utils/llm_api.py
 
+import contextvars
 import os
-import re
-import requests
 from dotenv import load_dotenv
 from typing import Optional
 
+from utils.deadline import DeadlineExceeded, OPTIONAL_MIN_S, has_time, remaining
+from utils.llm_providers import resolve_route, route_from_spec
+from utils.singleflight import SingleFlight, digest
+from utils.usage import get_usage_tracker
+
 # Charge .env
 load_dotenv()
 
 # URL de l'API Mistral
 MISTRAL_URL = "https://api.mistral.ai/v1/chat/completions"
 
-def _load_and_clean_api_key() -> str:
-    """
-    Récupère la clé depuis l'env, affiche sa repr pour debug,
-    et supprime tout caractère hors-ASCII ou guillemets.
-    """
-    raw = os.getenv("MISTRAL_API_KEY", "")
-    # DEBUG : voir exactement ce qu'on a chargé
-    print("DEBUG MISTRAL_API_KEY repr:", repr(raw))
+# Appels identiques simultanés (même question d'exemple, même rapport) :
+# un seul appel réel, partagé entre les sessions
+llm_flight = SingleFlight("llm")
+
+# Budget de jetons dépassé (voir utils/usage.py) : les appels facultatifs
+# sont sautés (l'appelant se replie sur un traitement local), les autres
+# passent par LLM_BUDGET_ROUTE (modèle moins cher) si elle est définie.
+OPTIONAL_TASKS = ("analyze", "describe", "title")
+BUDGET_MESSAGE = (
+    "Le quota quotidien d'utilisation de l'assistant est atteint. "
+    "Veuillez réessayer demain ou contacter l'administrateur."
+)
+
+
+# Travail de fond facultatif (préchargement) : tous ses appels sont sautés
+# quand le budget est atteint, quelle que soit la tâche
+optional_calls: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_optional", default=False)
 
-    # on enlève espaces en tête/queue, guillemets simples ou doubles
-    key = raw.strip().strip('"').strip("'")
-    # on supprime tout caractère non-ASCII (0x00-0x7F)
-    key = re.sub(r'[^\x00-\x7F]', '', key)
 
-    return key
+def set_optional_calls(optional: bool = True) -> None:
+    optional_calls.set(optional)
+
+
+class BudgetExceeded(RuntimeError):
+    """Appel facultatif refusé : budget de jetons atteint."""
+
 
 def get_llm_response(
     prompt: str,
-    model: str = "mistral-medium",
-    
+    model: Optional[str] = None,
+    task: str = "chat",
 ) -> str:
     """
-    Envoie un prompt à l'API Mistral et renvoie la réponse textuelle.
+    Envoie un prompt au fournisseur LLM routé pour `task` (voir
+    llm_providers.resolve_route) et renvoie la réponse textuelle. Un appel
+    identique déjà en cours dans le processus est partagé plutôt que relancé.
+
+    Budget de jetons atteint : lève BudgetExceeded pour les tâches de
+    OPTIONAL_TASKS et pour tout appel marqué par set_optional_calls, sinon utilise LLM_BUDGET_ROUTE ou renvoie BUDGET_MESSAGE.
+
+    Échéance du tour (utils/deadline.py) : lève DeadlineExceeded si elle est
+    atteinte, ou pour une tâche de OPTIONAL_TASKS s'il reste moins de
+    OPTIONAL_MIN_S secondes (l'appelant se replie alors sur le local).
+
+    Args:
+        prompt: Le prompt complet.
+        model:  Modèle explicite (sinon celui de la route).
+        task:   Type d'appel ("chat", "report", "analyze", "describe", "general"…).
     """
-    api_key = _load_and_clean_api_key()
-    if not api_key:
-        raise RuntimeError(
-            "MISTRAL_API_KEY non configurée ou incorrecte. "
-            "Vérifiez votre fichier .env sans espaces, guillemets, ni caractères spéciaux."
-        )
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": model,
-        "messages": [{"role": "user", "content": prompt}]
-    }
-
-    try:
-        resp = requests.post(MISTRAL_URL, headers=headers, json=payload)
-    except requests.RequestException as e:
-        raise RuntimeError(f"Erreur de connexion à l'API LLM : {e}")
-
-    if resp.status_code == 429:
-        # Cas de saturation du service
-        return "Désolé, le service est temporairement surchargé. Veuillez réessayer dans quelques instants."
-    if resp.status_code != 200:
-        msg = resp.text or resp.reason
-        raise RuntimeError(f"Erreur API (status {resp.status_code}) : {msg}")
-
-    data = resp.json()
-    try:
-        return data["choices"][0]["message"]["content"]
-    except (KeyError, IndexError) as e:
-        raise RuntimeError(f"Format de réponse inattendu : {e}")
+    if task in OPTIONAL_TASKS and not has_time(OPTIONAL_MIN_S):
+        raise DeadlineExceeded(f"Échéance du tour trop proche : appel « {task} » sauté.")
+    if get_usage_tracker().budget_status()["exceeded"]:
+        if task in OPTIONAL_TASKS or optional_calls.get():
+            raise BudgetExceeded(f"Budget de jetons atteint : appel « {task} » sauté.")
+        budget_route = os.getenv("LLM_BUDGET_ROUTE")
+        if not budget_route:
+            return BUDGET_MESSAGE
+        provider, model_name = route_from_spec(budget_route)
+        task = f"{task}_budget"
+    else:
+        provider, model_name = resolve_route(task, model)
+    key = (provider.name, model_name, digest(prompt))
+    for attempt in range(2):
+        try:
+            return llm_flight.do(key, provider.complete, prompt, model_name, task, timeout=remaining())
+        except TimeoutError:
+            raise DeadlineExceeded(f"Échéance du tour atteinte en attendant l'appel « {task} » partagé.")
+        except DeadlineExceeded:
+            # Échéance de l'appelant qui menait l'appel partagé, pas la nôtre : une relance
+            if attempt or not has_time(0):
+                raise
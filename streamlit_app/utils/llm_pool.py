@@ -0,0 +1,240 @@
+# streamlit_app/utils/llm_pool.py
+
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from utils.deadline import DeadlineExceeded, remaining, wait_timeout
+from utils.llm_providers import (ChatCompletionsProvider, LLMProvider, LLM_QUEUE_TIMEOUT, OVERLOADED_MESSAGE,
+                                 clean_api_key)
+from utils.usage import get_usage_tracker
+
+# ------------------------------------------------------------------
+# Groupe de points d'accès (URL + clé) derrière un même fournisseur :
+# routage pondéré tenant compte des appels en cours, contrôle de santé
+# passif (résultat des vrais appels), disjoncteur par point d'accès et
+# bascule automatique vers le suivant en cas d'erreur ou de quota (429).
+#
+# Configuration par variables numérotées, les variables sans suffixe
+# servant de valeurs par défaut :
+#   MISTRAL_API_KEY_1=…   MISTRAL_WEIGHT_1=2
+#   MISTRAL_URL_2=https://…  MISTRAL_API_KEY_2=…  MISTRAL_MAX_CONCURRENCY_2=8
+# ------------------------------------------------------------------
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))    # échecs consécutifs avant ouverture
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # s avant un appel d'essai
+HEALTH_ALPHA = 0.2  # lissage exponentiel du taux d'erreur et de la latence
+
+
+class CircuitBreaker:
+    """
+    Fermé : appels autorisés. Ouvert après BREAKER_FAILURES échecs consécutifs :
+    point d'accès écarté pendant BREAKER_COOLDOWN s, puis semi-ouvert : un seul
+    appel d'essai, qui referme (succès) ou rouvre (échec) le disjoncteur.
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def available(self, now: float) -> bool:
+        if self.state == "closed":
+            return True
+        if self.probing:
+            return False
+        return self.state == "half_open" or now - self.opened_at >= self.cooldown
+
+    def begin(self, now: float) -> None:
+        if self.state != "closed":
+            self.state, self.probing = "half_open", True
+
+    def success(self) -> None:
+        self.state, self.failures, self.probing = "closed", 0, False
+
+    def failure(self, now: float) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            self.state, self.opened_at, self.probing = "open", now, False
+
+
+class PoolEndpoint(ChatCompletionsProvider):
+    """Point d'accès d'un groupe : poids, disjoncteur et santé observée."""
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        key_env: Optional[str] = None,
+        weight: float = 1.0,
+        max_concurrency: int = 4,
+        require_key: bool = False
+    ):
+        super().__init__(name, url, max_concurrency=max_concurrency, require_key=require_key)
+        self.key_env = key_env
+        self.weight = weight
+        self.breaker = CircuitBreaker()
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.error_rate = 0.0
+        self.latency_s: Optional[float] = None
+
+    def _headers(self) -> Dict[str, str]:
+        # Clé relue à chaque appel, comme MistralProvider
+        if self.key_env:
+            self.api_key = clean_api_key(os.getenv(self.key_env, ""))
+        return super()._headers()
+
+    def observe(self, ok: bool, latency_s: float, now: float) -> None:
+        """À appeler sous le verrou du groupe après chaque appel."""
+        self.calls += 1
+        self.error_rate += HEALTH_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.latency_s = latency_s if self.latency_s is None else \
+                self.latency_s + HEALTH_ALPHA * (latency_s - self.latency_s)
+            self.breaker.success()
+        else:
+            self.errors += 1
+            self.breaker.failure(now)
+
+    def score(self) -> float:
+        # Part de trafic ∝ poids, réduite par le taux d'erreur récent et la charge en cours
+        return self.weight * max(0.05, 1.0 - self.error_rate) / (self.in_flight + 1)
+
+
+class ProviderPool(LLMProvider):
+    """
+    Fournisseur réparti sur plusieurs points d'accès, avec bascule. Chaque
+    appel prend d'abord une place du groupe (somme des places des points
+    d'accès) : une rafale de charge locale attend ici, sans être comptée
+    comme une panne des points d'accès.
+    """
+
+    def __init__(self, name: str, endpoints: List[PoolEndpoint]):
+        super().__init__(name, max_concurrency=sum(e.max_concurrency for e in endpoints))
+        self.endpoints = endpoints
+        self._lock = threading.Lock()
+
+    def _pick(self, tried: Set[str]) -> Optional[PoolEndpoint]:
+        # À appeler sous verrou : tirage pondéré parmi les points disponibles
+        # ayant une place libre (un point saturé n'est pas essayé)
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints
+                      if e.name not in tried and e.in_flight < e.max_concurrency and e.breaker.available(now)]
+        if not candidates:
+            return None
+        chosen = random.choices(candidates, weights=[e.score() for e in candidates])[0]
+        chosen.breaker.begin(now)
+        chosen.in_flight += 1
+        return chosen
+
+    def complete(self, prompt: str, model: str, task: str = "chat") -> str:
+        t0 = time.perf_counter()
+        if not self._slots.acquire(timeout=wait_timeout(LLM_QUEUE_TIMEOUT)):
+            left = remaining()
+            expired = left is not None and left <= 0
+            get_usage_tracker().record(task, self.name, model, 0, 0, time.perf_counter() - t0,
+                                       status="timeout" if expired else "overloaded")
+            if expired:
+                raise DeadlineExceeded(f"Échéance du tour atteinte en attente de « {self.name} ».")
+            return OVERLOADED_MESSAGE
+        try:
+            return self._failover(prompt, model, task)
+        finally:
+            self._slots.release()
+
+    def _failover(self, prompt: str, model: str, task: str) -> str:
+        tried: Set[str] = set()
+        errors: List[Exception] = []
+        saw_overload = False
+        while True:
+            with self._lock:
+                endpoint = self._pick(tried)
+            if endpoint is None:
+                break
+            tried.add(endpoint.name)
+            t0 = time.perf_counter()
+            error: Optional[Exception] = None
+            try:
+                text = endpoint.complete(prompt, model, task)
+            except DeadlineExceeded:
+                # Échéance du tour : inutile de basculer, et le point d'accès n'est pas en cause
+                self._release(endpoint)
+                raise
+            except Exception as e:
+                error = e
+            if error is None and text is OVERLOADED_MESSAGE:
+                # Saturation (quota 429 ou file locale) : bascule, sans compter de panne
+                self._release(endpoint)
+                saw_overload = True
+                print(f"LLM {endpoint.name} saturé, bascule vers un autre point d'accès")
+                continue
+            with self._lock:
+                endpoint.in_flight -= 1
+                endpoint.observe(error is None, time.perf_counter() - t0, time.monotonic())
+            if error is None:
+                return text
+            errors.append(error)
+            print(f"LLM {endpoint.name} en échec ({error}), bascule vers un autre point d'accès")
+
+        if not tried:
+            # Disjoncteurs ouverts ou points saturés : échec immédiat, sans attendre les délais réseau
+            get_usage_tracker().record(task, self.name, model, 0, 0, 0.0, status="overloaded")
+        # Points d'accès écartés (disjoncteur, saturation) : capacité indisponible, comme une saturation
+        saw_overload = saw_overload or len(tried) < len(self.endpoints)
+        # Tous essayés et tous en erreur : la dernière erreur est relevée ; sinon message de repli
+        if errors and not saw_overload:
+            raise errors[-1]
+        return OVERLOADED_MESSAGE
+
+    def _release(self, endpoint: PoolEndpoint) -> None:
+        # Fin d'un appel qui ne dit rien de la santé du point d'accès : libère
+        # sa place et, s'il servait d'appel d'essai, l'essai (semi-ouvert)
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.breaker.probing = False
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """État de chaque point d'accès (disjoncteur, charge, santé observée)."""
+        with self._lock:
+            return [{
+                "endpoint": e.name,
+                "url": e.url,
+                "weight": e.weight,
+                "state": e.breaker.state,
+                "in_flight": e.in_flight,
+                "calls": e.calls,
+                "errors": e.errors,
+                "error_rate": round(e.error_rate, 3),
+                "latency_s": round(e.latency_s, 3) if e.latency_s is not None else None,
+            } for e in self.endpoints]
+
+
+def endpoints_from_env(
+    prefix: str,
+    name: str,
+    default_url: str = "",
+    require_key: bool = False,
+    default_concurrency: int = 4
+) -> List[PoolEndpoint]:
+    """Points d'accès déclarés par <PREFIX>_URL_<n> ou <PREFIX>_API_KEY_<n> (aucun si absents)."""
+    pattern = re.compile(rf"{re.escape(prefix)}_(?:URL|API_KEY)_(\d+)")
+    indices = sorted({int(m.group(1)) for m in map(pattern.fullmatch, os.environ) if m})
+    endpoints = []
+    for i in indices:
+        key_env = f"{prefix}_API_KEY_{i}"
+        endpoints.append(PoolEndpoint(
+            f"{name}#{i}",
+            os.getenv(f"{prefix}_URL_{i}", default_url),
+            key_env=key_env if key_env in os.environ else f"{prefix}_API_KEY",
+            weight=float(os.getenv(f"{prefix}_WEIGHT_{i}", "1")),
+            max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY_{i}", str(default_concurrency))),
+            require_key=require_key
+        ))
+    return endpoints
@@ -0,0 +1,234 @@
+# streamlit_app/utils/llm_providers.py
+
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+
+from utils.deadline import DeadlineExceeded, LLM_HTTP_TIMEOUT, http_timeout, remaining, wait_timeout
+from utils.usage import get_usage_tracker, estimate_tokens
+
+# ------------------------------------------------------------------
+# Fournisseurs LLM interchangeables (API « chat/completions » compatible
+# OpenAI : Mistral, Ollama, vLLM, llama.cpp…), chacun avec sa propre limite
+# de requêtes simultanées, et routage des appels par type de tâche.
+# ------------------------------------------------------------------
+
+OVERLOADED_MESSAGE = (
+    "Désolé, le service est temporairement surchargé. Veuillez réessayer dans quelques instants."
+)
+
+# Temps maximal d'attente d'une place libre auprès d'un fournisseur saturé
+# (borné par l'échéance du tour en cours, voir utils/deadline.py)
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))
+
+
+def clean_api_key(raw: str) -> str:
+    """Supprime espaces, guillemets et caractères non-ASCII d'une clé d'API."""
+    key = raw.strip().strip('"').strip("'")
+    return re.sub(r'[^\x00-\x7F]', '', key)
+
+
+class LLMProvider:
+    """
+    Interface d'un fournisseur : `complete(prompt, model)` renvoie le texte.
+    Le sémaphore borne le nombre d'appels simultanés vers ce backend ; chaque
+    appel est comptabilisé (jetons, latence, statut) sous la tâche `task`.
+    Attente et appel sont bornés par l'échéance du tour (DeadlineExceeded).
+    """
+
+    def __init__(self, name: str, max_concurrency: int = 4):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def complete(self, prompt: str, model: str, task: str = "chat") -> str:
+        tracker = get_usage_tracker()
+        t0 = time.perf_counter()
+        if not self._slots.acquire(timeout=wait_timeout(LLM_QUEUE_TIMEOUT)):
+            left = remaining()
+            if left is not None and left <= 0:
+                tracker.record(task, self.name, model, 0, 0, time.perf_counter() - t0, status="timeout")
+                raise DeadlineExceeded(f"Échéance du tour atteinte en attente de « {self.name} ».")
+            tracker.record(task, self.name, model, 0, 0, time.perf_counter() - t0, status="overloaded")
+            return OVERLOADED_MESSAGE
+        try:
+            text, usage = self._complete(prompt, model)
+        except DeadlineExceeded:
+            tracker.record(task, self.name, model, 0, 0, time.perf_counter() - t0, status="timeout")
+            raise
+        except Exception:
+            tracker.record(task, self.name, model, 0, 0, time.perf_counter() - t0, status="error")
+            raise
+        finally:
+            self._slots.release()
+        if text is OVERLOADED_MESSAGE:
+            tracker.record(task, self.name, model, 0, 0, time.perf_counter() - t0, status="overloaded")
+        elif usage:
+            tracker.record(task, self.name, model, usage.get("prompt_tokens", 0),
+                           usage.get("completion_tokens", 0), time.perf_counter() - t0)
+        else:
+            tracker.record(task, self.name, model, estimate_tokens(prompt), estimate_tokens(text),
+                           time.perf_counter() - t0, estimated=True)
+        return text
+
+    def _complete(self, prompt: str, model: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Renvoie (texte, bloc `usage` du fournisseur ou None)."""
+        raise NotImplementedError
+
+
+class ChatCompletionsProvider(LLMProvider):
+    """Backend HTTP au format /v1/chat/completions (Mistral, Ollama, vLLM…)."""
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        api_key: str = "",
+        max_concurrency: int = 4,
+        require_key: bool = False
+    ):
+        super().__init__(name, max_concurrency)
+        self.url = url
+        self.api_key = api_key
+        self.require_key = require_key
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.require_key and not self.api_key:
+            raise RuntimeError(
+                f"Clé d'API non configurée pour le fournisseur « {self.name} ». "
+                "Vérifiez votre fichier .env sans espaces, guillemets, ni caractères spéciaux."
+            )
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _complete(self, prompt: str, model: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        timeout = http_timeout()
+        try:
+            resp = requests.post(self.url, headers=self._headers(), json=payload, timeout=timeout)
+        except requests.Timeout as e:
+            if timeout[1] < LLM_HTTP_TIMEOUT:
+                # Délai raccourci par l'échéance du tour : ce n'est pas le backend qui est en cause
+                raise DeadlineExceeded(f"Échéance du tour atteinte pendant l'appel à « {self.name} ».")
+            raise RuntimeError(f"Délai dépassé pour l'API LLM ({self.name}) : {e}")
+        except requests.RequestException as e:
+            raise RuntimeError(f"Erreur de connexion à l'API LLM ({self.name}) : {e}")
+
+        if resp.status_code == 429:
+            # Cas de saturation du service
+            return OVERLOADED_MESSAGE, None
+        if resp.status_code != 200:
+            msg = resp.text or resp.reason
+            raise RuntimeError(f"Erreur API {self.name} (status {resp.status_code}) : {msg}")
+
+        data = resp.json()
+        try:
+            return data["choices"][0]["message"]["content"], data.get("usage")
+        except (KeyError, IndexError) as e:
+            raise RuntimeError(f"Format de réponse inattendu : {e}")
+
+
+class MistralProvider(ChatCompletionsProvider):
+    """API Mistral hébergée (clé MISTRAL_API_KEY relue à chaque appel)."""
+
+    def __init__(self, url: str, max_concurrency: int = 4):
+        super().__init__("mistral", url, max_concurrency=max_concurrency, require_key=True)
+
+    def _headers(self) -> Dict[str, str]:
+        self.api_key = clean_api_key(os.getenv("MISTRAL_API_KEY", ""))
+        return super()._headers()
+
+
+# ------------------------------------------------------------------
+# Registre et routage
+# ------------------------------------------------------------------
+_providers: Dict[str, LLMProvider] = {}
+_registry_lock = threading.RLock()  # réentrant : get_provider enregistre les défauts sous verrou
+
+# Tâches peu exigeantes, servies par la route rapide si elle est configurée
+CHEAP_TASKS = ("title", "analyze", "classify")
+
+
+def register_provider(provider: LLMProvider) -> None:
+    """Ajoute (ou remplace) un fournisseur dans le registre du processus."""
+    with _registry_lock:
+        _providers[provider.name] = provider
+
+
+def _pooled(provider: ChatCompletionsProvider, prefix: str) -> LLMProvider:
+    # Points d'accès numérotés (<PREFIX>_URL_<n>, <PREFIX>_API_KEY_<n>) : groupe avec bascule
+    from utils.llm_pool import ProviderPool, endpoints_from_env
+
+    endpoints = endpoints_from_env(prefix, provider.name, provider.url,
+                                   require_key=provider.require_key,
+                                   default_concurrency=provider.max_concurrency)
+    return ProviderPool(provider.name, endpoints) if endpoints else provider
+
+
+def _default_providers() -> None:
+    from utils.llm_api import MISTRAL_URL
+
+    register_provider(_pooled(MistralProvider(
+        os.getenv("MISTRAL_URL", MISTRAL_URL),
+        max_concurrency=int(os.getenv("MISTRAL_MAX_CONCURRENCY", "4"))
+    ), "MISTRAL"))
+    register_provider(_pooled(ChatCompletionsProvider(
+        "ollama",
+        os.getenv("OLLAMA_URL", "http://localhost:11434/v1/chat/completions"),
+        max_concurrency=int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+    ), "OLLAMA"))
+    if os.getenv("LOCAL_LLM_URL") or os.getenv("LOCAL_LLM_URL_1"):
+        register_provider(_pooled(ChatCompletionsProvider(
+            "local",
+            os.getenv("LOCAL_LLM_URL", ""),
+            api_key=clean_api_key(os.getenv("LOCAL_LLM_API_KEY", "")),
+            max_concurrency=int(os.getenv("LOCAL_LLM_MAX_CONCURRENCY", "4"))
+        ), "LOCAL_LLM"))
+
+
+def get_provider(name: str) -> LLMProvider:
+    with _registry_lock:
+        if not _providers:
+            _default_providers()
+        try:
+            return _providers[name]
+        except KeyError:
+            raise RuntimeError(f"Fournisseur LLM inconnu : « {name} » (disponibles : {', '.join(_providers)})")
+
+
+def _parse_route(spec: str) -> Tuple[str, str]:
+    # « fournisseur:modèle » ; le modèle peut lui-même contenir « : » (ollama)
+    provider, _, model = spec.partition(":")
+    if not model:
+        raise RuntimeError(f"Route LLM invalide : « {spec} » (attendu fournisseur:modèle)")
+    return provider.strip(), model.strip()
+
+
+def resolve_route(task: str = "chat", model: Optional[str] = None) -> Tuple[LLMProvider, str]:
+    """
+    Choisit (fournisseur, modèle) pour une tâche :
+      1. LLM_ROUTE_<TÂCHE> (ex. LLM_ROUTE_ANALYZE=ollama:llama3.2:1b)
+      2. LLM_FAST_ROUTE pour les tâches de CHEAP_TASKS
+      3. LLM_DEFAULT_ROUTE (mistral:mistral-medium par défaut)
+    Un `model` explicite remplace le modèle de la route retenue.
+    """
+    default = os.getenv("LLM_DEFAULT_ROUTE", "mistral:mistral-medium")
+    spec = os.getenv(f"LLM_ROUTE_{task.upper()}")
+    if not spec and task in CHEAP_TASKS:
+        spec = os.getenv("LLM_FAST_ROUTE")
+    return route_from_spec(spec or default, model)
+
+
+def route_from_spec(spec: str, model: Optional[str] = None) -> Tuple[LLMProvider, str]:
+    """(fournisseur, modèle) d'une route « fournisseur:modèle »."""
+    provider_name, route_model = _parse_route(spec)
+    return get_provider(provider_name), model or route_model
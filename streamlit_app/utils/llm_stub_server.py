@@ -0,0 +1,151 @@
+# streamlit_app/utils/llm_stub_server.py
+"""
+Serveur LLM de substitution, au format /v1/chat/completions, pour les essais
+locaux et les tests de charge : latence et taux d'erreur configurables.
+
+Lancement (depuis streamlit_app/) :
+    python -m utils.llm_stub_server --port 8011 --latency 0.3 --error-rate 0.05
+puis, dans .env :
+    LOCAL_LLM_URL=http://127.0.0.1:8011/v1/chat/completions
+    LLM_DEFAULT_ROUTE=local:stub
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+_DEFAULT_REPLY = (
+    "Entre 2014 et 2023, la proportion est passée de 12 % à 25 %, "
+    "avec une hausse marquée à partir de 2020."
+)
+_ANALYSIS_REPLY = (
+    '{{"data_available": true, "needs_visualization": {vis}, '
+    '"response_type": "{kind}", "explanation": "stub"}}'
+)
+_GRAPH_REPLY = """import matplotlib.pyplot as plt
+annees = [2014, 2015, 2016, 2017, 2018, 2019, 2020, 2021, 2022, 2023]
+valeurs = [12, 14, 13, 15, 16, 14, 15, 20, 27, 25]
+plt.plot(annees, valeurs, marker="o", label="Québec")
+plt.title("Évolution des troubles respiratoires")
+plt.xlabel("Année")
+plt.ylabel("%")
+plt.show()"""
+_GRAPH_VERBS = ("montre", "trace", "affiche", "compare")
+
+
+def _reply_for(prompt: str, default: str) -> str:
+    # Mêmes décisions que le repli par mots-clés d'analyze_question
+    if "Réponds uniquement avec un JSON" in prompt:
+        question = prompt.split("Question :", 1)[-1].split("\n", 1)[0].lower()
+        vis = any(v in question for v in _GRAPH_VERBS)
+        return _ANALYSIS_REPLY.format(vis="true" if vis else "false", kind="graph" if vis else "text")
+    if "Type de réponse attendu : graph" in prompt:
+        return _GRAPH_REPLY
+    return default
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server_version = "LLMStub/1.0"
+
+    def log_message(self, fmt, *args):  # silencieux
+        pass
+
+    def _send(self, status: int, body: dict) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("health"):
+            self._send(200, {"status": "ok"})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        cfg = self.server.stub_config
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.stub_lock:
+            self.server.stub_requests += 1
+
+        latency = cfg["latency"]
+        if cfg["jitter"]:
+            latency += random.uniform(0, cfg["jitter"])
+        time.sleep(latency)
+
+        if random.random() < cfg["error_rate"]:
+            status = random.choice(cfg["error_statuses"])
+            self._send(status, {"error": {"message": "erreur simulée", "code": status}})
+            return
+
+        prompt = "".join(m.get("content", "") for m in payload.get("messages", []))
+        reply = _reply_for(prompt, cfg["reply"])
+        prompt_tokens = len(prompt) // 4 + 1
+        completion_tokens = len(reply) // 4 + 1
+        self._send(200, {
+            "id": f"stub-{self.server.stub_requests}",
+            "object": "chat.completion",
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+
+def start_stub_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    error_statuses: Tuple[int, ...] = (429, 500, 503),
+    reply: Optional[str] = None
+) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Démarre le serveur dans un thread (port=0 : port libre choisi par l'OS).
+    Renvoie (serveur, URL du point /v1/chat/completions) ; arrêt : server.shutdown().
+    """
+    server = ThreadingHTTPServer((host, port), _StubHandler)
+    server.daemon_threads = True
+    server.stub_config = {
+        "latency": latency,
+        "jitter": jitter,
+        "error_rate": error_rate,
+        "error_statuses": error_statuses,
+        "reply": reply or _DEFAULT_REPLY,
+    }
+    server.stub_lock = threading.Lock()
+    server.stub_requests = 0
+    threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True).start()
+    url = f"http://{host}:{server.server_address[1]}/v1/chat/completions"
+    return server, url
+
+
+def _main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serveur LLM de substitution.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency", type=float, default=0.2, help="latence de base (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latence aléatoire ajoutée (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="proportion de réponses en erreur")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.host, args.port, args.latency, args.jitter, args.error_rate)
+    print(f"Serveur LLM de substitution : {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,15 @@
+# streamlit_app/utils/paths.py
+
+import os
+from pathlib import Path
+
+# ------------------------------------------------------------------
+# Emplacements des données, ancrés à la racine du dépôt : l'application
+# (streamlit run streamlit_app/main.py, depuis la racine) et les outils en
+# ligne de commande (python -m utils.xxx, depuis streamlit_app/) lisent et
+# écrivent ainsi les mêmes fichiers, quel que soit le répertoire courant.
+# HISTO_DIR et DATA_DIR permettent de les déplacer (essais isolés).
+# ------------------------------------------------------------------
+ROOT_DIR = str(Path(__file__).resolve().parents[2])
+HISTO_DIR = os.getenv("HISTO_DIR", os.path.join(ROOT_DIR, "histories"))
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(ROOT_DIR, "data"))
@@ -1,17 +1,49 @@
 # streamlit_app/utils/pdf_generator.py
+from __future__ import annotations
 
 import io
 import os
 import re
 import tempfile
 import unicodedata
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
-from fpdf import FPDF
-from matplotlib.figure import Figure
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
 
 
-def make_report_pdf(text: str, fig: Optional[Figure] = None) -> bytes:
+# Substitutions typographiques vers des équivalents Latin-1
+_LATIN1_SUBS = {
+    "–": "-", "—": "-", "‘": "'", "’": "'", "“": '"', "”": '"', "•": "-",
+    "…": "...", "→": "->", "←": "<-", "≥": ">=", "≤": "<=", "œ": "oe", "Œ": "OE",
+    "\u202f": " ", "\u2009": " ",
+}
+
+
+def to_latin1(text: str) -> str:
+    """
+    Rend un texte compatible avec les polices de base de FPDF (Latin-1) en
+    conservant les accents français : substitutions typographiques, sinon
+    décomposition NFKD, sinon suppression (emojis…).
+    """
+    out = []
+    for ch in text:
+        if ord(ch) < 256:
+            out.append(ch)
+        elif ch in _LATIN1_SUBS:
+            out.append(_LATIN1_SUBS[ch])
+        else:
+            out.append(
+                unicodedata.normalize("NFKD", ch).encode("latin-1", "ignore").decode("latin-1")
+            )
+    return "".join(out)
+
+
+def make_report_pdf(
+    text: str,
+    fig: Optional[Figure] = None,
+    image_png: Optional[bytes] = None
+) -> bytes:
     """
     Génère un rapport au format PDF à partir d'un texte (Markdown léger) et
     d'une figure Matplotlib optionnelle.
@@ -19,6 +51,7 @@ def make_report_pdf(text: str, fig: Optional[Figure] = None) -> bytes:
     Args:
         text: Le contenu textuel du rapport (Markdown simplifié).
         fig:  Une instance de matplotlib.figure.Figure ou None.
+        image_png: Graphique déjà rendu en PNG (alternative à fig).
 
     Returns:
         Le contenu du PDF encodé en bytes.
@@ -33,22 +66,18 @@ def make_report_pdf(text: str, fig: Optional[Figure] = None) -> bytes:
         lines.append(line)
     cleaned = "\n".join(lines)
     cleaned = cleaned.replace("**", "").replace("*", "")
-    subs = {
-        "–": "-", "—": "-", "‘": "'", "’": "'", "“": '"', "”": '"', "•": "-"
-    }
-    for src, tgt in subs.items():
-        cleaned = cleaned.replace(src, tgt)
-    cleaned = unicodedata.normalize("NFKD", cleaned).encode("ascii", "ignore").decode("ascii")
+    cleaned = to_latin1(cleaned)
 
     # 2) Préparation de l'image PNG si la figure est fournie
-    img_buf = io.BytesIO()
+    img_buf = io.BytesIO(image_png or b"")
     if fig is not None:
         fig.savefig(img_buf, format="PNG", dpi=150, bbox_inches="tight")
     img_buf.seek(0)
+    has_image = img_buf.getbuffer().nbytes > 0
 
     # 3) Recherche d'un marqueur de section "Visualisation" pour insertion du graphique
     marker = None
-    for key in ("## Visualisation graphique", "## Visualisation des donnees"):
+    for key in ("## Visualisation graphique", "## Visualisation des données", "## Visualisation des donnees"):
         if key in cleaned:
             marker = key
             break
@@ -57,7 +86,9 @@ def make_report_pdf(text: str, fig: Optional[Figure] = None) -> bytes:
     if marker:
         before, _, after = cleaned.partition(marker)
 
-    # 4) Génération du PDF
+    # 4) Génération du PDF (fpdf chargé uniquement à l'export)
+    from fpdf import FPDF
+
     pdf = FPDF(orientation="P", unit="mm", format="A4")
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.add_page()
@@ -93,7 +124,7 @@ def make_report_pdf(text: str, fig: Optional[Figure] = None) -> bytes:
     _draw_block(before)
 
     # 6) Insère le graphique si présent
-    if fig is not None:
+    if has_image:
         pdf.ln(5)
         if marker:
             pdf.set_font("Arial", "B", 14)
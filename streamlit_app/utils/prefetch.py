@@ -0,0 +1,262 @@
+# streamlit_app/utils/prefetch.py
+"""
+Préchargement des points d'entrée connus : questions d'exemple (contexte RAG,
+réponse, graphique) et rapports types × communes sur la période par défaut.
+
+Les résultats sont rangés dans un cache du processus, estampillé avec la
+version du corpus : une bascule de corpus les invalide et relance le
+préchargement ; le changement de période par défaut des rapports (chaque
+jour) aussi. Le cache est aussi écrit dans <racine>/histories/prefetch/<version>.json
+(voir utils/paths.py), que lit le serveur : un préchargement lancé au
+déploiement lui profite donc directement :
+    cd streamlit_app
+    python -m utils.prefetch
+"""
+from __future__ import annotations
+
+import copy
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.history import HISTO_DIR
+
+PREFETCH_DIR = os.path.join(HISTO_DIR, "prefetch")
+PREFETCH_ON_START = os.getenv("PREFETCH_ON_START", "1") == "1"
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "0"))  # s entre deux passes ; 0 = au démarrage seulement
+PREFETCH_REPORTS = os.getenv("PREFETCH_REPORTS", "1") == "1"
+PREFETCH_PAUSE_S = float(os.getenv("PREFETCH_PAUSE_S", "2"))  # pause entre deux appels, pour laisser la place aux utilisateurs
+PREFETCH_USER = "prefetch"  # utilisateur auquel sont imputés les jetons
+
+
+class PrefetchCache:
+    """Résultats préchargés par version du corpus, partagés par le processus."""
+
+    def __init__(self, cache_dir: str = PREFETCH_DIR, keep_versions: int = 2):
+        self.cache_dir = cache_dir
+        self.keep_versions = keep_versions
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}  # version → {"type:clé": valeur}
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, version: str) -> str:
+        return os.path.join(self.cache_dir, f"{version}.json")
+
+    def _version(self, version: str, create: bool = False) -> Optional[Dict[str, Any]]:
+        # À appeler sous verrou : entrées de `version`, relues du disque au besoin ;
+        # seules les keep_versions dernières versions restent en mémoire
+        entries = self._entries.get(version)
+        if entries is not None:
+            return entries
+        path = self._path(version)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Préchargement : cache {path} illisible ({e!r})")
+        if entries is None and create:
+            entries = {}
+        if entries is not None:
+            self._entries[version] = entries
+            while len(self._entries) > self.keep_versions:
+                del self._entries[next(iter(self._entries))]
+        return entries
+
+    def get(self, kind: str, key: str, version: Optional[str]) -> Optional[Any]:
+        """Copie de l'entrée préchargée pour cette version du corpus, sinon None."""
+        with self._lock:
+            entries = self._version(version) if version is not None else None
+            value = entries.get(f"{kind}:{key}") if entries is not None else None
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def contains(self, kind: str, key: str, version: str) -> bool:
+        with self._lock:
+            entries = self._version(version)
+            return entries is not None and f"{kind}:{key}" in entries
+
+    def put(self, kind: str, key: str, version: str, value: Any) -> None:
+        with self._lock:
+            self._version(version, create=True)[f"{kind}:{key}"] = value
+
+    def save(self, version: str) -> None:
+        """Écrit les entrées de `version` (écriture atomique)."""
+        with self._lock:
+            entries = self._entries.get(version)
+            if entries is None:
+                return
+            data = json.dumps(entries, ensure_ascii=False)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(version)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        # Fichiers des versions plus anciennes : supprimés
+        files = sorted(glob.glob(os.path.join(self.cache_dir, "*.json")), key=os.path.getmtime)
+        for old in files[:-self.keep_versions]:
+            os.remove(old)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"versions": {v: len(e) for v, e in self._entries.items()},
+                    "hits": self.hits, "misses": self.misses}
+
+
+_cache: Optional[PrefetchCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_prefetch_cache() -> PrefetchCache:
+    """Cache de préchargement unique du processus (créé au premier appel)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PrefetchCache()
+        return _cache
+
+
+def report_key(report_type: str, commune: str, start_date: str, end_date: str) -> str:
+    return "|".join((report_type, commune, start_date, end_date))
+
+
+def run_prefetch(
+    corpus,
+    embedding_fn,
+    answer_fn: Callable[..., Dict[str, Any]],
+    questions: List[str],
+    report_types: List[str] = (),
+    communes: List[str] = ()
+) -> Dict[str, Any]:
+    """
+    Une passe de préchargement sur la génération courante du corpus. Les
+    entrées déjà présentes sont conservées ; une réponse de repli (service
+    saturé, budget atteint, erreur) n'est jamais mise en cache. Les appels
+    sont espacés de PREFETCH_PAUSE_S et marqués facultatifs : la passe
+    s'arrête dès que le budget de jetons est atteint.
+    """
+    from utils.llm_api import BudgetExceeded, set_optional_calls
+    from utils.reports import generate_report, default_report_period, is_complete_report
+    from utils.usage import set_current_user
+
+    set_current_user(PREFETCH_USER)
+    set_optional_calls()
+    cache = get_prefetch_cache()
+    generation = corpus.current()
+    version, collection = generation["version"], generation["collection"]
+    t0 = time.perf_counter()
+    done = failed = 0
+
+    start, end = default_report_period()
+    jobs = [("answer", question, question) for question in questions]
+    if PREFETCH_REPORTS:
+        jobs += [("report", report_key(report_type, commune, start, end), (report_type, commune))
+                 for report_type in report_types for commune in communes]
+
+    for kind, key, item in jobs:
+        if cache.contains(kind, key, version):
+            continue
+        if done or failed:
+            time.sleep(PREFETCH_PAUSE_S)
+        try:
+            if kind == "answer":
+                result = answer_fn(item, [{"role": "user", "content": item}], collection, embedding_fn)
+                ok = result.get("complete")
+            else:
+                result = generate_report(collection, embedding_fn, item[0], item[1], start, end)
+                ok = is_complete_report(result)
+        except BudgetExceeded:
+            print("Préchargement interrompu : budget de jetons atteint")
+            break
+        except Exception as e:
+            print(f"Préchargement : {kind} « {key} » en échec ({e!r})")
+            failed += 1
+            continue
+        if ok:
+            cache.put(kind, key, version, result)
+            done += 1
+        else:
+            failed += 1
+
+    if corpus.version != version:
+        # Bascule pendant la passe : résultats obsolètes, la passe suivante suivra
+        return {"version": version, "stale": True}
+    cache.save(version)
+    summary = {"version": version, "prefetched": done, "failed": failed,
+               "seconds": round(time.perf_counter() - t0, 1), **cache.stats()}
+    print(f"Préchargement terminé : {summary}")
+    return summary
+
+
+_thread: Optional[threading.Thread] = None
+_trigger = threading.Event()
+
+
+def start_prefetch(
+    corpus,
+    embedding_fn,
+    answer_fn: Callable[..., Dict[str, Any]],
+    questions: List[str],
+    report_types: List[str] = (),
+    communes: List[str] = (),
+    interval: float = PREFETCH_INTERVAL
+) -> None:
+    """
+    Lance (une fois par processus) le préchargement en arrière-plan : au
+    démarrage si PREFETCH_ON_START, après chaque bascule du corpus, au
+    changement de la période par défaut des rapports (minuit), puis toutes
+    les `interval` secondes si interval > 0.
+    """
+    from utils.reports import default_report_period
+
+    global _thread
+    with _cache_lock:
+        if _thread is not None:
+            return
+
+        def loop() -> None:
+            period = default_report_period()
+            while True:
+                now = datetime.now()
+                midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+                wait = (midnight - now).total_seconds() + 1
+                triggered = _trigger.wait(min(interval, wait) if interval > 0 else wait)
+                _trigger.clear()
+                if not triggered and interval <= 0 and default_report_period() == period:
+                    continue
+                period = default_report_period()
+                try:
+                    run_prefetch(corpus, embedding_fn, answer_fn, questions, report_types, communes)
+                except Exception as e:
+                    print(f"Préchargement interrompu : {e!r}")
+
+        corpus.on_swap(lambda old, new: _trigger.set())
+        if PREFETCH_ON_START:
+            _trigger.set()
+        _thread = threading.Thread(target=loop, name="prefetch", daemon=True)
+        _thread.start()
+
+
+def _main() -> None:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    import main as app
+    from utils import warmup
+
+    resources = warmup.get_resources()
+    run_prefetch(resources["corpus"], resources["embedding_fn"], app.answer_question,
+                 app.example_questions, app.REPORT_TYPES, app.REPORT_COMMUNES)
+
+
+if __name__ == "__main__":
+    _main()
@@ -1,99 +1,346 @@
 # streamlit_app/utils/rag_utils.py
+from __future__ import annotations
+
 import streamlit as st
-import chromadb
-from chromadb.utils import embedding_functions
-import numpy as np
-from typing import List, Dict, Any
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
+
+# chromadb, sentence-transformers et numpy sont importés à la demande :
+# ils coûtent plusieurs secondes et ne doivent pas retarder la page de login.
+from utils.singleflight import SingleFlight, digest
+
+if TYPE_CHECKING:
+    import chromadb
+
+# Recherches identiques simultanées : une seule requête à l'index
+retrieval_flight = SingleFlight("retrieval")
+
+
+def make_embedding_fn(model_name: str = "all-MiniLM-L6-v2"):
+    """
+    Crée la fonction d'embedding SentenceTransformer (chargement du modèle).
+    """
+    from chromadb.utils import embedding_functions
+
+    return embedding_functions.SentenceTransformerEmbeddingFunction(
+        model_name=model_name
+    )
+
 
 def init_collection(
     model_name: str = "all-MiniLM-L6-v2",
-    collection_name: str = "sante_docs"
+    collection_name: str = "sante_docs",
+    embedding_fn=None,
+    metadata: Optional[Dict[str, Any]] = None,
 ) -> chromadb.api.models.Collection.Collection:
     """
     Initialise (ou récupère) la collection ChromaDB avec la fonction d'embedding
-    SentenceTransformer all-MiniLM-L6-v2.
+    SentenceTransformer all-MiniLM-L6-v2 (ou celle fournie via embedding_fn).
+    `metadata` règle l'index HNSW à la création (clés hnsw:*, cf. vector_backends).
     """
-    embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name=model_name
-    )
+    import chromadb
+
+    if embedding_fn is None:
+        embedding_fn = make_embedding_fn(model_name)
     client = chromadb.Client()
     collection = client.get_or_create_collection(
         name=collection_name,
-        embedding_function=embedding_fn
+        embedding_function=embedding_fn,
+        metadata=metadata
     )
     return collection
 
+# Documents factices indexés par défaut (fake_docs + respiratory_docs)
+FAKE_DOCS = [
+    # Troubles respiratoires (10 ans)
+    {"id": "1", "content": "Évolution des troubles respiratoires dans la région de Québec : 2014 (12%), 2015 (14%), 2016 (13%), 2017 (15%), 2018 (16%), 2019 (14%), 2020 (15%), 2021 (20%), 2022 (27%), 2023 (25%). La hausse significative depuis 2020 est attribuée à plusieurs facteurs environnementaux."},
+    {"id": "2", "content": "Cas d'asthme à Montréal sur 10 ans : 2014 (18%), 2015 (17%), 2016 (19%), 2017 (20%), 2018 (21%), 2019 (20%), 2020 (22%), 2021 (19%), 2022 (24%), 2023 (26%). La pollution urbaine reste un facteur majeur."},
+    # Santé mentale (5 ans)
+    {"id": "3", "content": "Taux d'anxiété chez les jeunes adultes à Montréal : 2019 (24%), 2020 (28%), 2021 (30%), 2022 (31%), 2023 (32%). La pandémie a marqué un tournant dans cette progression."},
+    {"id": "4", "content": "Évolution de la dépression chez les étudiants québécois : 2019 (20%), 2020 (25%), 2021 (27%), 2022 (26%), 2023 (28%). Les périodes d'examens montrent des pics à 35%."},
+    # Occupation hospitalière (5 ans)
+    {"id": "5", "content": "Taux d'occupation des urgences à Montréal : 2019 (75%), 2020 (70%), 2021 (78%), 2022 (85%), 2023 (88%). Les pics hivernaux dépassent souvent 95%."},
+    {"id": "6", "content": "Évolution de la surcharge hospitalière à Québec : 2019 (70%), 2020 (65%), 2021 (72%), 2022 (78%), 2023 (82%). Les périodes de grippe saisonnière impactent fortement ces taux."},
+    # Accès aux soins (7 ans)
+    {"id": "7", "content": "Accès aux médecins de famille à Montréal : 2017 (65%), 2018 (68%), 2019 (70%), 2020 (72%), 2021 (73%), 2022 (74%), 2023 (75%). L'amélioration est constante mais reste insuffisante."},
+    {"id": "8", "content": "Délais d'attente moyens pour les spécialistes (en mois) : 2017 (4.2), 2018 (4.0), 2019 (3.8), 2020 (4.5), 2021 (4.2), 2022 (3.8), 2023 (3.5). Les variations reflètent les défis du système de santé."},
+    # Habitudes de vie (6 ans)
+    {"id": "9", "content": "Taux d'activité physique régulière chez les 18-30 ans : 2018 (35%), 2019 (38%), 2020 (32%), 2021 (36%), 2022 (42%), 2023 (45%). La reprise post-pandémie montre une tendance positive."},
+    {"id": "10", "content": "Consommation quotidienne de fruits et légumes à Québec : 2018 (55%), 2019 (58%), 2020 (60%), 2021 (62%), 2022 (64%), 2023 (65%). Les campagnes de sensibilisation ont un impact positif."},
+    # Vaccination et dépistage (5 ans)
+    {"id": "11", "content": "Couverture vaccinale grippe chez les 65+ ans : 2019 (60%), 2020 (65%), 2021 (68%), 2022 (70%), 2023 (72%). L'augmentation reflète une meilleure sensibilisation."},
+    {"id": "12", "content": "Participation au dépistage du cancer du sein : 2019 (58%), 2020 (55%), 2021 (60%), 2022 (63%), 2023 (65%). La baisse de 2020 est liée aux restrictions sanitaires."}
+]
+
+RESPIRATORY_DOCS = [
+    {"id": "resp_mtl",    "content": "Montréal – Évolution des troubles respiratoires sur 10 ans : 2014 (12 %), 2015 (14 %), 2016 (13 %), 2017 (15 %), 2018 (16 %), 2019 (14 %), 2020 (15 %), 2021 (20 %), 2022 (27 %), 2023 (25 %)."},
+    {"id": "resp_qc",     "content": "Québec – Évolution des troubles respiratoires sur 10 ans : 2014 (10 %), 2015 (11 %), 2016 (12 %), 2017 (14 %), 2018 (15 %), 2019 (13 %), 2020 (14 %), 2021 (18 %), 2022 (22 %), 2023 (24 %)."},
+    {"id": "resp_levis",  "content": "Lévis – Évolution des troubles respiratoires sur 10 ans : 2014 (8 %), 2015 (9 %), 2016 (11 %), 2017 (13 %), 2018 (14 %), 2019 (12 %), 2020 (13 %), 2021 (17 %), 2022 (21 %), 2023 (23 %)."},
+    {"id": "resp_bsl",    "content": "Bas-Saint-Laurent – Évolution des troubles respiratoires sur 10 ans : 2014 (14 %), 2015 (15 %), 2016 (14 %), 2017 (16 %), 2018 (18 %), 2019 (16 %), 2020 (17 %), 2021 (22 %), 2022 (28 %), 2023 (26 %)."},
+    {"id": "resp_tr",     "content": "Trois-Rivières – Évolution des troubles respiratoires sur 10 ans : 2014 (9 %), 2015 (10 %), 2016 (11 %), 2017 (12 %), 2018 (13 %), 2019 (11 %), 2020 (12 %), 2021 (16 %), 2022 (20 %), 2023 (22 %)."}
+]
+
+DEFAULT_DOCUMENTS: List[Dict[str, str]] = FAKE_DOCS + RESPIRATORY_DOCS
+
+
+def index_documents(
+    collection: chromadb.api.models.Collection.Collection,
+    documents: List[Dict[str, Any]],
+    embedding_fn=None,
+    reuse: Optional[Dict[str, Any]] = None,
+    batch_size: int = 256,
+    pause: float = 0.0
+) -> None:
+    """
+    Indexe (upsert) des documents {id, content} par lots. Les embeddings de
+    `reuse` (id → vecteur) évitent de réencoder les documents inchangés ;
+    `pause` cède le CPU entre deux lots lors d'une reconstruction à chaud.
+    """
+    import time
+
+    reuse = reuse or {}
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        ids = [str(doc["id"]) for doc in batch]
+        texts = [doc["content"] for doc in batch]
+        metadatas = [doc.get("metadata") or {"source": doc_id} for doc, doc_id in zip(batch, ids)]
+        if embedding_fn is None:
+            collection.upsert(documents=texts, ids=ids, metadatas=metadatas)
+        else:
+            missing = [i for i, doc_id in enumerate(ids) if doc_id not in reuse]
+            fresh = embedding_fn([texts[i] for i in missing]) if missing else []
+            embeddings = [reuse.get(doc_id) for doc_id in ids]
+            for i, emb in zip(missing, fresh):
+                embeddings[i] = emb
+            collection.upsert(
+                documents=texts,
+                ids=ids,
+                metadatas=metadatas,
+                embeddings=[[float(x) for x in emb] for emb in embeddings]
+            )
+        if pause:
+            time.sleep(pause)
+
+
 def index_default_documents(collection: chromadb.api.models.Collection.Collection) -> None:
     """
     Indexe un ensemble de documents factices (fake_docs + respiratory_docs) dans la collection.
     """
-    fake_docs = [
-        # Troubles respiratoires (10 ans)
-        {"id": "1", "content": "Évolution des troubles respiratoires dans la région de Québec : 2014 (12%), 2015 (14%), 2016 (13%), 2017 (15%), 2018 (16%), 2019 (14%), 2020 (15%), 2021 (20%), 2022 (27%), 2023 (25%). La hausse significative depuis 2020 est attribuée à plusieurs facteurs environnementaux."},
-        {"id": "2", "content": "Cas d'asthme à Montréal sur 10 ans : 2014 (18%), 2015 (17%), 2016 (19%), 2017 (20%), 2018 (21%), 2019 (20%), 2020 (22%), 2021 (19%), 2022 (24%), 2023 (26%). La pollution urbaine reste un facteur majeur."},
-        # Santé mentale (5 ans)
-        {"id": "3", "content": "Taux d'anxiété chez les jeunes adultes à Montréal : 2019 (24%), 2020 (28%), 2021 (30%), 2022 (31%), 2023 (32%). La pandémie a marqué un tournant dans cette progression."},
-        {"id": "4", "content": "Évolution de la dépression chez les étudiants québécois : 2019 (20%), 2020 (25%), 2021 (27%), 2022 (26%), 2023 (28%). Les périodes d'examens montrent des pics à 35%."},
-        # Occupation hospitalière (5 ans)
-        {"id": "5", "content": "Taux d'occupation des urgences à Montréal : 2019 (75%), 2020 (70%), 2021 (78%), 2022 (85%), 2023 (88%). Les pics hivernaux dépassent souvent 95%."},
-        {"id": "6", "content": "Évolution de la surcharge hospitalière à Québec : 2019 (70%), 2020 (65%), 2021 (72%), 2022 (78%), 2023 (82%). Les périodes de grippe saisonnière impactent fortement ces taux."},
-        # Accès aux soins (7 ans)
-        {"id": "7", "content": "Accès aux médecins de famille à Montréal : 2017 (65%), 2018 (68%), 2019 (70%), 2020 (72%), 2021 (73%), 2022 (74%), 2023 (75%). L'amélioration est constante mais reste insuffisante."},
-        {"id": "8", "content": "Délais d'attente moyens pour les spécialistes (en mois) : 2017 (4.2), 2018 (4.0), 2019 (3.8), 2020 (4.5), 2021 (4.2), 2022 (3.8), 2023 (3.5). Les variations reflètent les défis du système de santé."},
-        # Habitudes de vie (6 ans)
-        {"id": "9", "content": "Taux d'activité physique régulière chez les 18-30 ans : 2018 (35%), 2019 (38%), 2020 (32%), 2021 (36%), 2022 (42%), 2023 (45%). La reprise post-pandémie montre une tendance positive."},
-        {"id": "10", "content": "Consommation quotidienne de fruits et légumes à Québec : 2018 (55%), 2019 (58%), 2020 (60%), 2021 (62%), 2022 (64%), 2023 (65%). Les campagnes de sensibilisation ont un impact positif."},
-        # Vaccination et dépistage (5 ans)
-        {"id": "11", "content": "Couverture vaccinale grippe chez les 65+ ans : 2019 (60%), 2020 (65%), 2021 (68%), 2022 (70%), 2023 (72%). L'augmentation reflète une meilleure sensibilisation."},
-        {"id": "12", "content": "Participation au dépistage du cancer du sein : 2019 (58%), 2020 (55%), 2021 (60%), 2022 (63%), 2023 (65%). La baisse de 2020 est liée aux restrictions sanitaires."}
-    ]
-
-    respiratory_docs = [
-        {"id": "resp_mtl",    "content": "Montréal – Évolution des troubles respiratoires sur 10 ans : 2014 (12 %), 2015 (14 %), 2016 (13 %), 2017 (15 %), 2018 (16 %), 2019 (14 %), 2020 (15 %), 2021 (20 %), 2022 (27 %), 2023 (25 %)."},
-        {"id": "resp_qc",     "content": "Québec – Évolution des troubles respiratoires sur 10 ans : 2014 (10 %), 2015 (11 %), 2016 (12 %), 2017 (14 %), 2018 (15 %), 2019 (13 %), 2020 (14 %), 2021 (18 %), 2022 (22 %), 2023 (24 %)."},
-        {"id": "resp_levis",  "content": "Lévis – Évolution des troubles respiratoires sur 10 ans : 2014 (8 %), 2015 (9 %), 2016 (11 %), 2017 (13 %), 2018 (14 %), 2019 (12 %), 2020 (13 %), 2021 (17 %), 2022 (21 %), 2023 (23 %)."},
-        {"id": "resp_bsl",    "content": "Bas-Saint-Laurent – Évolution des troubles respiratoires sur 10 ans : 2014 (14 %), 2015 (15 %), 2016 (14 %), 2017 (16 %), 2018 (18 %), 2019 (16 %), 2020 (17 %), 2021 (22 %), 2022 (28 %), 2023 (26 %)."},
-        {"id": "resp_tr",     "content": "Trois-Rivières – Évolution des troubles respiratoires sur 10 ans : 2014 (9 %), 2015 (10 %), 2016 (11 %), 2017 (12 %), 2018 (13 %), 2019 (11 %), 2020 (12 %), 2021 (16 %), 2022 (20 %), 2023 (22 %)."}
-    ]
-
-    all_docs = fake_docs + respiratory_docs
-    collection.add(
-        documents=[doc["content"] for doc in all_docs],
-        ids=[doc["id"] for doc in all_docs]
+    from utils.ingest import prepare_documents
+
+    index_documents(collection, prepare_documents(DEFAULT_DOCUMENTS))
+
+
+def drop_collection(name: str) -> None:
+    """Supprime une collection Chroma (génération de corpus retirée)."""
+    import chromadb
+
+    try:
+        chromadb.Client().delete_collection(name)
+    except Exception as e:  # déjà supprimée ou inconnue : rien à libérer
+        print(f"Collection {name} non supprimée : {e!r}")
+
+# Paramètres de sélection du contexte : sur-échantillonnage, diversité (MMR)
+# puis remplissage d'un budget de tokens au lieu d'un top-2 fixe.
+RAG_FETCH_K = 8           # candidats récupérés dans l'index
+RAG_MMR_LAMBDA = 0.6      # 1.0 = pertinence pure, 0.0 = diversité pure
+RAG_TOKEN_BUDGET = 320    # budget de tokens du contexte injecté dans le prompt
+RAG_MIN_REL_RATIO = 0.6   # pertinence minimale relative au meilleur passage
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation grossière du nombre de tokens (≈ 4 caractères par token)."""
+    return len(text) // 4 + 1
+
+
+def mmr_rerank(query_emb, doc_embs, k: int, lambda_mult: float = RAG_MMR_LAMBDA) -> List[int]:
+    """
+    Maximal Marginal Relevance vectorisée : renvoie les indices de `doc_embs`
+    dans l'ordre de sélection (pertinence pour la requête, pénalisée par la
+    similarité au passage déjà retenu le plus proche).
+    """
+    import numpy as np
+
+    docs = np.asarray(doc_embs, dtype=np.float32)
+    if docs.size == 0 or k <= 0:
+        return []
+    docs = docs / np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    q = np.asarray(query_emb, dtype=np.float32).ravel()
+    q = q / max(float(np.linalg.norm(q)), 1e-12)
+
+    relevance = docs @ q
+    pairwise = docs @ docs.T
+    max_sim = np.full(len(docs), -np.inf, dtype=np.float32)
+    available = np.ones(len(docs), dtype=bool)
+    selected: List[int] = []
+    for _ in range(min(k, len(docs))):
+        redundancy = np.where(np.isfinite(max_sim), max_sim, 0.0)
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, pairwise[best])
+    return selected
+
+
+def _query_embedding(collection, embedding_fn, text: str):
+    fn = embedding_fn or getattr(collection, "embedding_fn", None) \
+        or getattr(collection, "_embedding_function", None)
+    if fn is None:
+        raise RuntimeError("Aucune fonction d'embedding disponible pour la requête.")
+    return fn([text])[0]
+
+
+def retrieve_passages(
+    collection: chromadb.api.models.Collection.Collection,
+    query: str,
+    embedding_fn=None,
+    query_embedding=None,
+    fetch_k: int = RAG_FETCH_K,
+    token_budget: int = RAG_TOKEN_BUDGET,
+    lambda_mult: float = RAG_MMR_LAMBDA
+) -> List[Dict[str, Any]]:
+    """
+    Sur-échantillonne `fetch_k` candidats, les réordonne par MMR puis les
+    ajoute tant que le budget de tokens le permet.
+
+    Une recherche identique déjà en cours (même index, même requête, mêmes
+    paramètres) est partagée plutôt que relancée.
+
+    Returns:
+        Liste de passages {"id", "content", "score", "tokens"} dans l'ordre MMR.
+    """
+    key = ("passages", id(collection), digest(query), fetch_k, token_budget, lambda_mult)
+    return retrieval_flight.do(
+        key, _retrieve_passages, collection, query, embedding_fn,
+        query_embedding, fetch_k, token_budget, lambda_mult
+    )
+
+
+def _retrieve_passages(collection, query, embedding_fn, query_embedding, fetch_k, token_budget, lambda_mult):
+    import numpy as np
+
+    if query_embedding is None:
+        query_embedding = _query_embedding(collection, embedding_fn, query)
+    results = collection.query(
+        query_embeddings=[np.asarray(query_embedding, dtype=np.float32).tolist()],
+        n_results=fetch_k,
+        include=["documents", "embeddings"]
     )
+    ids, docs = results["ids"][0], results["documents"][0]
+    embs = results["embeddings"][0]
+    if not docs:
+        return []
+
+    order = mmr_rerank(query_embedding, embs, k=len(docs), lambda_mult=lambda_mult)
+    embs = np.asarray(embs, dtype=np.float32)
+    q = np.asarray(query_embedding, dtype=np.float32).ravel()
+    relevance = (embs @ q) / np.maximum(np.linalg.norm(embs, axis=1) * np.linalg.norm(q), 1e-12)
+    floor = float(relevance.max()) * RAG_MIN_REL_RATIO
+
+    passages: List[Dict[str, Any]] = []
+    used = 0
+    for i in order:
+        if passages and relevance[i] < floor:
+            continue
+        tokens = estimate_tokens(docs[i])
+        # Le premier passage est toujours gardé, même s'il dépasse le budget
+        if passages and used + tokens > token_budget:
+            continue
+        passages.append({
+            "id": ids[i],
+            "content": docs[i],
+            "score": float(relevance[i]),
+            "tokens": tokens,
+        })
+        used += tokens
+    return passages
+
+
+def route_collection(collection, text: str = "", commune: Optional[str] = None):
+    """
+    Index partitionné par région : vue limitée aux partitions de la commune
+    (menu rapport) ou des régions citées dans `text` (voir utils/regions.py).
+    Tout autre index est renvoyé tel quel.
+    """
+    if not hasattr(collection, "route"):
+        return collection
+    from utils.regions import route_regions
+
+    return collection.route(route_regions(text, commune))
+
 
 def get_rag_context(
     collection: chromadb.api.models.Collection.Collection,
     user_query: str,
-    all_docs: bool = False
+    all_docs: bool = False,
+    embedding_fn=None,
+    commune: Optional[str] = None
 ) -> str:
     """
-    Récupère soit tous les documents (all_docs=True), soit les 2 plus
-    pertinents pour user_query.
+    Récupère soit tous les documents (all_docs=True), soit les passages les
+    plus pertinents et diversifiés pour user_query, dans la limite du budget
+    de tokens (voir retrieve_passages). La recherche est limitée aux
+    partitions de `commune` ou des régions nommées dans user_query.
     """
     if all_docs:
         docs = collection.get()["documents"]
         return "\n".join(docs)
-    results = collection.query(query_texts=[user_query], n_results=2)
-    return "\n".join(results["documents"][0])
+    collection = route_collection(collection, user_query, commune)
+    passages = retrieve_passages(collection, user_query, embedding_fn=embedding_fn)
+    return "\n".join(p["content"] for p in passages)
 
-def get_rag_context_adaptatif(conversation, embedding_fn, threshold=0.7):
+def _cosine_similarity(a, b) -> float:
+    """Similarité cosinus entre deux vecteurs (remplace scikit-learn)."""
+    import numpy as np
+
+    a = np.asarray(a, dtype=np.float32).ravel()
+    b = np.asarray(b, dtype=np.float32).ravel()
+    denom = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / denom if denom else 0.0
+
+def retrieve_adaptatif(conversation, embedding_fn, threshold=0.7, collection=None) -> Dict[str, Any]:
+    """
+    Récupération adaptative détaillée : renvoie la requête utilisée, les
+    passages retenus et l'embedding de la question courante (réutilisable
+    par le classifieur d'intention sans nouvel encodage).
+    """
     # Récupère les deux dernières questions utilisateur
     user_qs = [m["content"] for m in conversation if m["role"] == "user"]
     if not user_qs:
-        return ""
+        return {"query": "", "passages": [], "question_embedding": None}
+    if collection is None:
+        collection = st.session_state.collection
+    # Même question d'exemple posée au même moment : un seul encodage + recherche
+    key = ("adaptatif", id(collection), id(embedding_fn), tuple(digest(q) for q in user_qs[-2:]), threshold)
+    return retrieval_flight.do(key, _retrieve_adaptatif, user_qs, embedding_fn, threshold, collection)
+
+
+def _retrieve_adaptatif(user_qs, embedding_fn, threshold, collection) -> Dict[str, Any]:
+    query_emb = None
     if len(user_qs) < 2:
         query = user_qs[-1]
+        emb_cur = query_emb = embedding_fn([query])[0]
     else:
         q_prev, q_cur = user_qs[-2], user_qs[-1]
-        emb_prev = np.array(embedding_fn([q_prev])).reshape(1, -1)
-        emb_cur  = np.array(embedding_fn([q_cur])).reshape(1, -1)
-        sim = cosine_similarity(emb_prev, emb_cur)[0, 0]
-        query = q_prev + " " + q_cur if sim >= threshold else q_cur
-
-    # On interroge Chroma via st.session_state.collection
-    results = st.session_state.collection.query(
-        query_texts=[query], n_results=2
+        emb_prev, emb_cur = embedding_fn([q_prev, q_cur])
+        sim = _cosine_similarity(emb_prev, emb_cur)
+        if sim >= threshold:
+            query = q_prev + " " + q_cur
+        else:
+            # L'embedding de la question courante est réutilisé tel quel
+            query, query_emb = q_cur, emb_cur
+
+    # On interroge la collection de la génération courante (MMR + budget),
+    # limitée aux partitions des régions citées
+    passages = retrieve_passages(
+        route_collection(collection, query),
+        query,
+        embedding_fn=embedding_fn,
+        query_embedding=query_emb
     )
-    return "\n".join(results["documents"][0])
+    return {"query": query, "passages": passages, "question_embedding": emb_cur}
+
+def get_rag_context_adaptatif(conversation, embedding_fn, threshold=0.7):
+    result = retrieve_adaptatif(conversation, embedding_fn, threshold)
+    return "\n".join(p["content"] for p in result["passages"])
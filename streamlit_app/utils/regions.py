@@ -0,0 +1,60 @@
+# streamlit_app/utils/regions.py
+"""
+Régions du corpus et routage des recherches.
+
+Chaque passage est rangé dans la partition de la région qu'il nomme, ou dans
+la partition provinciale s'il n'en nomme aucune (ou plusieurs). Une requête
+n'interroge que les partitions des régions citées (commune du menu rapport
+ou entités de la question) plus la partition provinciale ; sans région
+reconnue, toutes les partitions sont interrogées.
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+PROVINCE = "province"
+
+# Région → motif sur le texte normalisé (minuscules, sans accents).
+# « au Québec » / « du Québec » désignent la province, pas la ville.
+REGION_PATTERNS = {
+    "montreal": r"\bmontreal\b|\bmtl\b",
+    "quebec": r"(?<!\bau )(?<!\bdu )\bquebec\b",
+    "levis": r"\blevis\b",
+    "bas_saint_laurent": r"\bbas[- ]saint[- ]laurent\b",
+    "trois_rivieres": r"\btrois[- ]rivieres\b",
+}
+REGIONS = list(REGION_PATTERNS) + [PROVINCE]
+_COMPILED = {region: re.compile(pattern) for region, pattern in REGION_PATTERNS.items()}
+
+
+def _normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def detect_regions(text: str) -> List[str]:
+    """Régions nommées dans `text`, dans l'ordre de REGION_PATTERNS."""
+    norm = _normalize(text or "")
+    return [region for region, pattern in _COMPILED.items() if pattern.search(norm)]
+
+
+def document_region(content: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """Partition d'un document : métadonnée "region" si valide, sinon déduite du texte."""
+    region = (metadata or {}).get("region")
+    if region in REGIONS:
+        return region
+    found = detect_regions(content)
+    return found[0] if len(found) == 1 else PROVINCE
+
+
+def route_regions(text: str = "", commune: Optional[str] = None) -> Optional[List[str]]:
+    """
+    Partitions à interroger : régions de la commune choisie (prioritaire) ou
+    de la question, plus la partition provinciale. None = toutes.
+    """
+    found = detect_regions(commune) if commune else detect_regions(text)
+    if not found:
+        return None
+    return found + [PROVINCE]
@@ -0,0 +1,168 @@
+# streamlit_app/utils/reports.py
+
+import base64
+import io
+import re
+import threading
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+from utils.llm_api   import get_llm_response, BUDGET_MESSAGE
+from utils.llm_providers import OVERLOADED_MESSAGE
+from utils.rag_utils import get_rag_context
+
+# pyplot repose sur un état global : une seule exécution de code graphique à la fois
+PLOT_LOCK = threading.Lock()
+
+REPORT_HEADERS = [
+    "## Introduction",
+    "## Points clés",
+    "## Visualisation graphique",
+    "## Analyse graphique",
+    "## Conclusion",
+]
+
+
+def default_report_period(today: Optional[date] = None) -> Tuple[str, str]:
+    """Période proposée par défaut dans le menu : les douze derniers mois (ISO)."""
+    today = today or date.today()
+    # Un 29 février, l'année précédente n'a pas de 29 : on recule au 28
+    start = today.replace(year=today.year - 1, day=min(today.day, 28) if today.month == 2 else today.day)
+    return start.isoformat(), today.isoformat()
+
+
+def build_report_prompt(report_type: str, commune: str, start: str, end: str, rag_ctx: str) -> str:
+    """Prompt du rapport structuré (dates au format ISO)."""
+    return f"""
+Tu es un assistant professionnel spécialisé en santé au Québec.
+
+Type de rapport : {report_type}
+Commune : {commune}
+Période : {start} → {end}
+
+Documents utiles (RAG) :
+{rag_ctx}
+
+Génère un rapport structuré en Markdown avec ces rubriques :
+## Introduction
+
+…ton texte…
+
+## Points clés
+
+…ton texte…
+
+## Visualisation graphique
+
+<!-- si pertinent, insère ici un bloc fenced Python pour tracer le graphique -->
+
+## Analyse graphique
+
+…ton texte…
+
+## Conclusion
+
+…ton texte…
+"""
+
+
+def render_report_code(raw: str) -> Dict[str, Any]:
+    """
+    Extrait et exécute le code matplotlib (fenced ou inline) de la réponse.
+
+    Returns:
+        {"text": rapport sans le code, "image_base64": PNG encodé ou None}
+    """
+    report_text, image_base64 = raw, None
+
+    # 1) Bloc fenced ```python ... ```
+    m = re.search(r"```(?:python)?\n([\s\S]+?)```", raw)
+
+    # 2) Fallback inline si pas de fenced
+    if not m and "import matplotlib.pyplot" in raw:
+        m2 = re.search(r"(import matplotlib\.pyplot[\s\S]+?plt\.show\(\))", raw)
+        code = m2.group(1) if m2 else None
+    else:
+        code = m.group(1) if m else None
+
+    if code:
+        import matplotlib.pyplot as plt
+        import numpy as np
+
+        with PLOT_LOCK:
+            plt.close("all")
+            # Exécution safe
+            exec_globals = {"plt": plt, "np": np}
+            exec(code, exec_globals)
+            buf = io.BytesIO()
+            plt.gcf().savefig(buf, format="png", dpi=150, bbox_inches="tight")
+            plt.close("all")
+        image_base64 = base64.b64encode(buf.getvalue()).decode("utf-8")
+
+        # On retire le code du texte
+        if m:
+            report_text = raw.replace(m.group(0), "").strip()
+        else:
+            report_text = raw.replace(code, "").strip()
+
+    return {"text": report_text, "image_base64": image_base64}
+
+
+def generate_report(
+    collection,
+    embedding_fn,
+    report_type: str,
+    commune: str,
+    start_date: str,
+    end_date: str,
+    corpus_version: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Génère un rapport complet (RAG + LLM + graphique). N'utilise pas
+    st.session_state : peut s'exécuter dans un thread de la file de tâches.
+    Avec `corpus_version`, un rapport préchargé pour cette version est
+    renvoyé directement (utils/prefetch.py).
+    """
+    if corpus_version is not None:
+        from utils.prefetch import get_prefetch_cache, report_key
+
+        cached = get_prefetch_cache().get(
+            "report", report_key(report_type, commune, start_date, end_date), corpus_version
+        )
+        if cached is not None:
+            return cached
+
+    if commune == "Toutes":
+        rag_ctx = get_rag_context(collection, report_type, all_docs=True)
+    else:
+        rag_ctx = get_rag_context(collection, f"{commune} {report_type}", embedding_fn=embedding_fn,
+                                  commune=commune)
+
+    prompt = build_report_prompt(report_type, commune, start_date, end_date, rag_ctx)
+    raw = get_llm_response(prompt, task="report")
+    return render_report_code(raw)
+
+
+def is_complete_report(result: Dict[str, Any]) -> bool:
+    """False pour un message de repli (service saturé, budget atteint) : à ne pas mettre en cache."""
+    return result["text"].strip() not in (BUDGET_MESSAGE, OVERLOADED_MESSAGE)
+
+
+def split_report_sections(full_md: str) -> Dict[str, str]:
+    """Découpe le Markdown du rapport selon REPORT_HEADERS."""
+    sections = {}
+    for i, h in enumerate(REPORT_HEADERS):
+        nxt = REPORT_HEADERS[i+1] if i+1 < len(REPORT_HEADERS) else None
+        pat = (
+            rf"{re.escape(h)}\s*(.*?)(?={re.escape(nxt)})"
+            if nxt else rf"{re.escape(h)}\s*(.*)$"
+        )
+        m = re.search(pat, full_md, re.S)
+        sections[h] = m.group(1).strip() if m else ""
+    return sections
+
+
+def decode_report_image(result: Dict[str, Any]) -> Optional[bytes]:
+    """PNG du graphique d'un rapport (ou None)."""
+    b64 = result.get("image_base64")
+    return base64.b64decode(b64) if b64 else None
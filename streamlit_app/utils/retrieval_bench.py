@@ -0,0 +1,287 @@
+# streamlit_app/utils/retrieval_bench.py
+"""
+Banc d'essai hors ligne de la recherche : qualité (recall@k, MRR) face à la
+latence des requêtes et au temps de construction de l'index, pour choisir
+modèle, k, seuil adaptatif et paramètres d'index sur des données.
+
+Jeu étiqueté par défaut : les questions d'exemple de l'application et
+quelques reformulations, reliées aux documents du corpus intégré.
+
+Exemple (depuis streamlit_app/) :
+    python -m utils.retrieval_bench --backends exact,chroma --hnsw-m 8,16,32 \\
+        --ef-search 10,50 --lambdas 1.0,0.6 --thresholds 0.5,0.7,0.9 --json bench.json
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# (question, documents pertinents)
+EVAL_SET: List[Tuple[str, List[str]]] = [
+    ("Montre l'évolution des troubles respiratoires à Québec sur les 10 dernières années.", ["1", "resp_qc"]),
+    ("Compare les cas d'asthme à Montréal entre 2014 et 2023.", ["2"]),
+    ("Trace l'évolution de l'anxiété chez les jeunes adultes depuis 2019.", ["3"]),
+    ("Affiche la progression du taux d'occupation des urgences à Montréal depuis 2019.", ["5"]),
+    ("Comment a évolué l'accès aux médecins de famille à Montréal depuis 2017 ?", ["7"]),
+    ("Montre l'évolution des délais d'attente pour les spécialistes depuis 2017.", ["8"]),
+    ("Trace la courbe de l'activité physique chez les 18-30 ans depuis 2018.", ["9"]),
+    ("Comment a évolué la couverture vaccinale chez les 65+ ans depuis 2019 ?", ["11"]),
+    ("Montre la progression du dépistage du cancer du sein entre 2019 et 2023.", ["12"]),
+    ("Compare la consommation de fruits et légumes à Québec depuis 2018.", ["10"]),
+    ("La dépression augmente-t-elle chez les étudiants ?", ["4"]),
+    ("Les hôpitaux de Québec sont-ils surchargés ?", ["6"]),
+    ("Troubles respiratoires à Lévis", ["resp_levis"]),
+    ("Problèmes respiratoires au Bas-Saint-Laurent depuis 2014", ["resp_bsl"]),
+    ("Évolution des troubles respiratoires à Trois-Rivières", ["resp_tr"]),
+    ("Troubles respiratoires à Montréal sur 10 ans", ["resp_mtl"]),
+]
+
+# (question précédente, question de suivi, documents pertinents) : seuil adaptatif
+FOLLOWUP_SET: List[Tuple[str, str, List[str]]] = [
+    ("Montre l'évolution des troubles respiratoires à Québec.", "Et à Lévis ?", ["resp_levis"]),
+    ("Montre l'évolution des troubles respiratoires à Québec.", "Et au Bas-Saint-Laurent ?", ["resp_bsl"]),
+    ("Taux d'anxiété chez les jeunes adultes à Montréal ?", "Et la dépression chez les étudiants ?", ["4"]),
+    ("Taux d'occupation des urgences à Montréal ?", "Et depuis quand ça dépasse 85 % ?", ["5"]),
+    ("Accès aux médecins de famille à Montréal ?", "Quels sont les délais pour les spécialistes ?", ["8"]),
+    ("Couverture vaccinale grippe des 65 ans et plus ?", "Compare la consommation de fruits et légumes à Québec.", ["10"]),
+]
+
+DEFAULT_KS = (1, 2, 3, 5)
+
+
+def _load_labels(path: str) -> List[Tuple[str, List[str]]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [(item["question"], list(item["relevant"])) for item in json.load(f)]
+
+
+def _covered(ids: List[str], metadatas: List[Optional[Dict[str, Any]]]) -> List[set]:
+    """Documents d'origine couverts par chaque passage (découpage, doublons fusionnés)."""
+    out = []
+    for doc_id, meta in zip(ids, metadatas):
+        meta = meta or {}
+        cover = {doc_id, meta.get("source", doc_id)}
+        cover.update(x for x in (meta.get("duplicates") or "").split(",") if x)
+        out.append(cover)
+    return out
+
+
+def _rank_metrics(ranked: List[set], relevant: List[str], ks) -> Dict[str, float]:
+    wanted = set(relevant)
+    first = next((i + 1 for i, cover in enumerate(ranked) if cover & wanted), None)
+    metrics = {"rr": 1.0 / first if first else 0.0}
+    for k in ks:
+        found = set().union(*ranked[:k]) & wanted if ranked[:k] else set()
+        metrics[f"recall@{k}"] = len(found) / len(wanted)
+    return metrics
+
+
+def _summary(rows: List[Dict[str, float]], latencies: List[float]) -> Dict[str, float]:
+    out = {key: round(float(np.mean([r[key] for r in rows])), 3) for key in rows[0]}
+    out["mrr"] = out.pop("rr")
+    out["latency_ms_mean"] = round(float(np.mean(latencies)) * 1000, 3)
+    out["latency_ms_p95"] = round(float(np.percentile(latencies, 95)) * 1000, 3)
+    return out
+
+
+# ------------------------------------------------------------------
+# Index évalués
+# ------------------------------------------------------------------
+def build_exact(documents, embeddings, workdir: str):
+    """Instantané mmap (recherche exacte), comme en production."""
+    from utils.vector_snapshot import build_snapshot, open_snapshot
+
+    # Embeddings précalculés retrouvés par texte (appelé par lots)
+    rows = {}
+    for i, doc in enumerate(documents):
+        rows.setdefault(doc["content"], i)
+    path = os.path.join(workdir, "bench.vsnap")
+    build_snapshot(path, documents, lambda texts: embeddings[[rows[t] for t in texts]], "bench")
+    return open_snapshot(path)
+
+
+def build_chroma(documents, embeddings, hnsw: Dict[str, int]):
+    """Collection Chroma éphémère ; hnsw = {"M", "construction_ef", "search_ef"}."""
+    import chromadb
+
+    client = chromadb.Client()
+    name = "bench_" + "_".join(f"{k}{v}" for k, v in sorted(hnsw.items())).lower()
+    try:
+        client.delete_collection(name)
+    except Exception:
+        pass
+    collection = client.create_collection(
+        name=name,
+        metadata={"hnsw:space": "cosine", **{f"hnsw:{k}": v for k, v in hnsw.items()}}
+    )
+    collection.add(
+        ids=[d["id"] for d in documents],
+        documents=[d["content"] for d in documents],
+        metadatas=[d.get("metadata") or {"source": d["id"]} for d in documents],
+        embeddings=[[float(x) for x in e] for e in embeddings],
+    )
+    return collection
+
+
+def _ranked(index, query_emb, n: int) -> List[set]:
+    res = index.query(query_embeddings=[np.asarray(query_emb).tolist()], n_results=n,
+                      include=["metadatas"])
+    return _covered(res["ids"][0], res["metadatas"][0])
+
+
+def _passage_covers(index, passages: List[Dict[str, Any]]) -> List[set]:
+    ids = [p["id"] for p in passages]
+    got = index.get(ids=ids) if ids else {"ids": [], "metadatas": []}
+    meta = dict(zip(got["ids"], got["metadatas"]))
+    return _covered(ids, [meta.get(i) for i in ids])
+
+
+def _mmr_ranked(index, question, query_emb, fetch_k: int, lambda_mult: float) -> List[set]:
+    from utils.rag_utils import _retrieve_passages
+
+    # Budget de tokens illimité : on mesure l'ordre MMR, pas la troncature
+    passages = _retrieve_passages(index, question, None, query_emb, fetch_k, 10 ** 9, lambda_mult)
+    return _passage_covers(index, passages)
+
+
+def evaluate_index(index, labels, query_embs, ks, lambdas, fetch_k: int, repeat: int) -> List[Dict[str, Any]]:
+    """Une ligne par mode de sélection : top-k brut puis MMR pour chaque lambda."""
+    results = []
+    for lam in [None] + list(lambdas):
+        rows, latencies = [], []
+        for (question, relevant), emb in zip(labels, query_embs):
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                ranked = _ranked(index, emb, max(ks)) if lam is None \
+                    else _mmr_ranked(index, question, emb, max(fetch_k, max(ks)), lam)
+                latencies.append(time.perf_counter() - t0)
+            rows.append(_rank_metrics(ranked, relevant, ks))
+        results.append({"selection": "top-k" if lam is None else f"mmr λ={lam}", **_summary(rows, latencies)})
+    return results
+
+
+def evaluate_threshold(index, embedding_fn, thresholds, ks) -> List[Dict[str, Any]]:
+    """Seuil de fusion des deux dernières questions (retrieve_adaptatif)."""
+    from utils.rag_utils import _retrieve_adaptatif
+
+    results = []
+    for threshold in thresholds:
+        rows, latencies = [], []
+        for prev, cur, relevant in FOLLOWUP_SET:
+            t0 = time.perf_counter()
+            res = _retrieve_adaptatif([prev, cur], embedding_fn, threshold, index)
+            latencies.append(time.perf_counter() - t0)
+            rows.append(_rank_metrics(_passage_covers(index, res["passages"]), relevant, ks))
+        results.append({"threshold": threshold, **_summary(rows, latencies)})
+    return results
+
+
+def run(
+    models: List[str],
+    backends: List[str],
+    hnsw_grid: List[Dict[str, int]],
+    lambdas: List[float],
+    thresholds: List[float],
+    ks=DEFAULT_KS,
+    fetch_k: int = 8,
+    repeat: int = 5,
+    documents: Optional[List[Dict[str, Any]]] = None,
+    labels: Optional[List[Tuple[str, List[str]]]] = None
+) -> List[Dict[str, Any]]:
+    """Balaye modèles × index × sélection ; renvoie une ligne de résultats par combinaison."""
+    from utils.rag_utils import DEFAULT_DOCUMENTS, make_embedding_fn
+    from utils.ingest import prepare_documents
+
+    documents = prepare_documents(documents or DEFAULT_DOCUMENTS)
+    labels = labels or EVAL_SET
+    report: List[Dict[str, Any]] = []
+    workdir = tempfile.mkdtemp(prefix="retrieval-bench-")
+    try:
+        for model in models:
+            embedding_fn = make_embedding_fn(model)
+            t0 = time.perf_counter()
+            doc_embs = np.asarray(embedding_fn([d["content"] for d in documents]), dtype=np.float32)
+            embed_s = time.perf_counter() - t0
+            query_embs = np.asarray(embedding_fn([q for q, _ in labels]), dtype=np.float32)
+
+            configs = [("exact", {})] if "exact" in backends else []
+            configs += [("chroma", h) for h in hnsw_grid] if "chroma" in backends else []
+            for backend, hnsw in configs:
+                t0 = time.perf_counter()
+                index = build_exact(documents, doc_embs, workdir) if backend == "exact" \
+                    else build_chroma(documents, doc_embs, hnsw)
+                build_s = time.perf_counter() - t0
+                base = {"model": model, "backend": backend, **{f"hnsw:{k}": v for k, v in hnsw.items()},
+                        "docs": len(documents), "embed_s": round(embed_s, 3), "build_s": round(build_s, 3)}
+                for row in evaluate_index(index, labels, query_embs, ks, lambdas, fetch_k, repeat):
+                    report.append({**base, **row})
+                # Le seuil ne dépend pas de l'index : évalué sur le premier seulement
+                if backend == configs[0][0] and hnsw == configs[0][1]:
+                    for row in evaluate_threshold(index, embedding_fn, thresholds, ks):
+                        report.append({**base, "selection": "adaptatif", **row})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def _print_table(report: List[Dict[str, Any]], ks) -> None:
+    cols = ["model", "backend", "hnsw:M", "hnsw:search_ef", "selection", "threshold"] + \
+           [f"recall@{k}" for k in ks] + ["mrr", "latency_ms_mean", "latency_ms_p95", "build_s"]
+    cols = [c for c in cols if any(c in r for r in report)]
+    print("  ".join(f"{c:>14}" for c in cols))
+    for r in report:
+        print("  ".join(f"{str(r.get(c, '')):>14}" for c in cols))
+
+
+def _csv(text: str, cast=str) -> List:
+    return [cast(x) for x in text.split(",") if x.strip()]
+
+
+def _main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Banc d'essai qualité/latence de la recherche RAG.")
+    parser.add_argument("--models", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backends", default="exact,chroma", help="exact, chroma")
+    parser.add_argument("--hnsw-m", default="16", help="valeurs de hnsw:M (Chroma)")
+    parser.add_argument("--ef-construction", default="100")
+    parser.add_argument("--ef-search", default="10,50")
+    parser.add_argument("--lambdas", default="1.0,0.6", help="λ MMR évalués (en plus du top-k brut)")
+    parser.add_argument("--thresholds", default="0.5,0.6,0.7,0.8,0.9")
+    parser.add_argument("--ks", default=",".join(map(str, DEFAULT_KS)))
+    parser.add_argument("--fetch-k", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5, help="répétitions par requête (latence)")
+    parser.add_argument("--corpus", help="fichier JSON [{id, content, metadata?}]")
+    parser.add_argument("--labels", help="fichier JSON [{question, relevant: [ids]}]")
+    parser.add_argument("--json", help="écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    documents = None
+    if args.corpus:
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            documents = json.load(f)
+    hnsw_grid = [
+        {"M": m, "construction_ef": efc, "search_ef": efs}
+        for m in _csv(args.hnsw_m, int)
+        for efc in _csv(args.ef_construction, int)
+        for efs in _csv(args.ef_search, int)
+    ]
+    ks = _csv(args.ks, int)
+    report = run(
+        _csv(args.models), _csv(args.backends), hnsw_grid, _csv(args.lambdas, float),
+        _csv(args.thresholds, float), ks, args.fetch_k, args.repeat,
+        documents, _load_labels(args.labels) if args.labels else None
+    )
+    _print_table(report, ks)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,191 @@
+# streamlit_app/utils/search_index.py
+
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List
+
+from utils.history import HISTO_DIR
+
+# ------------------------------------------------------------------
+# Index plein texte (SQLite FTS5) des conversations, tenu à jour de façon
+# incrémentale à chaque sauvegarde : seuls les nouveaux messages sont
+# insérés, une conversation n'est réindexée que si elle a raccourci.
+# ------------------------------------------------------------------
+SEARCH_DB_PATH = os.getenv("SEARCH_DB_PATH", os.path.join(HISTO_DIR, "search.db"))
+
+# Table de contenu classique (indexée par conversation) + table FTS5 externe
+# synchronisée par triggers : les suppressions se font par rowid, sans balayage.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexed_conversations (
+    user       TEXT NOT NULL,
+    conv_id    TEXT NOT NULL,
+    title      TEXT NOT NULL,
+    n_messages INTEGER NOT NULL,
+    PRIMARY KEY (user, conv_id)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id      INTEGER PRIMARY KEY,
+    user    TEXT NOT NULL,
+    conv_id TEXT NOT NULL,
+    msg_idx INTEGER NOT NULL,
+    role    TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_conv ON messages (user, conv_id, msg_idx);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content,
+    content = 'messages',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+# Le titre est indexé comme une pseudo-ligne (msg_idx = -1)
+_TITLE_IDX = -1
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _connect() -> sqlite3.Connection:
+    global _initialized
+    os.makedirs(os.path.dirname(os.path.abspath(SEARCH_DB_PATH)), exist_ok=True)
+    conn = sqlite3.connect(SEARCH_DB_PATH, timeout=10)
+    with _init_lock:
+        if not _initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            _initialized = True
+    return conn
+
+
+def _searchable(msg: Dict[str, Any]) -> bool:
+    # Les messages « graph » répètent la description textuelle qui les précède
+    return msg.get("type") != "graph" and bool(msg.get("content"))
+
+
+def index_conversations(user_id: str, conversations: List[Dict[str, Any]]) -> None:
+    """
+    Synchronise l'index avec la liste de conversations de l'utilisateur
+    (ajouts de messages, titres modifiés, conversations supprimées).
+    """
+    conn = _connect()
+    try:
+        with conn:
+            state = {
+                conv_id: (title, n)
+                for conv_id, title, n in conn.execute(
+                    "SELECT conv_id, title, n_messages FROM indexed_conversations WHERE user = ?",
+                    (user_id,)
+                )
+            }
+            current_ids = set()
+            for conv in conversations:
+                conv_id = conv["id"]
+                current_ids.add(conv_id)
+                messages = conv.get("messages", [])
+                title = conv.get("title", "")
+                old_title, old_n = state.get(conv_id, (None, 0))
+
+                if len(messages) < old_n:
+                    # Messages retirés : on repart de zéro pour cette conversation
+                    conn.execute(
+                        "DELETE FROM messages WHERE user = ? AND conv_id = ?",
+                        (user_id, conv_id)
+                    )
+                    old_title, old_n = None, 0
+
+                if title != old_title:
+                    if old_title is not None:
+                        conn.execute(
+                            "DELETE FROM messages WHERE user = ? AND conv_id = ? AND msg_idx = ?",
+                            (user_id, conv_id, _TITLE_IDX)
+                        )
+                    conn.execute(
+                        "INSERT INTO messages (content, user, conv_id, msg_idx, role) "
+                        "VALUES (?, ?, ?, ?, 'title')",
+                        (title, user_id, conv_id, _TITLE_IDX)
+                    )
+
+                new_rows = [
+                    (msg["content"], user_id, conv_id, i, msg.get("role", ""))
+                    for i, msg in enumerate(messages[old_n:], start=old_n)
+                    if _searchable(msg)
+                ]
+                if new_rows:
+                    conn.executemany(
+                        "INSERT INTO messages (content, user, conv_id, msg_idx, role) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        new_rows
+                    )
+                if title != old_title or len(messages) != old_n:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO indexed_conversations (user, conv_id, title, n_messages) "
+                        "VALUES (?, ?, ?, ?)",
+                        (user_id, conv_id, title, len(messages))
+                    )
+
+            for conv_id in set(state) - current_ids:
+                conn.execute(
+                    "DELETE FROM messages WHERE user = ? AND conv_id = ?", (user_id, conv_id)
+                )
+                conn.execute(
+                    "DELETE FROM indexed_conversations WHERE user = ? AND conv_id = ?", (user_id, conv_id)
+                )
+    finally:
+        conn.close()
+
+
+def _match_expression(query: str) -> str:
+    # Chaque mot devient un préfixe entre guillemets : aucune syntaxe FTS5 n'est interprétée
+    words = re.findall(r"\w+", query, flags=re.UNICODE)
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def search_conversations(user_id: str, query: str, limit: int = 20, hits_per_conv: int = 3) -> List[Dict[str, Any]]:
+    """
+    Recherche plein texte classée (BM25) dans les conversations de l'utilisateur.
+
+    Returns:
+        [{"conv_id", "title", "score", "hits": [{"msg_idx", "role", "snippet"}]}]
+        triés du plus pertinent au moins pertinent.
+    """
+    expr = _match_expression(query)
+    if not expr:
+        return []
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            """
+            SELECT m.conv_id, m.msg_idx, m.role,
+                   snippet(messages_fts, 0, '**', '**', '…', 12) AS snip,
+                   bm25(messages_fts) AS score,
+                   c.title
+            FROM messages_fts
+            JOIN messages AS m ON m.id = messages_fts.rowid
+            JOIN indexed_conversations AS c ON c.user = m.user AND c.conv_id = m.conv_id
+            WHERE messages_fts MATCH ? AND m.user = ?
+            ORDER BY score
+            LIMIT ?
+            """,
+            (expr, user_id, limit * hits_per_conv * 2)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for conv_id, msg_idx, role, snip, score, title in rows:
+        entry = results.setdefault(conv_id, {"conv_id": conv_id, "title": title, "score": score, "hits": []})
+        # bm25 renvoie des scores négatifs : plus petit = plus pertinent
+        entry["score"] = min(entry["score"], score)
+        if len(entry["hits"]) < hits_per_conv:
+            entry["hits"].append({"msg_idx": int(msg_idx), "role": role, "snippet": snip})
+    return sorted(results.values(), key=lambda r: r["score"])[:limit]
@@ -0,0 +1,76 @@
+# streamlit_app/utils/singleflight.py
+
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# ------------------------------------------------------------------
+# Regroupement des appels identiques simultanés (« single-flight ») :
+# tant qu'un appel est en cours pour une clé, les appels suivants avec la
+# même clé attendent son résultat au lieu de relancer le travail. Rien
+# n'est mis en cache : la clé est libérée dès la fin de l'appel.
+# ------------------------------------------------------------------
+
+
+def digest(text: str) -> str:
+    """Empreinte courte d'un texte long (prompt, requête) pour servir de clé."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """Groupe d'appels partagé par toutes les sessions du processus."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Exécute fn(*args, **kwargs), ou attend l'appel déjà en cours pour
+        `key` et renvoie son résultat (ou relève son exception). Le résultat
+        est le même objet pour tous les appelants : à traiter en lecture seule.
+        Un appelant qui attend plus de `timeout` s reçoit TimeoutError.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"Appel partagé « {self.name} » toujours en cours après {timeout:.1f}s")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        """Appels exécutés, appels servis par un appel en cours, appels en vol."""
+        with self._lock:
+            return {"executed": self.executed, "shared": self.shared, "in_flight": len(self._calls)}
@@ -0,0 +1,266 @@
+# streamlit_app/utils/trends.py
+"""
+Analyse locale (NumPy) des séries d'un graphique : extrêmes, variations
+globale et annuelle, taux de croissance annuel composé, pente de tendance et
+point de rupture. Produit une description factuelle en français sans appel
+LLM, et répond aux questions de suivi sur « ce graphique ».
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Une rupture n'est signalée que si deux droites expliquent nettement mieux
+# la série qu'une seule (réduction relative de l'erreur quadratique)
+BREAK_MIN_GAIN = 0.5
+MAX_SERIES_DESCRIBED = 3
+
+
+def _fmt(value: float) -> str:
+    """Nombre à la française : 2 décimales au plus, virgule décimale."""
+    text = f"{value:.2f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text.replace(".", ",")
+
+
+def _fmt_x(x: Any) -> str:
+    if isinstance(x, float) and x.is_integer():
+        return str(int(x))
+    return str(x)
+
+
+def _numeric_x(xdata: List[Any]) -> Optional[np.ndarray]:
+    try:
+        x = np.asarray(xdata, dtype=float)
+    except (TypeError, ValueError):
+        return None
+    return x if np.all(np.isfinite(x)) else None
+
+
+def _linear_sse(x: np.ndarray, y: np.ndarray) -> float:
+    if len(x) < 3:
+        return 0.0
+    coef = np.polyfit(x, y, 1)
+    return float(np.sum((np.polyval(coef, x) - y) ** 2))
+
+
+def _breakpoint(x: np.ndarray, y: np.ndarray) -> Optional[Dict[str, Any]]:
+    """Meilleure coupure en deux segments linéaires (au moins 3 points chacun)."""
+    n = len(y)
+    if n < 6:
+        return None
+    base = _linear_sse(x, y)
+    if base <= 1e-12:
+        return None
+    best_k, best_sse = None, base
+    for k in range(3, n - 2):
+        sse = _linear_sse(x[:k], y[:k]) + _linear_sse(x[k:], y[k:])
+        if sse < best_sse:
+            best_k, best_sse = k, sse
+    if best_k is None or 1 - best_sse / base < BREAK_MIN_GAIN:
+        return None
+    before = np.polyfit(x[:best_k], y[:best_k], 1)[0]
+    after = np.polyfit(x[best_k:], y[best_k:], 1)[0]
+    return {"index": best_k, "slope_before": float(before), "slope_after": float(after),
+            "gain": round(1 - best_sse / base, 3)}
+
+
+def analyze_series(xdata: List[Any], ydata: List[Any]) -> Optional[Dict[str, Any]]:
+    """
+    Statistiques d'une série (points non numériques ou non finis ignorés).
+
+    Returns:
+        None si moins de deux points, sinon un dict : start, end, min, max
+        ({"x", "y"}), change, change_pct, yoy (variations successives),
+        biggest_step, cagr_pct, slope (par unité de x), breakpoint.
+    """
+    xs, ys = [], []
+    for xv, yv in zip(xdata, ydata):
+        try:
+            yf = float(yv)
+        except (TypeError, ValueError):
+            continue
+        if np.isfinite(yf):
+            xs.append(xv)
+            ys.append(yf)
+    if len(ys) < 2:
+        return None
+
+    y = np.asarray(ys, dtype=float)
+    x_num = _numeric_x(xs)
+    x = x_num if x_num is not None else np.arange(len(y), dtype=float)
+    i_min, i_max = int(np.argmin(y)), int(np.argmax(y))
+    steps = np.diff(y)
+    i_step = int(np.argmax(np.abs(steps)))
+
+    span = float(x[-1] - x[0])
+    cagr = None
+    if x_num is not None and span > 0 and y[0] > 0 and y[-1] > 0:
+        cagr = float((y[-1] / y[0]) ** (1 / span) - 1) * 100
+
+    bp = _breakpoint(x, y)
+    if bp is not None:
+        bp["x"] = xs[bp["index"]]
+
+    return {
+        "n": len(y),
+        "start": {"x": xs[0], "y": float(y[0])},
+        "end": {"x": xs[-1], "y": float(y[-1])},
+        "min": {"x": xs[i_min], "y": float(y[i_min])},
+        "max": {"x": xs[i_max], "y": float(y[i_max])},
+        "mean": float(y.mean()),
+        "change": float(y[-1] - y[0]),
+        "change_pct": float((y[-1] - y[0]) / abs(y[0]) * 100) if y[0] else None,
+        "yoy": [{"x": xs[i + 1], "delta": float(d)} for i, d in enumerate(steps)],
+        "biggest_step": {"from": xs[i_step], "x": xs[i_step + 1], "delta": float(steps[i_step])},
+        "cagr_pct": cagr,
+        "slope": float(np.polyfit(x, y, 1)[0]),
+        "numeric_x": x_num is not None,
+        "breakpoint": bp,
+    }
+
+
+def graph_series(graph_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Séries du graphique ; repli sur xdata/ydata pour les anciens historiques."""
+    series = graph_data.get("series")
+    if series:
+        return series
+    if graph_data.get("ydata"):
+        return [{"label": graph_data.get("ylabel") or "", "xdata": graph_data.get("xdata") or [],
+                 "ydata": graph_data["ydata"]}]
+    return []
+
+
+def _unit(graph_data: Dict[str, Any]) -> str:
+    labels = f"{graph_data.get('ylabel', '')} {graph_data.get('title', '')}"
+    return " %" if "%" in labels or "taux" in labels.lower() or "proportion" in labels.lower() else ""
+
+
+def _amount(delta: float, unit: str) -> str:
+    # Un écart entre deux pourcentages s'exprime en points
+    if unit == " %":
+        return f"{_fmt(delta)} point{'s' if delta >= 2 else ''}"
+    return _fmt(delta) + unit
+
+
+def _series_sentences(label: str, stats: Dict[str, Any], unit: str) -> List[str]:
+    name = f"{label} : " if label else ""
+    if not stats["numeric_x"]:
+        # Catégories (communes, groupes…) : comparaison plutôt qu'évolution
+        return [f"{name}valeur la plus élevée pour {_fmt_x(stats['max']['x'])} "
+                f"({_fmt(stats['max']['y'])}{unit}), la plus basse pour {_fmt_x(stats['min']['x'])} "
+                f"({_fmt(stats['min']['y'])}{unit}) ; moyenne de {_fmt(stats['mean'])}{unit}."]
+    s, e = stats["start"], stats["end"]
+    direction = "hausse" if stats["change"] > 0 else "baisse"
+    sentence = (f"{name}de {_fmt(s['y'])}{unit} en {_fmt_x(s['x'])} à {_fmt(e['y'])}{unit} "
+                f"en {_fmt_x(e['x'])}")
+    if stats["change"]:
+        sentence += f", soit une {direction} de {_amount(abs(stats['change']), unit)}"
+        if stats["change_pct"] is not None and unit != " %":
+            sentence += f" ({_fmt(stats['change_pct'])} %)"
+    else:
+        sentence += " (niveau inchangé)"
+    sentences = [sentence + "."]
+
+    extremes = (f"Minimum de {_fmt(stats['min']['y'])}{unit} en {_fmt_x(stats['min']['x'])}, "
+                f"maximum de {_fmt(stats['max']['y'])}{unit} en {_fmt_x(stats['max']['x'])}")
+    if stats["cagr_pct"] is not None and abs(stats["cagr_pct"]) >= 0.05:
+        extremes += f" ; croissance annuelle moyenne de {_fmt(stats['cagr_pct'])} %"
+    sentences.append(extremes + ".")
+
+    bp, step = stats["breakpoint"], stats["biggest_step"]
+    if bp is not None:
+        sentences.append(
+            f"Rupture de tendance vers {_fmt_x(bp['x'])} : la pente passe de "
+            f"{_amount(bp['slope_before'], unit)} à {_amount(bp['slope_after'], unit)} par an."
+        )
+    elif len(stats["yoy"]) > 2 and abs(step["delta"]) > 2 * np.median([abs(d["delta"]) for d in stats["yoy"]]):
+        sentences.append(
+            f"La plus forte variation survient entre {_fmt_x(step['from'])} et {_fmt_x(step['x'])} "
+            f"({'+' if step['delta'] > 0 else ''}{_fmt(step['delta'])}{unit})."
+        )
+    return sentences
+
+
+def describe_graph(graph_data: Dict[str, Any]) -> str:
+    """Description factuelle en français des séries du graphique."""
+    unit = _unit(graph_data)
+    analyzed = []
+    for s in graph_series(graph_data):
+        stats = analyze_series(s.get("xdata") or [], s.get("ydata") or [])
+        if stats is not None:
+            analyzed.append((s.get("label") or "", stats))
+    if not analyzed:
+        return graph_data.get("title") or "Graphique généré à partir des données disponibles."
+
+    lines = []
+    if graph_data.get("title"):
+        lines.append(f"**{graph_data['title']}**")
+    named = len(analyzed) > 1
+    for label, stats in analyzed[:MAX_SERIES_DESCRIBED]:
+        lines.append(" ".join(_series_sentences(label if named else "", stats, unit)))
+    if named:
+        top = max(analyzed, key=lambda a: a[1]["end"]["y"])
+        fastest = max(analyzed, key=lambda a: a[1]["slope"])
+        lines.append(
+            f"En fin de période, {top[0] or 'la première série'} est la plus élevée "
+            f"({_fmt(top[1]['end']['y'])}{unit}) ; {fastest[0] or 'la première série'} "
+            f"progresse le plus vite ({_amount(fastest[1]['slope'], unit)} par an en moyenne)."
+        )
+        if len(analyzed) > MAX_SERIES_DESCRIBED:
+            lines.append(f"({len(analyzed) - MAX_SERIES_DESCRIBED} autres séries non détaillées.)")
+    return "\n\n".join(lines)
+
+
+# Questions de suivi : mot-clé → fait à rapporter
+_FOLLOWUP_FACTS = [
+    (r"\b(max|maximum|plus (haut|élevé)e?|pic|sommet)\b", "max"),
+    (r"\b(min|minimum|plus (bas|faible)s?e?)\b", "min"),
+    (r"\b(croissance annuelle|tcac|cagr|par an)\b", "cagr"),
+    (r"\b(rupture|saut|bond|cassure|changement de tendance)\b", "breakpoint"),
+    (r"\b(moyenne)\b", "mean"),
+    (r"\b(tendance|pente)\b", "slope"),
+]
+
+
+def _fact(kind: str, label: str, stats: Dict[str, Any], unit: str) -> str:
+    name = f"{label} : " if label else ""
+    if kind in ("max", "min"):
+        p = stats[kind]
+        word = "Maximum" if kind == "max" else "Minimum"
+        return f"{name}{word} de {_fmt(p['y'])}{unit} en {_fmt_x(p['x'])}."
+    if kind == "cagr":
+        if stats["cagr_pct"] is None:
+            return f"{name}taux de croissance annuel non calculable pour cette série."
+        return (f"{name}croissance annuelle moyenne de {_fmt(stats['cagr_pct'])} % entre "
+                f"{_fmt_x(stats['start']['x'])} et {_fmt_x(stats['end']['x'])}.")
+    if kind == "breakpoint":
+        bp = stats["breakpoint"]
+        if bp is None:
+            step = stats["biggest_step"]
+            return (f"{name}pas de rupture nette ; la plus forte variation est entre "
+                    f"{_fmt_x(step['from'])} et {_fmt_x(step['x'])} ({_fmt(step['delta'])}{unit}).")
+        return (f"{name}rupture vers {_fmt_x(bp['x'])} (pente de {_amount(bp['slope_before'], unit)} "
+                f"puis {_amount(bp['slope_after'], unit)} par an).")
+    if kind == "mean":
+        return f"{name}moyenne de {_fmt(stats['mean'])}{unit} sur la période."
+    return f"{name}tendance de {_amount(stats['slope'], unit)} par an en moyenne (régression linéaire)."
+
+
+def answer_graph_question(question: str, graph_data: Dict[str, Any]) -> str:
+    """Réponse immédiate à une question de suivi sur le graphique affiché."""
+    q = question.lower()
+    kinds = [kind for pattern, kind in _FOLLOWUP_FACTS if re.search(pattern, q)]
+    if not kinds:
+        return describe_graph(graph_data)
+    unit = _unit(graph_data)
+    series = graph_series(graph_data)
+    named = len(series) > 1
+    facts = []
+    for s in series[:MAX_SERIES_DESCRIBED]:
+        stats = analyze_series(s.get("xdata") or [], s.get("ydata") or [])
+        if stats is None:
+            continue
+        facts.extend(_fact(kind, s.get("label", "") if named else "", stats, unit) for kind in kinds)
+    return " ".join(facts) if facts else describe_graph(graph_data)
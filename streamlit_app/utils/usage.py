@@ -0,0 +1,203 @@
+# streamlit_app/utils/usage.py
+
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from utils.history import HISTO_DIR
+
+# ------------------------------------------------------------------
+# Comptabilité des appels LLM : jetons d'entrée/sortie, latence et statut
+# de chaque appel, étiquetés par tâche (site d'appel) et par utilisateur.
+# Chaque appel est ajouté à histories/usage/<AAAA-MM-JJ>.jsonl ; les
+# compteurs du jour (budgets) et une fenêtre glissante (statistiques)
+# sont tenus en mémoire et rechargés depuis ce fichier au redémarrage.
+# ------------------------------------------------------------------
+USAGE_DIR = os.path.join(HISTO_DIR, "usage")
+USAGE_WINDOW_S = float(os.getenv("LLM_USAGE_WINDOW_S", "3600"))
+USER_DAILY_TOKENS = int(os.getenv("LLM_USER_DAILY_TOKENS", "0"))      # 0 = illimité
+GLOBAL_DAILY_TOKENS = int(os.getenv("LLM_GLOBAL_DAILY_TOKENS", "0"))  # 0 = illimité
+
+# Utilisateur courant : fixé par main() à chaque exécution, propagé aux
+# tâches de fond par la file de tâches (contexte copié à la soumission)
+current_user: contextvars.ContextVar[str] = contextvars.ContextVar("llm_user", default="-")
+
+
+def set_current_user(user: str) -> None:
+    current_user.set(user or "-")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation (≈ 4 caractères par token) si le fournisseur ne renvoie pas d'usage."""
+    return len(text) // 4 + 1
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class UsageTracker:
+    """Journal des appels LLM et compteurs de budget, partagés par le processus."""
+
+    def __init__(self, usage_dir: str = USAGE_DIR, window_s: float = USAGE_WINDOW_S):
+        self.usage_dir = usage_dir
+        self.window_s = window_s
+        self._lock = threading.Lock()
+        self._recent: deque = deque()
+        self._day: Optional[str] = None
+        self._daily: Dict[str, int] = {}
+
+    def _path(self, day: str) -> str:
+        return os.path.join(self.usage_dir, f"{day}.jsonl")
+
+    def _roll_day(self) -> None:
+        # À appeler sous verrou : compteurs du jour, relus depuis le journal
+        today = date.today().isoformat()
+        if today == self._day:
+            return
+        self._day, self._daily = today, {}
+        path = self._path(today)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # ligne tronquée par un arrêt brutal
+                    self._count(rec)
+
+    def _count(self, rec: Dict[str, Any]) -> None:
+        total = rec["prompt_tokens"] + rec["completion_tokens"]
+        self._daily[rec["user"]] = self._daily.get(rec["user"], 0) + total
+        self._daily["*"] = self._daily.get("*", 0) + total
+
+    def record(
+        self,
+        task: str,
+        provider: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency_s: float,
+        status: str = "ok",
+        estimated: bool = False
+    ) -> None:
+        """Enregistre un appel pour l'utilisateur courant."""
+        rec = {
+            "ts": time.time(),
+            "user": current_user.get(),
+            "task": task,
+            "provider": provider,
+            "model": model,
+            "prompt_tokens": int(prompt_tokens),
+            "completion_tokens": int(completion_tokens),
+            "latency_s": round(latency_s, 3),
+            "status": status,
+            "estimated": estimated,
+        }
+        with self._lock:
+            self._roll_day()
+            self._count(rec)
+            self._recent.append(rec)
+            while self._recent and self._recent[0]["ts"] < rec["ts"] - self.window_s:
+                self._recent.popleft()
+            os.makedirs(self.usage_dir, exist_ok=True)
+            with open(self._path(self._day), "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def used_today(self, user: Optional[str] = None) -> int:
+        """Jetons consommés aujourd'hui par `user` (ou par tous si None)."""
+        with self._lock:
+            self._roll_day()
+            return self._daily.get(user if user is not None else "*", 0)
+
+    def budget_status(self, user: Optional[str] = None) -> Dict[str, Any]:
+        """Consommation du jour face aux budgets utilisateur et global."""
+        user = user or current_user.get()
+        user_used, global_used = self.used_today(user), self.used_today()
+        exceeded = (USER_DAILY_TOKENS > 0 and user_used >= USER_DAILY_TOKENS) or \
+                   (GLOBAL_DAILY_TOKENS > 0 and global_used >= GLOBAL_DAILY_TOKENS)
+        return {
+            "user": user,
+            "user_used": user_used,
+            "user_limit": USER_DAILY_TOKENS,
+            "global_used": global_used,
+            "global_limit": GLOBAL_DAILY_TOKENS,
+            "exceeded": exceeded,
+        }
+
+    def stats(self, by: str = "task") -> Dict[str, Dict[str, Any]]:
+        """Statistiques de la fenêtre glissante, regroupées par "task", "user" ou "model"."""
+        with self._lock:
+            recs = list(self._recent)
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for rec in recs:
+            groups.setdefault(rec[by], []).append(rec)
+        return {key: _summarize(group) for key, group in groups.items()}
+
+
+def _summarize(recs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    latencies = [r["latency_s"] for r in recs]
+    prompt = sum(r["prompt_tokens"] for r in recs)
+    completion = sum(r["completion_tokens"] for r in recs)
+    return {
+        "calls": len(recs),
+        "errors": sum(1 for r in recs if r["status"] != "ok"),
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "avg_prompt_tokens": round(prompt / len(recs)) if recs else 0,
+        "p50_latency_s": round(_percentile(latencies, 50), 3),
+        "p95_latency_s": round(_percentile(latencies, 95), 3),
+    }
+
+
+_tracker: Optional[UsageTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_usage_tracker() -> UsageTracker:
+    """Journal d'usage unique du processus (créé au premier appel)."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = UsageTracker()
+        return _tracker
+
+
+def _main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Consommation de jetons LLM par tâche et par utilisateur.")
+    parser.add_argument("--day", default=date.today().isoformat(), help="jour AAAA-MM-JJ (défaut : aujourd'hui)")
+    parser.add_argument("--by", default="task", choices=["task", "user", "model", "provider"])
+    args = parser.parse_args()
+
+    path = os.path.join(USAGE_DIR, f"{args.day}.jsonl")
+    if not os.path.exists(path):
+        print(f"Aucun appel enregistré ({path}).")
+        return
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            groups.setdefault(rec[args.by], []).append(rec)
+    print(f"{args.by:<20} {'appels':>7} {'erreurs':>8} {'entrée':>9} {'sortie':>9} {'moy. entrée':>12} {'p50 s':>7} {'p95 s':>7}")
+    for key, recs in sorted(groups.items(), key=lambda kv: -sum(r["prompt_tokens"] + r["completion_tokens"] for r in kv[1])):
+        s = _summarize(recs)
+        print(f"{key:<20} {s['calls']:>7} {s['errors']:>8} {s['prompt_tokens']:>9} {s['completion_tokens']:>9} "
+              f"{s['avg_prompt_tokens']:>12} {s['p50_latency_s']:>7} {s['p95_latency_s']:>7}")
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,382 @@
+# streamlit_app/utils/vector_backends.py
+"""
+Moteurs d'index vectoriel interchangeables, au format de l'API Chroma
+(`query`, `get`, `count`, `upsert`) attendu par rag_utils :
+
+  - ExactBackend : recherche exacte par produit matriciel NumPy (BLAS),
+    plus rapide qu'un index approché tant que le corpus reste petit ;
+  - Chroma avec index HNSW réglé (M, ef_construction, ef_search).
+
+`create_index` choisit selon la taille du corpus (seuil EXACT_MAX_DOCS).
+PartitionedIndex répartit le corpus en partitions régionales (utils/regions.py)
+interrogées en parallèle ; `route(régions)` restreint la recherche.
+
+Mesure du point de bascule (depuis streamlit_app/) :
+    python -m utils.vector_backends --sizes 10000,100000,1000000
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+EXACT_MAX_DOCS = int(os.getenv("VECTOR_EXACT_MAX_DOCS", "50000"))
+RAG_PARTITIONS = os.getenv("RAG_PARTITIONS", "1") == "1"
+PARTITION_WORKERS = int(os.getenv("RAG_PARTITION_WORKERS", "4"))
+HNSW_PARAMS = {
+    "hnsw:space": "cosine",
+    "hnsw:M": int(os.getenv("HNSW_M", "16")),
+    "hnsw:construction_ef": int(os.getenv("HNSW_CONSTRUCTION_EF", "200")),
+    "hnsw:search_ef": int(os.getenv("HNSW_SEARCH_EF", "64")),
+}
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+def top_k(sims: np.ndarray, k: int) -> np.ndarray:
+    """Indices des k plus grandes similarités d'une ligne, triés (argpartition)."""
+    k = min(k, len(sims))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-sims, k - 1)[:k] if k < len(sims) else np.arange(len(sims))
+    return idx[np.argsort(-sims[idx])]
+
+
+class VectorBackend:
+    """Interface commune (sous-ensemble de l'API d'une collection Chroma)."""
+
+    name: str = ""
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def upsert(self, ids, documents=None, embeddings=None, metadatas=None) -> None:
+        raise NotImplementedError
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def query(self, query_texts=None, query_embeddings=None, n_results: int = 10,
+              include: Optional[List[str]] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class ExactBackend(VectorBackend):
+    """Index exact en mémoire : matrice float32 normalisée, recherche par matmul."""
+
+    def __init__(self, name: str, embedding_fn=None):
+        self.name = name
+        self.embedding_fn = embedding_fn
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._pos: Dict[str, int] = {}
+        self._docs: List[str] = []
+        self._metas: List[Optional[Dict[str, Any]]] = []
+        self._embs = np.empty((0, 0), dtype=np.float32)
+        self._n = 0
+
+    def count(self) -> int:
+        return self._n
+
+    def _reserve(self, n: int, dim: int) -> None:
+        # Capacité doublée à chaque extension : ajouts par lots en O(n) amorti
+        if self._embs.shape[1] not in (0, dim):
+            raise ValueError(f"Dimension {dim} ≠ {self._embs.shape[1]} de l'index {self.name}.")
+        if n > self._embs.shape[0]:
+            grown = np.empty((max(n, 2 * self._embs.shape[0], 64), dim), dtype=np.float32)
+            if self._n:
+                grown[:self._n] = self._embs[:self._n]
+            self._embs = grown
+
+    def upsert(self, ids, documents=None, embeddings=None, metadatas=None) -> None:
+        if embeddings is None:
+            if self.embedding_fn is None:
+                raise RuntimeError("Aucune fonction d'embedding pour encoder les documents.")
+            embeddings = self.embedding_fn(documents)
+        embs = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        with self._lock:
+            new = [i for i in dict.fromkeys(ids) if i not in self._pos]
+            self._reserve(self._n + len(new), embs.shape[1])
+            for j, doc_id in enumerate(ids):
+                pos = self._pos.get(doc_id)
+                if pos is None:
+                    pos = self._pos[doc_id] = self._n
+                    self._n += 1
+                    self._ids.append(doc_id)
+                    self._docs.append(None)
+                    self._metas.append(None)
+                self._embs[pos] = embs[j]
+                if documents is not None:
+                    self._docs[pos] = documents[j]
+                if metadatas is not None:
+                    self._metas[pos] = metadatas[j]
+
+    add = upsert
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        idx = list(range(self._n)) if ids is None else [self._pos[i] for i in ids if i in self._pos]
+        out = {
+            "ids": [self._ids[i] for i in idx],
+            "documents": [self._docs[i] for i in idx],
+            "metadatas": [self._metas[i] for i in idx],
+        }
+        if include and "embeddings" in include:
+            out["embeddings"] = self._embs[idx]
+        return out
+
+    def query(self, query_texts=None, query_embeddings=None, n_results: int = 10,
+              include: Optional[List[str]] = None) -> Dict[str, Any]:
+        if query_embeddings is None:
+            if self.embedding_fn is None:
+                raise RuntimeError("Aucune fonction d'embedding pour encoder la requête.")
+            query_embeddings = self.embedding_fn(query_texts)
+        q = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        matrix = self._embs[:self._n]
+        sims = q @ matrix.T if self._n else np.empty((len(q), 0), dtype=np.float32)
+        out: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if include and "embeddings" in include:
+            out["embeddings"] = []
+        for row in sims:
+            top = top_k(row, n_results)
+            out["ids"].append([self._ids[i] for i in top])
+            out["documents"].append([self._docs[i] for i in top])
+            out["metadatas"].append([self._metas[i] for i in top])
+            out["distances"].append((1.0 - row[top]).tolist())
+            if "embeddings" in out:
+                out["embeddings"].append(matrix[top])
+        return out
+
+
+def choose_backend(n_docs: int) -> str:
+    """"exact" jusqu'à EXACT_MAX_DOCS documents, "hnsw" au-delà."""
+    return "exact" if n_docs <= EXACT_MAX_DOCS else "hnsw"
+
+
+def create_index(name: str, embedding_fn, n_docs: int, backend: Optional[str] = None):
+    """Index vide prêt pour `upsert`, selon la taille prévue du corpus."""
+    backend = backend or os.getenv("VECTOR_BACKEND") or choose_backend(n_docs)
+    if backend == "exact":
+        return ExactBackend(name, embedding_fn)
+    from utils.rag_utils import init_collection
+
+    return init_collection(collection_name=name, embedding_fn=embedding_fn, metadata=HNSW_PARAMS)
+
+
+# Recherches des partitions en parallèle (matmul NumPy et Chroma relâchent le GIL)
+_search_pool = ThreadPoolExecutor(max_workers=PARTITION_WORKERS, thread_name_prefix="partition")
+
+
+class PartitionedIndex(VectorBackend):
+    """
+    Index composé d'une partition par région. `query` interroge les
+    partitions en parallèle et fusionne les résultats par distance ;
+    `route(régions)` renvoie une vue limitée à ces partitions, de sorte que
+    le coût d'une requête suit la taille des régions concernées.
+    """
+
+    def __init__(self, name: str, shards: Dict[str, Any], embedding_fn=None):
+        self.name = name
+        self.shards = shards
+        self.embedding_fn = embedding_fn
+        self._views: Dict[frozenset, "PartitionedIndex"] = {}
+        self._lock = threading.Lock()
+
+    def route(self, regions: Optional[Iterable[str]]) -> "PartitionedIndex":
+        """Vue sur les partitions `regions` (toutes si None) ; vues réutilisées."""
+        wanted = frozenset(r for r in regions or () if r in self.shards)
+        if regions is None or not wanted or wanted == frozenset(self.shards):
+            return self
+        with self._lock:
+            view = self._views.get(wanted)
+            if view is None:
+                view = self._views[wanted] = PartitionedIndex(
+                    f"{self.name}[{','.join(sorted(wanted))}]",
+                    {r: self.shards[r] for r in self.shards if r in wanted},
+                    self.embedding_fn
+                )
+        return view
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self.shards.values())
+
+    def upsert(self, ids, documents=None, embeddings=None, metadatas=None) -> None:
+        from utils.regions import document_region
+
+        groups: Dict[str, List[int]] = {}
+        for j in range(len(ids)):
+            region = document_region(documents[j] if documents is not None else "",
+                                     metadatas[j] if metadatas is not None else None)
+            groups.setdefault(region if region in self.shards else "province", []).append(j)
+        for region, rows in groups.items():
+            self.shards[region].upsert(
+                ids=[ids[j] for j in rows],
+                documents=[documents[j] for j in rows] if documents is not None else None,
+                embeddings=[embeddings[j] for j in rows] if embeddings is not None else None,
+                metadatas=[metadatas[j] for j in rows] if metadatas is not None else None,
+            )
+
+    add = upsert
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        parts = [shard.get(ids=ids, include=include) for shard in self.shards.values()]
+        keys = ["ids"] + list(include if include is not None else ["documents", "metadatas"])
+        # Champ absent d'une partition (Chroma : None hors `include`) : complété par None
+        return {key: [x for p in parts
+                      for x in (p[key] if p.get(key) is not None else [None] * len(p["ids"]))]
+                for key in keys}
+
+    def query(self, query_texts=None, query_embeddings=None, n_results: int = 10,
+              include: Optional[List[str]] = None) -> Dict[str, Any]:
+        if query_embeddings is None:
+            if self.embedding_fn is None:
+                raise RuntimeError("Aucune fonction d'embedding pour encoder la requête.")
+            query_embeddings = self.embedding_fn(query_texts)
+        wanted = list(include if include is not None else ["documents", "metadatas", "distances"])
+        # Les distances servent à la fusion : toujours demandées aux partitions
+        shard_include = wanted if "distances" in wanted else wanted + ["distances"]
+        shards = [s for s in self.shards.values() if s.count()]
+        kwargs = {"query_embeddings": query_embeddings, "include": shard_include}
+        if len(shards) == 1:
+            parts = [shards[0].query(n_results=min(n_results, shards[0].count()), **kwargs)]
+        else:
+            futures = [_search_pool.submit(s.query, n_results=min(n_results, s.count()), **kwargs)
+                       for s in shards]
+            parts = [f.result() for f in futures]
+
+        keys = ["ids"] + wanted
+        out: Dict[str, Any] = {key: [] for key in keys}
+        for row in range(len(query_embeddings)):
+            # Fusion : meilleurs candidats toutes partitions confondues
+            candidates = [(p["distances"][row][i], p, i) for p in parts for i in range(len(p["ids"][row]))]
+            merged = sorted(candidates, key=lambda c: c[0])[:n_results]
+            for key in keys:
+                out[key].append([p[key][row][i] if p.get(key) is not None else None for _, p, i in merged])
+        return out
+
+
+def create_partitioned_index(name: str, embedding_fn, documents: List[Dict[str, Any]]) -> PartitionedIndex:
+    """Partitions vides dimensionnées d'après la répartition régionale de `documents`."""
+    from utils.regions import REGIONS, document_region
+
+    sizes = {region: 0 for region in REGIONS}
+    for doc in documents:
+        sizes[document_region(doc["content"], doc.get("metadata"))] += 1
+    shards = {region: create_index(f"{name}_{region}", embedding_fn, n) for region, n in sizes.items()}
+    return PartitionedIndex(name, shards, embedding_fn)
+
+
+def drop_index(index) -> None:
+    """Libère un index retiré (les index en mémoire partent avec leur référence)."""
+    if isinstance(index, PartitionedIndex):
+        for shard in index.shards.values():
+            drop_index(shard)
+        return
+    if isinstance(index, VectorBackend) or not hasattr(index, "modify"):
+        return
+    from utils.rag_utils import drop_collection
+
+    drop_collection(index.name)
+
+
+# ------------------------------------------------------------------
+# Mesures de passage à l'échelle (vecteurs synthétiques)
+# ------------------------------------------------------------------
+def _synthetic(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    # Vecteurs regroupés en amas, plus proches d'embeddings réels qu'un bruit uniforme
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 500, 8), dim)).astype(np.float32)
+    out = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100_000):
+        stop = min(start + 100_000, n)
+        labels = rng.integers(0, len(centers), size=stop - start)
+        out[start:stop] = centers[labels] + 0.5 * rng.normal(size=(stop - start, dim)).astype(np.float32)
+    return _normalize(out)
+
+
+class _NoEmbedding:
+    """
+    Fonction d'embedding factice (signature attendue par Chroma) : le banc
+    fournit tous les vecteurs, aucun modèle SentenceTransformer n'est chargé.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return [[0.0] * self.dim for _ in input]
+
+
+def scaling_benchmark(
+    sizes: List[int],
+    dim: int = 384,
+    n_queries: int = 200,
+    k: int = 8,
+    backends: List[str] = ("exact", "hnsw"),
+    batch_size: int = 5000
+) -> List[Dict[str, Any]]:
+    """Construction, latence p50/p95 et recall@k (face à l'exact) par taille et moteur."""
+    report = []
+    for n in sizes:
+        vectors = _synthetic(n, dim)
+        queries = _synthetic(n_queries, dim, seed=1)
+        ids = [str(i) for i in range(n)]
+        truth = None
+        for backend in backends:
+            t0 = time.perf_counter()
+            index = create_index(f"scale_{backend}_{n}", _NoEmbedding(dim), n, backend=backend)
+            for start in range(0, n, batch_size):
+                stop = min(start + batch_size, n)
+                index.upsert(ids=ids[start:stop], embeddings=vectors[start:stop].tolist()
+                             if backend == "hnsw" else vectors[start:stop])
+            build_s = time.perf_counter() - t0
+
+            latencies, results = [], []
+            for q in queries:
+                t0 = time.perf_counter()
+                res = index.query(query_embeddings=[q.tolist()], n_results=k, include=[])
+                latencies.append(time.perf_counter() - t0)
+                results.append(set(res["ids"][0]))
+            if backend == "exact":
+                truth = results
+            recall = float(np.mean([len(r & t) / k for r, t in zip(results, truth)])) if truth else None
+            report.append({
+                "vectors": n, "backend": backend, "build_s": round(build_s, 2),
+                "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+                "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 3),
+                f"recall@{k}": round(recall, 3) if recall is not None else None,
+            })
+            print(report[-1])
+            drop_index(index)
+    return report
+
+
+def _main() -> None:
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Passage à l'échelle : index exact vs HNSW.")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=384, help="dimension (384 = all-MiniLM-L6-v2)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--backends", default="exact,hnsw")
+    parser.add_argument("--json", help="écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    report = scaling_benchmark(
+        [int(x) for x in args.sizes.split(",")], args.dim, args.queries, args.k,
+        [b for b in args.backends.split(",") if b]
+    )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    _main()
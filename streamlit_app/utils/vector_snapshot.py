@@ -0,0 +1,291 @@
+# streamlit_app/utils/vector_snapshot.py
+"""
+Instantané vectoriel pré-calculé, projeté en mémoire (mmap) en lecture seule.
+
+Format du fichier (little-endian) :
+    magic  b"SQVS" | version (uint32) | taille de l'en-tête (uint32)
+    en-tête JSON (modèle, dimension, nombre de documents, version du corpus,
+    plages de lignes [début, fin) de chaque région)
+    embeddings float32 [n, dim], normalisés L2, alignés sur 64 octets
+    offsets uint64 [n + 1] vers le bloc texte
+    bloc texte : un enregistrement JSON UTF-8 {"id", "content", "metadata"} par document
+
+Construction hors ligne (depuis streamlit_app/) :
+    python -m utils.vector_snapshot build --out ../data/sante_docs.vsnap
+"""
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+import struct
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils.paths import DATA_DIR
+from utils.vector_backends import VectorBackend, top_k
+
+MAGIC = b"SQVS"
+FORMAT_VERSION = 1
+_PREFIX = struct.Struct("<4sII")
+_ALIGN = 64
+
+# Emplacement par défaut de l'instantané livré avec l'application
+DEFAULT_SNAPSHOT_PATH = os.getenv("RAG_SNAPSHOT_PATH", os.path.join(DATA_DIR, "sante_docs.vsnap"))
+
+
+def corpus_version(documents: List[Dict[str, Any]], model_name: str) -> str:
+    """Empreinte stable du corpus et du modèle (sert de numéro de version)."""
+    h = hashlib.sha256(model_name.encode("utf-8"))
+    for doc in documents:
+        h.update(b"\0" + str(doc["id"]).encode("utf-8"))
+        h.update(b"\0" + doc["content"].encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _pad(n: int) -> int:
+    return (-n) % _ALIGN
+
+
+def build_snapshot(
+    path: str,
+    documents: List[Dict[str, Any]],
+    embedding_fn,
+    model_name: str,
+    batch_size: int = 256
+) -> Dict[str, Any]:
+    """
+    Calcule les embeddings de `documents` et écrit l'instantané dans `path`
+    (écriture atomique via un fichier temporaire). Renvoie l'en-tête écrit.
+    Les documents sont rangés par région : chaque partition régionale est
+    une plage contiguë de lignes, interrogeable sans copie.
+    """
+    from utils.regions import REGIONS, document_region
+
+    # Version calculée sur l'ordre d'entrée, comme pour un corpus JSON (utils/corpus.py)
+    version = corpus_version(documents, model_name)
+    texts = [doc["content"] for doc in documents]
+    chunks = [
+        np.asarray(embedding_fn(texts[i:i + batch_size]), dtype=np.float32)
+        for i in range(0, len(texts), batch_size)
+    ]
+    emb = np.vstack(chunks) if chunks else np.zeros((0, 0), dtype=np.float32)
+    norms = np.linalg.norm(emb, axis=1, keepdims=True)
+    emb /= np.where(norms == 0, 1.0, norms)
+
+    # Lignes (documents et embeddings) rangées par région
+    rank = {region: i for i, region in enumerate(REGIONS)}
+    regions = [document_region(d["content"], d.get("metadata")) for d in documents]
+    order = sorted(range(len(documents)), key=lambda i: rank[regions[i]])
+    documents = [documents[i] for i in order]
+    if len(emb):
+        emb = emb[order]
+    partitions: Dict[str, List[int]] = {}
+    for i, j in enumerate(order):
+        partitions.setdefault(regions[j], [i, i])[1] = i + 1
+
+    records = [
+        json.dumps(
+            {"id": str(d["id"]), "content": d["content"], "metadata": d.get("metadata") or {}},
+            ensure_ascii=False
+        ).encode("utf-8")
+        for d in documents
+    ]
+    offsets = np.zeros(len(records) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(r) for r in records], dtype=np.uint64)
+
+    header = {
+        "model": model_name,
+        "dim": int(emb.shape[1]) if emb.size else 0,
+        "count": len(documents),
+        "corpus_version": version,
+        "partitions": partitions,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * _pad(_PREFIX.size + len(header_bytes))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(emb.astype("<f4", copy=False).tobytes())
+        f.write(offsets.astype("<u8", copy=False).tobytes())
+        for r in records:
+            f.write(r)
+    os.replace(tmp, path)
+    return header
+
+
+class SnapshotIndex(VectorBackend):
+    """
+    Index en lecture seule sur un instantané projeté en mémoire.
+
+    Expose le sous-ensemble de l'API d'une collection Chroma utilisé par
+    l'application (`query`, `get`, `count`) : plusieurs processus partagent
+    ainsi la même copie en cache de pages, sans aucun calcul d'embedding
+    pour le corpus.
+    """
+
+    def __init__(self, path: str, embedding_fn=None):
+        self.path = path
+        self.embedding_fn = embedding_fn
+        self._mm = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, header_len = _PREFIX.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} n'est pas un instantané vectoriel.")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Version d'instantané {version} non supportée (attendu {FORMAT_VERSION}).")
+        start = _PREFIX.size
+        self.header: Dict[str, Any] = json.loads(bytes(self._mm[start:start + header_len]))
+        n, dim = self.header["count"], self.header["dim"]
+
+        pos = start + header_len
+        self.embeddings = np.ndarray((n, dim), dtype="<f4", buffer=self._mm, offset=pos)
+        pos += n * dim * 4
+        self._offsets = np.ndarray((n + 1,), dtype="<u8", buffer=self._mm, offset=pos)
+        self._blob_start = pos + (n + 1) * 8
+        self._records: Dict[int, Dict[str, Any]] = {}
+        self._base = 0  # première ligne de l'instantané couverte (partitions)
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def model_name(self) -> str:
+        return self.header["model"]
+
+    @property
+    def version(self) -> str:
+        return self.header["corpus_version"]
+
+    def count(self) -> int:
+        return len(self.embeddings)
+
+    def partitions(self) -> Dict[str, "SnapshotIndex"]:
+        """
+        Vue par région (plages de lignes de l'en-tête), sans copie des
+        embeddings ; {} pour un instantané construit sans partitions.
+        """
+        views = {}
+        for region, (start, stop) in self.header.get("partitions", {}).items():
+            view = copy.copy(self)
+            view.embeddings = self.embeddings[start:stop]
+            view._base = self._base + start
+            view._records = {}
+            views[region] = view
+        return views
+
+    def _record(self, i: int) -> Dict[str, Any]:
+        rec = self._records.get(i)
+        if rec is None:
+            a = self._blob_start + int(self._offsets[self._base + i])
+            b = self._blob_start + int(self._offsets[self._base + i + 1])
+            rec = json.loads(bytes(self._mm[a:b]).decode("utf-8"))
+            self._records[i] = rec
+        return rec
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Équivalent de `collection.get()` (documents, ids, métadonnées)."""
+        idx = range(self.count())
+        if ids is not None:
+            wanted = set(ids)
+            idx = [i for i in idx if self._record(i)["id"] in wanted]
+        recs = [self._record(i) for i in idx]
+        out = {
+            "ids": [r["id"] for r in recs],
+            "documents": [r["content"] for r in recs],
+            "metadatas": [r["metadata"] for r in recs],
+        }
+        if include and "embeddings" in include:
+            out["embeddings"] = self.embeddings[list(idx)]
+        return out
+
+    def query(
+        self,
+        query_texts: Optional[List[str]] = None,
+        query_embeddings=None,
+        n_results: int = 10,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Recherche exacte (produit matriciel) ; même format que Chroma."""
+        if query_embeddings is None:
+            if self.embedding_fn is None:
+                raise RuntimeError("Aucune fonction d'embedding pour encoder la requête.")
+            query_embeddings = self.embedding_fn(query_texts)
+        q = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.header["dim"])
+        q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+
+        sims = q @ self.embeddings.T
+        out: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if include and "embeddings" in include:
+            out["embeddings"] = []
+        for row in sims:
+            top = top_k(row, n_results)
+            recs = [self._record(int(i)) for i in top]
+            out["ids"].append([r["id"] for r in recs])
+            out["documents"].append([r["content"] for r in recs])
+            out["metadatas"].append([r["metadata"] for r in recs])
+            out["distances"].append((1.0 - row[top]).tolist())
+            if "embeddings" in out:
+                out["embeddings"].append(self.embeddings[top])
+        return out
+
+
+def open_snapshot(path: str, embedding_fn=None, model_name: Optional[str] = None) -> Optional[SnapshotIndex]:
+    """
+    Ouvre l'instantané s'il existe et correspond au modèle attendu, sinon None.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        index = SnapshotIndex(path, embedding_fn=embedding_fn)
+    except (OSError, ValueError) as e:
+        print(f"Instantané ignoré ({path}) : {e}")
+        return None
+    if model_name and index.model_name != model_name:
+        print(f"Instantané ignoré ({path}) : modèle {index.model_name} ≠ {model_name}")
+        return None
+    return index
+
+
+def _main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Construit l'instantané vectoriel du corpus RAG.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="calcule les embeddings et écrit l'instantané")
+    b.add_argument("--out", default=DEFAULT_SNAPSHOT_PATH)
+    b.add_argument("--model", default="all-MiniLM-L6-v2")
+    b.add_argument("--corpus", help="fichier JSON [{id, content, metadata?}] (défaut : documents intégrés)")
+    i = sub.add_parser("info", help="affiche l'en-tête d'un instantané")
+    i.add_argument("path", nargs="?", default=DEFAULT_SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    if args.cmd == "info":
+        index = SnapshotIndex(args.path)
+        print(json.dumps(index.header, indent=2, ensure_ascii=False))
+        return
+
+    from utils.rag_utils import DEFAULT_DOCUMENTS, make_embedding_fn
+    from utils.ingest import prepare_documents
+
+    if args.corpus:
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            documents = json.load(f)
+    else:
+        documents = DEFAULT_DOCUMENTS
+    documents = prepare_documents(documents)
+    t0 = time.perf_counter()
+    header = build_snapshot(args.out, documents, make_embedding_fn(args.model), args.model)
+    print(f"{header['count']} documents → {args.out} "
+          f"(version {header['corpus_version']}, {time.perf_counter() - t0:.1f}s)")
+
+
+if __name__ == "__main__":
+    _main()
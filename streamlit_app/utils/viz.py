@@ -1,6 +1,29 @@
+from __future__ import annotations
+
 import re
-from typing import Dict, Any
-from matplotlib.figure import Figure
+from typing import Any, Dict, List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+
+def _as_list(values) -> List[Any]:
+    # ndarray, liste ou tuple → liste de scalaires Python (sérialisable JSON)
+    out = values.tolist() if hasattr(values, "tolist") else list(values)
+    return [v.item() if hasattr(v, "item") else v for v in out]
+
+
+def _category_names(axis) -> Dict[float, str]:
+    # Axe catégoriel (chaînes) : position → libellé
+    units = axis.get_units()
+    mapping = getattr(units, "_mapping", None)
+    return {float(pos): label for label, pos in mapping.items()} if mapping else {}
+
+
+def _series_label(artist, fallback: str) -> str:
+    label = artist.get_label() or ""
+    # Matplotlib nomme « _child0 », « _container1 »… les artistes sans légende
+    return fallback if label.startswith("_") else label
 
 
 def get_graph_data(fig: Figure) -> Dict[str, Any]:
@@ -15,21 +38,56 @@ def get_graph_data(fig: Figure) -> Dict[str, Any]:
           - title : titre du graphique
           - xlabel : label de l'axe X
           - ylabel : label de l'axe Y
-          - xdata : liste des valeurs X (si une seule ligne tracée)
-          - ydata : liste des valeurs Y (si une seule ligne tracée)
+          - series : toutes les séries (courbes et barres, tous les axes),
+            chacune {"label", "kind", "xdata", "ydata"}
+          - xdata, ydata : valeurs de la première série (compatibilité)
     """
+    from matplotlib.container import BarContainer
+
     data: Dict[str, Any] = {}
-    if fig.axes:
-        ax = fig.axes[0]
-        data['title'] = ax.get_title()
-        data['xlabel'] = ax.get_xlabel()
-        data['ylabel'] = ax.get_ylabel()
+    if not fig.axes:
+        return data
+    ax = fig.axes[0]
+    data['title'] = ax.get_title()
+    data['xlabel'] = ax.get_xlabel()
+    data['ylabel'] = ax.get_ylabel()
 
-        if ax.lines:
-            line = ax.lines[0]
-            data['xdata'] = line.get_xdata().tolist()
-            data['ydata'] = line.get_ydata().tolist()
+    series: List[Dict[str, Any]] = []
+    for axes in fig.axes:
+        fallback = axes.get_ylabel() or axes.get_title() or data['ylabel']
+        for line in axes.lines:
+            # Lignes de référence (axhline, axvline) : coordonnées d'axes, pas des données
+            if not line.get_transform().contains_branch(axes.transData):
+                continue
+            xdata, ydata = _as_list(line.get_xdata()), _as_list(line.get_ydata())
+            if len(ydata) < 2:
+                continue
+            series.append({
+                "label": _series_label(line, fallback or f"Série {len(series) + 1}"),
+                "kind": "line",
+                "xdata": xdata,
+                "ydata": ydata,
+            })
+        categories = _category_names(axes.xaxis)
+        for container in axes.containers:
+            if not isinstance(container, BarContainer):
+                continue
+            xs, ys = [], []
+            for rect in container.patches:
+                center = rect.get_x() + rect.get_width() / 2
+                xs.append(categories.get(round(center), round(center, 6)) if categories else round(center, 6))
+                ys.append(float(rect.get_height()))
+            series.append({
+                "label": _series_label(container, fallback or f"Série {len(series) + 1}"),
+                "kind": "bar",
+                "xdata": xs,
+                "ydata": ys,
+            })
 
+    data['series'] = series
+    if series:
+        data['xdata'] = series[0]["xdata"]
+        data['ydata'] = series[0]["ydata"]
     return data
 
 
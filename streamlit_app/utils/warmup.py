@@ -0,0 +1,145 @@
+# streamlit_app/utils/warmup.py
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# ------------------------------------------------------------------
+# Préchauffage en arrière-plan du modèle d'embedding et de l'index RAG.
+# Le module est importé une seule fois par processus Streamlit : l'état
+# ci-dessous est donc partagé par toutes les sessions et survit aux reruns.
+# ------------------------------------------------------------------
+_lock = threading.Lock()
+_ready = threading.Event()
+_thread: Optional[threading.Thread] = None
+_resources: Dict[str, Any] = {}
+_error: Optional[BaseException] = None
+_failed_at = 0.0
+_args: Dict[str, str] = {}  # arguments du premier lancement, repris par les nouvelles tentatives
+
+# Délai minimal avant de relancer un préchauffage en échec (0 = dès l'appel suivant)
+WARMUP_RETRY_S = float(os.getenv("WARMUP_RETRY_S", "30"))
+
+# Mesures de démarrage (secondes) et comptages, exposés par startup_metrics()
+_metrics: Dict[str, float] = {}
+_counts: Dict[str, int] = {}
+
+
+def record_metric(name: str, value: float, once: bool = False) -> None:
+    """Enregistre une durée de démarrage en secondes (ignorée si once=True et déjà présente)."""
+    with _lock:
+        if once and name in _metrics:
+            return
+        _metrics[name] = round(value, 4)
+    print(f"STARTUP {name} = {value:.3f} s")
+
+
+def record_count(name: str, value: int) -> None:
+    """Enregistre un comptage de démarrage (documents indexés…), à part des durées."""
+    with _lock:
+        _counts[name] = int(value)
+    print(f"STARTUP {name} = {int(value)}")
+
+
+def startup_metrics() -> Dict[str, Any]:
+    """Copie des mesures collectées jusqu'ici : durées (s) et, sous "counts", les comptages."""
+    with _lock:
+        return {**_metrics, "counts": dict(_counts)}
+
+
+def _build_resources(model_name: str, collection_name: str) -> None:
+    global _error, _failed_at
+    t0 = time.perf_counter()
+    try:
+        # Imports lourds (chromadb, sentence-transformers, torch) : ici seulement
+        from utils.rag_utils import make_embedding_fn
+        from utils.corpus import CorpusManager
+
+        embedding_fn = make_embedding_fn(model_name)
+        record_metric("warmup_model_s", time.perf_counter() - t0)
+
+        # Première génération du corpus (instantané pré-calculé si disponible),
+        # puis veille des sources pour les rafraîchissements à chaud
+        corpus = CorpusManager(embedding_fn, model_name, collection_name)
+        corpus.refresh()
+        record_count("warmup_corpus_docs", corpus.current()["count"])
+        corpus.start_watcher()
+
+        _resources.update({"embedding_fn": embedding_fn, "corpus": corpus, "model_name": model_name})
+        record_metric("warmup_total_s", time.perf_counter() - t0)
+    except BaseException as e:  # l'erreur est relayée par get_resources()
+        _error = e
+        _failed_at = time.monotonic()
+        print(f"ERREUR préchauffage : {e!r}")
+    finally:
+        _ready.set()
+
+
+def start_warmup(
+    model_name: str = "all-MiniLM-L6-v2",
+    collection_name: str = "sante_docs"
+) -> None:
+    """
+    Lance (une seule fois par processus) le chargement du modèle d'embedding
+    et l'indexation des documents dans un thread d'arrière-plan. Après un
+    échec, l'appel suivant (au plus tôt WARMUP_RETRY_S secondes après)
+    relance une tentative avec les arguments du premier lancement.
+    """
+    global _thread, _error
+    with _lock:
+        if _thread is not None:
+            # Relance seulement une tentative terminée (_ready posé) et en échec
+            if not _ready.is_set() or _error is None or time.monotonic() - _failed_at < WARMUP_RETRY_S:
+                return
+            print(f"Nouvelle tentative de préchauffage après : {_error!r}")
+            _error = None
+            _ready.clear()
+        else:
+            _args.update({"model_name": model_name, "collection_name": collection_name})
+        _thread = threading.Thread(
+            target=_build_resources,
+            args=(_args["model_name"], _args["collection_name"]),
+            name="rag-warmup",
+            daemon=True
+        )
+        _thread.start()
+
+
+def embedding_model_name() -> Optional[str]:
+    """Nom du modèle d'embedding chargé (None tant que le préchauffage n'a pas abouti)."""
+    return _resources.get("model_name")
+
+
+def is_ready() -> bool:
+    """Sonde de disponibilité : True quand le modèle et l'index sont prêts."""
+    return _ready.is_set() and _error is None
+
+
+def readiness() -> Dict[str, Any]:
+    """État détaillé du préchauffage (pour affichage ou supervision)."""
+    if not _ready.is_set():
+        status = "starting" if _thread is not None else "idle"
+    else:
+        status = "error" if _error is not None else "ready"
+    return {
+        "status": status,
+        "error": repr(_error) if _error is not None else None,
+        "metrics": startup_metrics(),
+    }
+
+
+def get_resources(timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Attend la fin du préchauffage et renvoie {"embedding_fn", "corpus",
+    "collection"} ; "collection" est celle de la génération publiée à
+    l'instant de l'appel. Lève RuntimeError si le préchauffage a échoué ou
+    n'a pas abouti à temps ; après un échec, l'appel suivant relance le
+    préchauffage (voir start_warmup).
+    """
+    start_warmup()
+    if not _ready.wait(timeout):
+        raise RuntimeError("Le modèle d'embedding n'est pas encore prêt.")
+    if _error is not None:
+        raise RuntimeError(f"Échec du préchauffage RAG : {_error}")
+    return {**_resources, "collection": _resources["corpus"].current()["collection"]}